@@ -7,6 +7,7 @@ import datetime
 import xml.etree.ElementTree as ET
 from pathlib import Path
 import shutil
+from periodic import PeriodicTimer
 # === 日誌設定 ===
 def init_logger(base_dir, prefix):
     # 清除舊的 handlers 避免重複
@@ -247,7 +248,10 @@ def perform_stage(target_p, is_charging, cfg, current_recorder_list=None):
     start_time = time.time()
     timeout_sec = cfg['timeout_min'] * 60
     
+    # 使用 Config 定義的間隔 (固定 deadline，get_battery_info 的 PowerShell 耗時不會累積)
+    timer = PeriodicTimer(cfg['interval'], name="Stage")
     while True:
+        timer.wait()
         # 檢查超時
         if (time.time() - start_time) > timeout_sec:
             raise TimeoutError(f"Stage timeout after {cfg['timeout_min']} mins")
@@ -255,7 +259,7 @@ def perform_stage(target_p, is_charging, cfg, current_recorder_list=None):
         bat, amps = get_battery_info()
         
         if bat is None:
-            time.sleep(1)
+            timer.retry_in(1)
             continue
         
         logging.info(f"Current Battery: {bat}% | Amps: {amps:.3f}A")
@@ -272,9 +276,7 @@ def perform_stage(target_p, is_charging, cfg, current_recorder_list=None):
             if bat <= target_p:
                 logging.info(f"Target {target_p}% Reached.")
                 break
-        
-        # 使用 Config 定義的間隔
-        time.sleep(cfg['interval'])
+    timer.log_summary()
 
 def main():
     remove_old_result()
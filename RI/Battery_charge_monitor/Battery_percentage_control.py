@@ -7,6 +7,7 @@ from pathlib import Path
 
 # 引用原本的 log 設定
 from log_setting import init_logger
+from periodic import PeriodicTimer
 
 # === 路徑設定 ===
 if getattr(sys, 'frozen', False):
@@ -176,12 +177,15 @@ def test_loop(cfg):
     logging.info(f"Test Start. Duration: {cfg['duration_sec']/60} min.")
     logging.info(f"Target: {cfg['min']}% ~ {cfg['max']}%")
 
+    # 固定 deadline 間隔 (充放電切換 / PowerShell 的耗時不會累積)
+    timer = PeriodicTimer(cfg["interval"], name="BatteryCheck")
     while time.time() < end_time:
+        timer.wait()
         battery = get_battery_percentage()
 
         if battery is None:
             logging.warning("Battery read failed, retrying...")
-            time.sleep(3)
+            timer.retry_in(3)
             continue
 
         # --- 1. 準備階段 ---
@@ -215,10 +219,8 @@ def test_loop(cfg):
         if validation_started:
             logging.info(f"[Record] Check: {battery}%")
             recorded_data.append(battery)
-        
-        # --- 5. 等待 ---
-        time.sleep(cfg["interval"])
 
+    timer.log_summary()
     analyze_result(recorded_data, cfg)
 
 def analyze_result(data, cfg):
@@ -0,0 +1,52 @@
+import logging
+import math
+import time
+
+class PeriodicTimer:
+    """
+    Fixed-deadline periodic timer on time.monotonic().
+    Deadlines are start + n * interval, so the cost of each PowerShell / EC call
+    no longer stretches the check interval. Missed ticks are skipped (stay on phase).
+    Same scheme as PeriodicSchedule in the Run-In app (scheduler.py).
+    """
+
+    def __init__(self, interval: float, name="Timer"):
+        if interval <= 0:
+            raise ValueError(f"interval must be > 0: {interval}")
+        self.interval = float(interval)
+        self.name = name
+        self.deadline = None
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.late_max = 0.0
+
+    def wait(self):
+        """First call returns immediately, later calls sleep until the next deadline."""
+        now = time.monotonic()
+        if self.deadline is None:
+            self.deadline = now
+            self.ticks = 1
+            return
+
+        self.deadline += self.interval
+        if now > self.deadline:
+            missed = math.ceil((now - self.deadline) / self.interval)
+            self.overruns += 1
+            self.skipped += missed
+            self.deadline += missed * self.interval
+
+        remaining = self.deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        self.late_max = max(self.late_max, time.monotonic() - self.deadline)
+        self.ticks += 1
+
+    def retry_in(self, seconds: float):
+        """Make the next wait() return after `seconds` (quick retry after a failed read)."""
+        if self.deadline is not None:
+            self.deadline = time.monotonic() + seconds - self.interval
+
+    def log_summary(self):
+        logging.info(f"[{self.name}] interval={self.interval:g}s ticks={self.ticks} "
+                     f"overruns={self.overruns} skipped={self.skipped} late_max={self.late_max * 1000:.1f}ms")
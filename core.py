@@ -4,48 +4,714 @@ import time
 import subprocess
 import json
 import configparser
-import winreg
+import psutil
+import queue
+import codecs
+import threading
+import ctypes
+import gzip
+import shutil
+import zipfile
 from datetime import datetime
 
-# --- PyQt5 修改區 ---
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                             QTextEdit, QLabel, QPushButton)
-from PyQt5.QtCore import QThread, pyqtSignal, Qt
-# --------------------
+# 注意: 這裡不 import PyQt5 / winreg
+# - GUI 在 runin_gui.py，只有需要視窗時才載入
+# - winreg 只在設定 RunOnce 時載入
 
-class RunInWorker(QThread):
-    sig_log = pyqtSignal(str)
-    sig_finished = pyqtSignal(bool, str) # True=PASS, False=FAIL
+# Windows Thread Priority (SetThreadPriority)
+THREAD_PRIORITY_LOWEST = -2
+THREAD_PRIORITY_TIME_CRITICAL = 15
 
-    def __init__(self, logic_func):
-        super().__init__()
+def set_current_thread_priority(priority):
+    """設定目前執行緒的 Windows 優先權 (非 Windows 平台忽略)"""
+    if sys.platform != "win32":
+        return False
+    try:
+        kernel32 = ctypes.windll.kernel32
+        return bool(kernel32.SetThreadPriority(kernel32.GetCurrentThread(), priority))
+    except Exception:
+        return False
+
+# 單一實例鎖 (GUI 與 Headless 共用)，handle 須保留到程式結束
+_instance_mutex = None
+
+def acquire_instance_lock(name="odm_runin_instance"):
+    """建立具名 Mutex，已有其他實例在執行時回傳 False (非 Windows 平台一律 True)"""
+    global _instance_mutex
+    if sys.platform != "win32":
+        return True
+    kernel32 = ctypes.windll.kernel32
+    _instance_mutex = kernel32.CreateMutexW(None, False, name)
+    # 183 = ERROR_ALREADY_EXISTS
+    return kernel32.GetLastError() != 183
+
+class _LogCommand:
+    """LogWriter 內部控制指令 (flush / rotate / stop)"""
+    def __init__(self, kind, sync=False, close=False, target=None):
+        self.kind = kind
+        self.sync = sync
+        self.close = close
+        self.target = target    # rotate: 改名後的路徑
+        self.renamed = False
+        self.error = None
+        self.done = threading.Event()
+
+class LogWriter(threading.Thread):
+    """
+    背景 Log 寫檔執行緒。
+    log() 只把訊息丟進 Queue，由這裡用同一個 file handle 批次寫入，
+    累積超過 flush_size 筆或超過 flush_interval 秒才 flush 到硬碟。
+    reboot / 關閉前請呼叫 flush() 強制寫出；封存改名用 rotate() (在寫檔執行緒內改名)。
+    formatter(ts, msg) 可自訂每行格式 (預設為 "[時間] 訊息")。
+    """
+    def __init__(self, path, flush_interval=0.5, flush_size=200, formatter=None, name="LogWriter"):
+        super().__init__(name=name, daemon=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.formatter = formatter
+        self._queue = queue.Queue()
+        self._fh = None
+        self._pending = 0
+        # 同一秒內的時間字串快取，避免每行都 strftime
+        self._stamp_sec = None
+        self._stamp_str = ""
+
+    def write(self, msg):
+        self._queue.put((time.time(), msg))
+
+    def write_many(self, msgs):
+        ts = time.time()
+        for msg in msgs:
+            self._queue.put((ts, msg))
+
+    def flush(self, sync=False, close=False, timeout=5.0):
+        """
+        阻塞直到 Queue 內目前所有訊息都寫入檔案。
+        sync=True 額外做 os.fsync (重開機前使用)；close=True 寫完後關閉 handle (改名/封存前使用)。
+        """
+        if not self.is_alive():
+            return False
+        cmd = _LogCommand("flush", sync=sync, close=close)
+        self._queue.put(cmd)
+        return cmd.done.wait(timeout)
+
+    def rotate(self, new_path, timeout=5.0):
+        """
+        寫完目前 Queue 內的訊息後關檔並改名成 new_path (已存在則覆蓋)，改名在寫檔執行緒內完成，
+        其他執行緒同時呼叫 log() 也不會在改名前重新開啟檔案 (Windows 下開啟中的檔案無法 rename)；
+        之後的訊息寫到新的 path。回傳 True 表示已改名，檔案不存在回傳 False；
+        改名失敗丟出 OSError，逾時丟出 TimeoutError。
+        """
+        if not self.is_alive():
+            return self._rename(new_path)
+        cmd = _LogCommand("rotate", sync=True, close=True, target=new_path)
+        self._queue.put(cmd)
+        if not cmd.done.wait(timeout):
+            raise TimeoutError(f"rotate {os.path.basename(self.path)} timed out")
+        if cmd.error is not None:
+            raise cmd.error
+        return cmd.renamed
+
+    def _rename(self, new_path):
+        if not os.path.exists(self.path):
+            return False
+        if os.path.exists(new_path):
+            os.remove(new_path)
+        os.rename(self.path, new_path)
+        return True
+
+    def stop(self, timeout=5.0):
+        if not self.is_alive():
+            return
+        cmd = _LogCommand("stop", sync=True, close=True)
+        self._queue.put(cmd)
+        cmd.done.wait(timeout)
+
+    def _format(self, ts, msg):
+        if self.formatter is not None:
+            return self.formatter(ts, msg)
+        sec = int(ts)
+        if sec != self._stamp_sec:
+            self._stamp_sec = sec
+            self._stamp_str = datetime.fromtimestamp(sec).strftime('%Y-%m-%d %H:%M:%S')
+        return f"[{self._stamp_str}] {msg}\n"
+
+    def _write_lines(self, lines):
+        try:
+            if self._fh is None:
+                self._fh = open(self.path, "a", encoding="utf-8")
+            self._fh.writelines(lines)
+            self._pending += len(lines)
+        except Exception as e:
+            print(f"Write log failed: {e}")
+
+    def _flush_file(self, sync=False, close=False):
+        if self._fh is None:
+            return
+        try:
+            self._fh.flush()
+            if sync:
+                os.fsync(self._fh.fileno())
+            if close:
+                self._fh.close()
+                self._fh = None
+        except Exception as e:
+            print(f"Flush log failed: {e}")
+            self._fh = None
+        self._pending = 0
+
+    def run(self):
+        last_flush = time.monotonic()
+        while True:
+            timeout = None
+            if self._pending:
+                timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush_file()
+                last_flush = time.monotonic()
+                continue
+
+            # 一次把 Queue 內現有的訊息全部取出，合併成一次 writelines
+            lines = []
+            cmd = None
+            while True:
+                if isinstance(item, _LogCommand):
+                    cmd = item
+                    break
+                lines.append(self._format(*item))
+                if len(lines) >= self.flush_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if lines:
+                self._write_lines(lines)
+
+            if cmd is not None:
+                self._flush_file(sync=cmd.sync, close=cmd.close)
+                last_flush = time.monotonic()
+                if cmd.kind == "rotate":
+                    try:
+                        cmd.renamed = self._rename(cmd.target)
+                    except OSError as e:
+                        cmd.error = e
+                cmd.done.set()
+                if cmd.kind == "stop":
+                    return
+            elif self._pending >= self.flush_size or time.monotonic() - last_flush >= self.flush_interval:
+                self._flush_file()
+                last_flush = time.monotonic()
+
+def format_event(ts, record):
+    """EventSink 的一行 JSON (record 在呼叫端已帶 mono / block / step 等欄位)"""
+    record["epoch"] = round(ts, 3)
+    record["wall"] = datetime.fromtimestamp(ts).isoformat(timespec="milliseconds")
+    return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+class LogArchiver(threading.Thread):
+    """
+    封存檔背景壓縮 + 保留政策 + Manifest。
+    - submit(path): 排入低優先權執行緒壓縮成 .gz (刪除原檔)，記錄到 manifest (jsonl，跨重開機保存)
+    - bundle(tag): 將本次 Run 已壓縮的檔案打包成單一 RunIn_Bundle_<tag>.zip + .json manifest
+    - 每次處理完依 retention_days / max_total_mb 清掉最舊的 bundle
+    重開機前未壓縮完的檔案會留在 manifest，下次啟動自動續做。
+    """
+    BUNDLE_PREFIX = "RunIn_Bundle_"
+
+    def __init__(self, bundle_dir, log=print, enabled=True, retention_days=30, max_total_mb=2048):
+        super().__init__(name="LogArchiver", daemon=True)
+        self.bundle_dir = bundle_dir
+        self.manifest_path = os.path.join(bundle_dir, "archive_manifest.jsonl")
+        self.log = log
+        self.enabled = enabled
+        self.retention_days = retention_days
+        self.max_total_mb = max_total_mb
+        self._queue = queue.Queue()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._manifest_lock = threading.Lock()
+
+    def configure(self, enabled=None, retention_days=None, max_total_mb=None):
+        if enabled is not None:
+            self.enabled = enabled
+        if retention_days is not None:
+            self.retention_days = retention_days
+        if max_total_mb is not None:
+            self.max_total_mb = max_total_mb
+
+    # --- 對外介面 ---
+    def submit(self, path, category="log"):
+        if not self.enabled or not path or not os.path.exists(path):
+            return
+        path = os.path.abspath(path)
+        self._append_manifest({"path": path, "category": category, "state": "queued"})
+        self._put(("compress", path, category))
+
+    def bundle(self, tag):
+        if self.enabled:
+            self._put(("bundle", tag))
+
+    def resume_pending(self):
+        """重新排入上次尚未壓縮完成的檔案"""
+        for entry in self._read_manifest().values():
+            if entry.get("state") == "queued" and os.path.exists(entry["path"]):
+                self._put(("compress", entry["path"], entry.get("category", "log")))
+
+    def wait_idle(self, timeout=5.0):
+        return self._idle.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        if self.is_alive():
+            self._put(("stop",))
+            self.join(timeout)
+
+    def _put(self, item):
+        self._idle.clear()
+        self._queue.put(item)
+
+    # --- Manifest ---
+    def _append_manifest(self, entry):
+        entry["time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._manifest_lock:
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _load_manifest(self):
+        """回傳 {原始路徑: 最後狀態} (呼叫端需持有 _manifest_lock)"""
+        entries = {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    entries.setdefault(rec["path"], {}).update(rec)
+        except OSError:
+            pass
+        return entries
+
+    def _read_manifest(self):
+        """回傳 {原始路徑: 最後狀態}"""
+        with self._manifest_lock:
+            return self._load_manifest()
+
+    def _remove_from_manifest(self, bundled):
+        """
+        移除已打包的項目 (bundled: {原始路徑: 打包時的 gz})。
+        讀取與改寫在同一個 lock 內，期間 submit() 新增的 queued 項目不會被蓋掉；
+        打包後同一路徑又被送進來 (狀態已不是 done 或 gz 不同) 的項目也保留。
+        """
+        with self._manifest_lock:
+            entries = [e for path, e in self._load_manifest().items()
+                       if not (e.get("state") == "done" and bundled.get(path) == e.get("gz"))]
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.manifest_path)
+
+    # --- 背景工作 ---
+    def run(self):
+        set_current_thread_priority(THREAD_PRIORITY_LOWEST)
+        while True:
+            item = self._queue.get()
+            try:
+                if item[0] == "stop":
+                    return
+                if item[0] == "compress":
+                    self._compress(item[1], item[2])
+                elif item[0] == "bundle":
+                    self._bundle(item[1])
+                self._apply_retention()
+            except Exception as e:
+                self.log(f"[Archiver] Error: {e}")
+            finally:
+                if self._queue.empty():
+                    self._idle.set()
+
+    def _compress(self, path, category):
+        if not os.path.exists(path):
+            return
+        gz_path = path + ".gz"
+        tmp_path = gz_path + ".tmp"
+        with open(path, "rb") as src, gzip.open(tmp_path, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(tmp_path, gz_path)
+        original_size = os.path.getsize(path)
+        os.remove(path)
+        self._append_manifest({
+            "path": path, "category": category, "state": "done", "gz": gz_path,
+            "size": original_size, "gz_size": os.path.getsize(gz_path)
+        })
+
+    def _bundle(self, tag):
+        entries = self._read_manifest()
+        done = [e for e in entries.values() if e.get("state") == "done" and os.path.exists(e.get("gz", ""))]
+        if not done:
+            return
+        bundle_path = os.path.join(self.bundle_dir, f"{self.BUNDLE_PREFIX}{tag}.zip")
+        files = []
+        # .gz 已壓縮，zip 內直接 STORED
+        with zipfile.ZipFile(bundle_path, "w", compression=zipfile.ZIP_STORED) as zf:
+            for e in done:
+                arcname = f"{e.get('category', 'log')}/{os.path.basename(e['gz'])}"
+                zf.write(e["gz"], arcname)
+                files.append({"name": arcname, "source": e["path"], "size": e.get("size"), "gz_size": e.get("gz_size")})
+            manifest = {"tag": tag, "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "files": files}
+            zf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+        with open(os.path.join(self.bundle_dir, f"{self.BUNDLE_PREFIX}{tag}.json"), "w", encoding="utf-8") as f:
+            json.dump(dict(manifest, bundle=os.path.basename(bundle_path)), f, ensure_ascii=False, indent=2)
+        for e in done:
+            os.remove(e["gz"])
+        # manifest 只保留尚未打包的項目
+        self._remove_from_manifest({e["path"]: e["gz"] for e in done})
+        self.log(f"[Archiver] Bundle created: {os.path.basename(bundle_path)} ({len(files)} files)")
+
+    def _apply_retention(self):
+        bundles = []
+        for name in os.listdir(self.bundle_dir):
+            if name.startswith(self.BUNDLE_PREFIX) and name.endswith(".zip"):
+                path = os.path.join(self.bundle_dir, name)
+                bundles.append((os.path.getmtime(path), os.path.getsize(path), path))
+        bundles.sort()
+        now = time.time()
+        total = sum(b[1] for b in bundles)
+        budget = self.max_total_mb * 1024 * 1024
+        for mtime, size, path in bundles:
+            expired = self.retention_days and now - mtime > self.retention_days * 86400
+            if not expired and total <= budget:
+                break
+            os.remove(path)
+            sidecar = os.path.splitext(path)[0] + ".json"
+            if os.path.exists(sidecar):
+                os.remove(sidecar)
+            total -= size
+            self.log(f"[Archiver] Retention removed: {os.path.basename(path)}")
+
+class RunInStateStore:
+    """
+    斷點續傳狀態檔 (runin_state.json) + 轉換紀錄 (runin_state.journal)。
+    - save(): 每次狀態轉換只 append 一行 JSON 到 journal 並 fsync
+    - 每 COMPACT_EVERY 筆才以 tmp + os.replace 原子寫入 snapshot
+    - load(): 讀 snapshot 再 replay journal，斷電造成的半行會被略過
+    - history(): 查詢本次 Run 的所有轉換紀錄
+    """
+    COMPACT_EVERY = 20
+
+    def __init__(self, state_file, history_dir=None):
+        self.state_file = state_file
+        self.journal_file = os.path.splitext(state_file)[0] + ".journal"
+        self.history_dir = history_dir
+        self._lock = threading.Lock()
+        self._seq = None
+        self._snapshot_seq = 0
+        self._state = None
+
+    def exists(self):
+        return os.path.exists(self.state_file) or os.path.exists(self.journal_file)
+
+    def _read_snapshot(self):
+        try:
+            with open(self.state_file, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0, None
+        # 相容舊版 (直接存 state dict，沒有 seq)
+        if isinstance(data, dict) and "state" in data and "seq" in data:
+            return int(data["seq"]), data["state"]
+        return 0, data
+
+    def _read_journal(self):
+        records = []
+        try:
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue # 斷電造成的不完整行
+                    if isinstance(rec, dict) and "seq" in rec and "state" in rec:
+                        records.append(rec)
+        except OSError:
+            pass
+        return records
+
+    def _terminate_torn_line(self):
+        """journal 結尾若是斷電留下的半行，補上換行，避免下一筆接在同一行"""
+        try:
+            with open(self.journal_file, "rb+") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        except OSError:
+            pass
+
+    def _recover(self):
+        self._terminate_torn_line()
+        seq, state = self._read_snapshot()
+        self._snapshot_seq = seq
+        for rec in self._read_journal():
+            if rec["seq"] > seq:
+                seq, state = rec["seq"], rec["state"]
+        self._seq = seq
+        self._state = state
+
+    def load(self):
+        with self._lock:
+            if not self.exists():
+                self._seq, self._state = 0, None
+                return None
+            self._recover()
+            return dict(self._state) if self._state is not None else None
+
+    def save(self, state):
+        with self._lock:
+            if self._seq is None:
+                self._recover()
+            self._seq += 1
+            self._state = dict(state)
+            rec = {"seq": self._seq, "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "state": self._state}
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if self._seq - self._snapshot_seq >= self.COMPACT_EVERY or not os.path.exists(self.state_file):
+                self._write_snapshot()
+
+    def update(self, **fields):
+        """以目前狀態為基礎更新部分欄位"""
+        if self._seq is None:
+            self.load()
+        state = dict(self._state or {})
+        state.update(fields)
+        self.save(state)
+        return state
+
+    def _write_snapshot(self):
+        tmp_path = self.state_file + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"seq": self._seq, "state": self._state}, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_file)
+        self._snapshot_seq = self._seq
+
+    def history(self):
+        """回傳本次 Run 的狀態轉換紀錄 (依 seq 排序)"""
+        return sorted(self._read_journal(), key=lambda r: r["seq"])
+
+    def clear(self):
+        """清除狀態；journal 搬到 history_dir 保留作為本次 Run 的歷程 (回傳搬移後路徑)"""
+        dest = None
+        with self._lock:
+            if os.path.exists(self.journal_file):
+                if self.history_dir:
+                    os.makedirs(self.history_dir, exist_ok=True)
+                    timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S')
+                    dest = os.path.join(self.history_dir, f"runin_state_history_{timestamp_str}.jsonl")
+                    os.replace(self.journal_file, dest)
+                else:
+                    os.remove(self.journal_file)
+            for path in (self.state_file, self.state_file + ".tmp"):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._seq, self._snapshot_seq, self._state = 0, 0, None
+            return dest
+
+class ProcessSupervisor:
+    """
+    管理所有由程式啟動的外部工具 (FurMark / Prime95 / PTAT / GPUMon...)。
+    - spawn()/register(): 啟動時登記 Popen 與其子程序樹
+    - refresh(): 重新抓取子程序樹 (shell=True 時真正的工具是 cmd.exe 的子程序)
+    - shutdown(): 先 graceful 關閉，超過 grace 秒再強制 kill，全部平行等待，總時間受 deadline 限制
+    image_names 用來補抓已脫離程序樹的工具 (例如 "start xxx.exe")。
+    """
+    def __init__(self, log=print):
+        self.log = log
+        self._lock = threading.Lock()
+        self._entries = []
+
+    def spawn(self, name, cmd, image_names=(), **popen_kwargs):
+        popen_kwargs.setdefault('shell', True)
+        proc = subprocess.Popen(cmd, **popen_kwargs)
+        self.register(name, proc, image_names)
+        return proc
+
+    def register(self, name, proc, image_names=()):
+        entry = {
+            "name": name,
+            "proc": proc,
+            "images": {n.lower() for n in image_names},
+            "tree": {}
+        }
+        self._snapshot(entry)
+        with self._lock:
+            self._entries.append(entry)
+        return proc
+
+    def _snapshot(self, entry):
+        try:
+            root = psutil.Process(entry["proc"].pid)
+            entry["tree"][root.pid] = root
+            for child in root.children(recursive=True):
+                entry["tree"][child.pid] = child
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+
+    def refresh(self):
+        with self._lock:
+            entries = list(self._entries)
+        for entry in entries:
+            self._snapshot(entry)
+
+    def _select(self, names):
+        with self._lock:
+            if names is None:
+                return list(self._entries)
+            return [e for e in self._entries if e["name"] in names]
+
+    def _collect(self, entries, extra_images=()):
+        """取得 entries 目前還活著的所有 process (程序樹 + image name 掃描一次)"""
+        procs = {}
+        images = {n.lower() for n in extra_images}
+        for entry in entries:
+            self._snapshot(entry)
+            images |= entry["images"]
+            for pid, p in entry["tree"].items():
+                if p.is_running():
+                    procs[pid] = p
+        if images:
+            for p in psutil.process_iter(['name']):
+                name = p.info['name']
+                if name and name.lower() in images:
+                    procs[p.pid] = p
+        procs.pop(os.getpid(), None)
+        return list(procs.values())
+
+    def _request_close(self, procs):
+        if sys.platform == "win32":
+            # 不加 /F: 讓 GUI 工具收到 WM_CLOSE 正常結束，一次 taskkill 處理全部 PID
+            args = ["taskkill"]
+            for p in procs:
+                args += ["/PID", str(p.pid)]
+            try:
+                subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+            except Exception:
+                pass
+        else:
+            for p in procs:
+                try:
+                    p.terminate()
+                except psutil.Error:
+                    pass
+
+    def _stop_procs(self, procs, grace, deadline):
+        t0 = time.monotonic()
+        if grace > 0:
+            self._request_close(procs)
+            _, alive = psutil.wait_procs(procs, timeout=min(grace, deadline))
+        else:
+            alive = procs
+        for p in alive:
+            try:
+                p.kill()
+            except psutil.Error:
+                pass
+        if alive:
+            remaining = max(0.1, deadline - (time.monotonic() - t0))
+            _, alive = psutil.wait_procs(alive, timeout=remaining)
+        return alive
+
+    def shutdown(self, names=None, grace=3.0, deadline=10.0, extra_images=()):
+        """
+        關閉指定名稱 (None=全部) 的工具與其子程序。
+        回傳 True 代表全部已結束。
+        """
+        entries = self._select(names)
+        procs = self._collect(entries, extra_images)
+        label = ", ".join(e["name"] for e in entries) or ", ".join(extra_images)
+        if procs:
+            self.log(f"[Supervisor] Stopping {label} ({len(procs)} processes)...")
+            alive = self._stop_procs(procs, grace, deadline)
+        else:
+            alive = []
+        with self._lock:
+            self._entries = [e for e in self._entries if e not in entries]
+        if alive:
+            self.log(f"[Supervisor] WARNING: still running after {deadline}s: {[p.pid for p in alive]}")
+            return False
+        return True
+
+    def kill_tree(self, proc, deadline=5.0):
+        """立即強制結束單一 Popen 與其子程序 (exec_cmd_wait 的 STOP / Timeout 使用)"""
+        entry = {"name": "", "proc": proc, "images": set(), "tree": {}}
+        procs = self._collect([entry])
+        return not self._stop_procs(procs, 0, deadline)
+
+class RunInWorker(threading.Thread):
+    """
+    執行測試主流程的背景執行緒 (GUI / Headless 共用)。
+    logic_func 正常結束視為 PASS，也可以回傳 (passed, msg) 指定結果；
+    拋出 Exception 視為 FAIL。結束後呼叫 on_finished(passed, msg)。
+    """
+    def __init__(self, logic_func, on_log, on_finished):
+        super().__init__(name="RunInWorker", daemon=True)
         self.logic_func = logic_func
+        self.on_log = on_log
+        self.on_finished = on_finished
 
     def run(self):
         try:
             # 執行主流程
-            self.logic_func()
+            result = self.logic_func()
             # 若無錯誤跑完，視為 PASS
-            self.sig_finished.emit(True, "All Tests Passed")
+            passed, msg = result if result is not None else (True, "All Tests Passed")
         except Exception as e:
             # 只要有 Exception (包含 exec_cmd_wait 拋出的)，就視為 FAIL 並停止
-            err_msg = str(e)
-            self.sig_log.emit(f"!!! STOPPED: {err_msg} !!!")
-            self.sig_finished.emit(False, err_msg)
-
-class BaseRunInApp(QMainWindow):
-    sig_update_ui_log = pyqtSignal(str)
-    sig_update_status = pyqtSignal(str)
-
-    def __init__(self, title="ACER Run-In Test"):
-        super().__init__()
-        self.setWindowTitle(title)
-        self.resize(800, 600)
-        self.setWindowFlags(self.windowFlags() | Qt.WindowStaysOnTopHint)
+            passed, msg = False, str(e)
+            self.on_log(f"!!! STOPPED: {msg} !!!")
+        self.on_finished(passed, msg)
+
+class ConsoleListener:
+    """Headless 模式的 UI 替代品: Log 已由 BaseRunInApp.log 印出，這裡只顯示狀態變化"""
+    def on_log(self, text):
+        pass
+
+    def on_status(self, text):
+        print(f"[STATUS] {text}")
+
+    def on_run_state(self, state):
+        print(f"[STATE] {state}")
+
+class BaseRunInApp:
+    """
+    Run-In 測試引擎 (不依賴 Qt)。
+    畫面更新透過 listener (on_log / on_status / on_run_state) 通知：
+    - GUI: runin_gui.RunInWindow (以 Qt signal 轉回主執行緒)
+    - Headless: ConsoleListener
+    run_state: READY / RUNNING / STOPPING / STOPPED / PASS / FAIL
+    """
+    # exec_cmd_wait 檢查 STOP / Timeout 的週期 (秒)
+    CMD_POLL_INTERVAL = 0.05
+
+    def __init__(self, title="ACER Run-In Test", listener=None):
+        self.title = title
+        self.listener = listener if listener is not None else ConsoleListener()
         # --- 變數初始化 ---
         self.current_proc = None 
         self.stop_flag = False
         self.is_rebooting = False
+        self.worker = None
+        self.run_state = "READY"
         
         if getattr(sys, 'frozen', False):
             # 打包後：抓 .exe 的位置
@@ -65,56 +731,21 @@ class BaseRunInApp(QMainWindow):
             os.makedirs(self.log_dir)
         if not os.path.exists(self.result_dir):
             os.makedirs(self.result_dir)
+        self.state_store = RunInStateStore(self.state_file, history_dir=self.log_dir)
+        self.supervisor = ProcessSupervisor(log=self.log)
+        # 封存檔背景壓縮 (設定由子類別依 Config 調整)
+        self.archiver = LogArchiver(self.log_dir, log=self.log)
+        self.archiver.start()
             
         self.current_log_file = os.path.join(self.log_dir, "Runin_Debug.log")
-
-        # UI 初始化
-        self.sig_update_ui_log.connect(self.append_log_text)
-        # 連接狀態訊號到更新函式
-        self.sig_update_status.connect(self.update_status_label)
-
-        central = QWidget()
-        self.setCentralWidget(central)
-        main_layout = QVBoxLayout(central)
-        
-        # 建立一個醒目的狀態標籤 (Status Label)
-        self.lbl_status = QLabel("READY")
-        self.lbl_status.setFixedHeight(60) # 設定高度
-        self.lbl_status.setAlignment(Qt.AlignCenter) # 文字置中
-        # 設定樣式: 深灰底、黃字、大字體、粗體
-        self.lbl_status.setStyleSheet("""
-            background-color: #333333; 
-            color: #FFD700; 
-            font-size: 24px; 
-            font-weight: bold; 
-            border: 2px solid #555;
-            border-radius: 5px;
-        """)
-        # Log 區域
-        self.txt_log = QTextEdit()
-        self.txt_log.setReadOnly(True)
-        self.txt_log.setStyleSheet("background: black; color: #00FF00; font-family: Consolas; font-size: 15pt;")
-        
-        
-        # 按鈕區域
-        btn_layout = QHBoxLayout()
-        self.btn_start = QPushButton("START TEST")
-        self.btn_start.setFixedHeight(40)
-        self.btn_start.clicked.connect(lambda: self.start_test(False))
-        
-        self.btn_stop = QPushButton("STOP")
-        self.btn_stop.setFixedHeight(40)
-        self.btn_stop.setEnabled(False)
-        self.btn_stop.setStyleSheet("background-color: #D32F2F; color: white; font-weight: bold;")
-        self.btn_stop.clicked.connect(self.stop_test)
-        
-        btn_layout.addWidget(self.btn_start)
-        btn_layout.addWidget(self.btn_stop)
-        
-        main_layout.addWidget(QLabel(title))
-        main_layout.addWidget(self.lbl_status)
-        main_layout.addWidget(self.txt_log)
-        main_layout.addLayout(btn_layout)
+        # 背景 Log 寫檔執行緒 (取代每次 log 都 open/close)
+        self.log_writer = LogWriter(self.current_log_file)
+        self.log_writer.start()
+        # 結構化事件 (JSONL)，給後段分析程式使用，與 Debug Log 一起封存
+        self.current_event_file = os.path.join(self.log_dir, "Runin_Events.jsonl")
+        self.event_writer = LogWriter(self.current_event_file, flush_interval=1.0,
+                                      formatter=format_event, name="EventWriter")
+        self.event_writer.start()
 
         # 啟動檢查
         self.check_previous_log()
@@ -123,20 +754,29 @@ class BaseRunInApp(QMainWindow):
             print("[System] Factory mode RunOnce Registry disabled (Managed by external launcher).")
 
         self.last_saved_state = {}
-        # Config 讀取
+        # Config 讀取 (以程式所在目錄為準，不依賴 cwd)
         self.config = configparser.ConfigParser()
-        if os.path.exists("config.ini"):
-            self.config.read("config.ini", encoding="utf-8")
+        self.config_file = None
+        for name in ("Config.ini", "config.ini"):
+            path = os.path.join(self.base_dir, name)
+            if os.path.exists(path):
+                self.config_file = path
+                break
+        if self.config_file:
+            self.config.read(self.config_file, encoding="utf-8")
         else:
-            self.log("WARNING: config.ini not found!")
+            self.log("WARNING: Config.ini not found!")
+        self.on_config_loaded()
+        # 上次 (重開機前) 未壓縮完的封存檔
+        self.archiver.resume_pending()
 
         # 斷點續傳檢查
-        if os.path.exists(self.state_file):
+        if self.state_store.exists():
             self.start_test(is_resume=True)
 
     def check_previous_log(self):
         # 如果狀態檔存在，代表這是同一次測試的延續，不應該切分 Log
-        if os.path.exists(self.state_file):
+        if self.state_store.exists():
             self.log(">>> Detected Resume State. Continuing with existing log. <<<")
             return
         # 如果沒有狀態檔，但 Log 卻存在，才視為上次的殘留檔進行封存
@@ -150,27 +790,35 @@ class BaseRunInApp(QMainWindow):
             self.log("Found old log from previous run. Archiving...")
             self.archive_log(prefix="Runin_Debug_Crash_")
 
+    def set_run_state(self, state):
+        self.run_state = state
+        self.listener.on_run_state(state)
+
     def start_test(self, is_resume=False):
         self.cleanup_results()
 
         self.stop_flag = False
-        self.btn_start.setEnabled(False)
-        self.btn_start.setText("RUNNING...")
-        self.btn_stop.setEnabled(True)
+        self.set_run_state("RUNNING")
         
         if is_resume: self.log(">>> RESUMED FROM REBOOT <<<")
         
-        self.worker = RunInWorker(self.user_test_sequence)
-        self.worker.sig_log.connect(self.log)
-        self.worker.sig_finished.connect(self.on_finished)
+        self.worker = RunInWorker(self.user_test_sequence, self.log, self.on_finished)
         self.worker.start()
 
+    def is_running(self):
+        return self.worker is not None and self.worker.is_alive()
+
+    def wait_finished(self, timeout=None):
+        """等待 Worker 結束 (Headless 使用)，回傳 run_state"""
+        if self.worker is not None:
+            self.worker.join(timeout)
+        return self.run_state
+
     def stop_test(self):
         self.log("!!! USER PRESSED STOP BUTTON !!!")
         self.stop_flag = True
         
-        self.btn_stop.setEnabled(False)
-        self.btn_start.setEnabled(False)
+        self.set_run_state("STOPPING")
         tool_path = os.path.join(self.base_dir, "RI", "DiagECtool.exe")
         try:
             self.log("Resetting Battery Mode...")
@@ -193,12 +841,35 @@ class BaseRunInApp(QMainWindow):
         if self.stop_flag:
             raise Exception("User Manually Stopped the Test.")
 
+    def wait_seconds(self, seconds, stoppable=True):
+        """等待指定秒數，stoppable=True 時每 0.1 秒檢查一次 STOP"""
+        deadline = time.monotonic() + seconds
+        while True:
+            if stoppable:
+                self.check_stop()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(0.1, remaining))
+
+    def on_config_loaded(self):
+        """Config 讀取後、斷點續傳開始前呼叫，子類別可在此做檢查/編譯"""
+        pass
+
+    def check_auto_run(self):
+        """啟動後檢查是否自動開始測試 (子類別依 Config 實作)"""
+        pass
+
     def user_test_sequence(self):
         raise NotImplementedError
 
     def log(self, msg):
-        self.sig_update_ui_log.emit(msg)
+        self.listener.on_log(msg)
         print(msg)
+        if self.log_writer.is_alive():
+            self.log_writer.write(msg)
+            return
+        # Writer 已停止 (程式關閉中)，退回直接寫檔
         try:
             timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             with open(self.current_log_file, "a", encoding="utf-8") as f:
@@ -206,10 +877,41 @@ class BaseRunInApp(QMainWindow):
         except Exception as e:
             print(f"Write log failed: {e}")
 
-    def append_log_text(self, msg):
-        timestamp = datetime.now().strftime('%H:%M:%S')
-        self.txt_log.append(f"[{timestamp}] {msg}")
-        self.txt_log.ensureCursorVisible()
+    def event_context(self):
+        """每筆事件附帶的流程位置，子類別可加入更多欄位"""
+        state = getattr(self, "last_saved_state", None) or {}
+        return {
+            "block": state.get("block"),
+            "step": state.get("step"),
+            "cycle": state.get("cycle"),
+        }
+
+    def emit_event(self, kind, **fields):
+        """
+        寫入一筆結構化事件到 log/Runin_Events.jsonl。
+        kind: state / cmd_start / cmd_end / metric / battery / run_end ...
+        """
+        record = {"mono": round(time.monotonic(), 3), "kind": kind}
+        record.update(self.event_context())
+        record.update(fields)
+        if self.event_writer.is_alive():
+            self.event_writer.write(record)
+
+    def log_lines(self, msgs):
+        """一次記錄多行 (共用同一次 UI 更新與 print)"""
+        text = "\n".join(msgs)
+        self.listener.on_log(text)
+        print(text)
+        if self.log_writer.is_alive():
+            self.log_writer.write_many(msgs)
+            return
+        for msg in msgs:
+            try:
+                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                with open(self.current_log_file, "a", encoding="utf-8") as f:
+                    f.write(f"[{timestamp}] {msg}\n")
+            except Exception as e:
+                print(f"Write log failed: {e}")
 
     # 修改 exec_cmd_wait 函式，增加 capture_log 參數
     def exec_cmd_wait(self, cmd, timeout=None, capture_log=True):
@@ -229,41 +931,76 @@ class BaseRunInApp(QMainWindow):
             # 強制開啟一個全新的 Console 視窗，避開 PyInstaller 無視窗環境的限制
             popen_kwargs['creationflags'] = subprocess.CREATE_NEW_CONSOLE
 
+        self.emit_event("cmd_start", cmd=cmd, capture_log=capture_log, timeout=timeout)
         self.current_proc = subprocess.Popen(cmd, **popen_kwargs)
         ret = -1
+        t_start = time.monotonic()
+        deadline = t_start + timeout if timeout else None
+        result = "ERROR"
         try:
+            output_queue = None
             if capture_log:
-                # 有抓 Log 才需要讀取迴圈
-                while True:
-                    if self.stop_flag:
-                        self.current_proc.terminate()
+                # 由背景執行緒讀取 stdout，主迴圈不會卡在 readline 上
+                output_queue = queue.Queue()
+                threading.Thread(target=self._pump_output, args=(self.current_proc.stdout, output_queue),
+                                 name="CmdOutputPump", daemon=True).start()
+            decoder = codecs.getincrementaldecoder('cp950')(errors='replace')
+            partial = ""
+            eof = not capture_log
+
+            while True:
+                if self.stop_flag:
+                    self.supervisor.kill_tree(self.current_proc)
+                    break
+                if deadline is not None and time.monotonic() > deadline:
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+
+                if eof:
+                    if self.current_proc.poll() is not None:
                         break
-                    output_bytes = self.current_proc.stdout.readline()
-                    if not output_bytes and self.current_proc.poll() is not None:
+                    time.sleep(self.CMD_POLL_INTERVAL)
+                    continue
+
+                # 取出目前累積的所有輸出，合併處理
+                try:
+                    chunk = output_queue.get(timeout=self.CMD_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                chunks = []
+                while chunk is not None:
+                    chunks.append(chunk)
+                    try:
+                        chunk = output_queue.get_nowait()
+                    except queue.Empty:
                         break
-                    if output_bytes:
-                        try:
-                            line = output_bytes.decode('cp950', errors='replace').strip()
-                            if line:
-                                self.log(f"[SYS] {line}")
-                        except Exception as e:
-                            print(f"Decode error: {e}")
-            
+                if chunk is None:
+                    eof = True
+                text = decoder.decode(b"".join(chunks), final=eof)
+                partial = self._log_output_lines(partial + text, final=eof)
+
             # 等待結束
-            ret = self.current_proc.wait(timeout=timeout)
+            remaining = None if deadline is None else max(0.1, deadline - time.monotonic())
+            ret = self.current_proc.wait(timeout=remaining)
+            if self.stop_flag:
+                result = "STOPPED"
+            else:
+                result = "PASS" if ret == 0 else "FAIL"
             
         except subprocess.TimeoutExpired:
+            result = "TIMEOUT"
             self.log(f"Command Timeout ({timeout}s): {cmd}")
             if self.current_proc:
-                self.current_proc.kill()
+                self.supervisor.kill_tree(self.current_proc)
             raise Exception(f"Command Timeout: {cmd}")           
         except Exception as e:
             self.log(f"Command Exception: {e}")
             if self.current_proc:
-                self.current_proc.kill()
+                self.supervisor.kill_tree(self.current_proc)
             raise e
         finally:
             self.current_proc = None
+            self.emit_event("cmd_end", cmd=cmd, rc=ret, result=result,
+                            duration=round(time.monotonic() - t_start, 3))
             
         self.check_stop()
 
@@ -272,6 +1009,31 @@ class BaseRunInApp(QMainWindow):
         
         self.log("CMD < PASS")
 
+    @staticmethod
+    def _pump_output(stream, output_queue):
+        """背景讀取子程序輸出，以 chunk 為單位放入 Queue，結束時放入 None"""
+        try:
+            while True:
+                chunk = stream.read1(65536)
+                if not chunk:
+                    break
+                output_queue.put(chunk)
+        except (OSError, ValueError):
+            pass
+        finally:
+            output_queue.put(None)
+
+    def _log_output_lines(self, text, final=False):
+        """將完整的行寫入 Log，回傳尚未換行的殘餘字串"""
+        lines = text.splitlines(keepends=True)
+        partial = ""
+        if lines and not final and not lines[-1].endswith(("\n", "\r")):
+            partial = lines.pop()
+        msgs = [f"[SYS] {line.strip()}" for line in lines if line.strip()]
+        if msgs:
+            self.log_lines(msgs)
+        return partial
+
     def run_external_tool_standalone(self, cmd_str):
         """
         專門用來執行像 FDPCMD 這種會搶 Console 的工具。
@@ -299,16 +1061,16 @@ class BaseRunInApp(QMainWindow):
         
     def save_state(self, block, step, cycle=1, status="IDLE"):
         state = {"block": block, "step": step, "cycle": cycle, "status": status}
-        with open(self.state_file, "w") as f: json.dump(state, f)
+        self.state_store.save(state)
         self.last_saved_state = state
+        self.emit_event("state", status=status)
 
     def load_state(self):
-        if os.path.exists(self.state_file):
-            with open(self.state_file, "r") as f: return json.load(f)
-        return None
+        return self.state_store.load()
 
     def clear_state(self):
-        if os.path.exists(self.state_file): os.remove(self.state_file)
+        history_file = self.state_store.clear()
+        self.archiver.submit(history_file, category="state")
 
     def trigger_reboot(self):
         try:
@@ -316,8 +1078,12 @@ class BaseRunInApp(QMainWindow):
             self.is_rebooting = True
 
             if not self.disable_runonce:
+                import winreg
                 key = winreg.CreateKeyEx(winreg.HKEY_CURRENT_USER, r"Software\Microsoft\Windows\CurrentVersion\RunOnce", 0, winreg.KEY_WRITE)
                 cmd = f'"{sys.executable}" "{os.path.abspath(sys.argv[0])}"'
+                # Headless 模式重開機後也要以 Headless 續跑
+                if "--headless" in sys.argv:
+                    cmd += " --headless"
                 winreg.SetValueEx(key, "ODM_RunIn", 0, winreg.REG_SZ, cmd)
                 winreg.CloseKey(key)
                 self.log("RunOnce Registry Key Set (Standalone Mode).")
@@ -325,6 +1091,12 @@ class BaseRunInApp(QMainWindow):
                 self.log("Skipping RunOnce Registry (Managed Mode).")
             
             self.log("Reboot triggered. Shutting down...")            
+            self.emit_event("reboot")
+            # 重開機前確保 Log 已落地
+            self.log_writer.flush(sync=True)
+            self.event_writer.flush(sync=True)
+            # 壓縮中的檔案最多等 5 秒，未完成的下次開機續做
+            self.archiver.wait_idle(5.0)
             subprocess.run("shutdown /r /t 0 /f", shell=True)
             while True: time.sleep(1)
         except Exception as e:
@@ -349,6 +1121,7 @@ class BaseRunInApp(QMainWindow):
                 return
 
             # 2. 開啟登錄檔路徑
+            import winreg
             key = winreg.CreateKeyEx(
                 winreg.HKEY_CURRENT_USER,
                 r"Software\Microsoft\Windows\CurrentVersion\RunOnce",
@@ -381,16 +1154,11 @@ class BaseRunInApp(QMainWindow):
         if self.stop_flag:
             self.log("=== TEST STOPPED BY USER (Please Restart Application) ===")
             self.set_status("TEST STOPPED")
-            self.btn_start.setText("STOPPED")
-            self.btn_start.setEnabled(False)
-            self.btn_stop.setEnabled(False)
+            self.set_run_state("STOPPED")
             #self.clear_state()
         else:
-            self.btn_start.setEnabled(False)
-            self.btn_stop.setEnabled(False)
-            
             if final_result:
-                self.btn_start.setText("PASS")
+                self.set_run_state("PASS")
                 if self.last_saved_state:
                     self.save_state(
                         self.last_saved_state.get("block", "1"),
@@ -399,7 +1167,7 @@ class BaseRunInApp(QMainWindow):
                         status="FINISHED_PASS"
                     )
             else:
-                self.btn_start.setText("FAIL")
+                self.set_run_state("FAIL")
                 if self.last_saved_state:
                     self.save_state(
                         self.last_saved_state.get("block", "1"),
@@ -408,35 +1176,46 @@ class BaseRunInApp(QMainWindow):
                         status="FINISHED_FAIL"
                     )
         
+        self.emit_event("run_end", result="PASS" if final_result else "FAIL",
+                        stopped=self.stop_flag, message=msg)
         # 產生結果檔
         self.generate_result_file(final_result)     
         self.archive_log()
+        # 本次 Run 的所有封存檔打包成單一 bundle 給站台上傳
+        self.archiver.bundle(datetime.now().strftime('%Y%m%d_%H%M%S'))
 
-    def closeEvent(self, event):
+    def shutdown(self, pump=None):
+        """
+        程式關閉時的收尾 (GUI closeEvent / Headless 結束都會呼叫)。
+        pump: 等待 Worker 期間定期呼叫的函式 (GUI 傳入 processEvents 避免畫面凍結)
+        """
         if self.is_rebooting:
-            event.accept()
+            self.log_writer.stop()
+            self.event_writer.stop()
             return
         
-        if hasattr(self, 'fan_thread') and self.fan_thread is not None:
-            if self.fan_thread.isRunning():
+        if getattr(self, 'fan_thread', None) is not None:
+            if self.fan_thread.is_alive():
                 self.log("Stopping fan monitor...")
                 self.fan_thread.stop() # FanMonitorThread 定義的 stop()
                 # Fan Thread 很快，通常不用太久的 wait，但為了保險可以 wait
-                self.fan_thread.wait(1000)
+                self.fan_thread.join(1.0)
 
         # --- 安全停止 Worker ---
-        if hasattr(self, 'worker') and self.worker.isRunning():
+        if self.is_running():
             self.log("Close event detected. Stopping worker thread...")
             self.stop_flag = True  # 通知 Worker 停止           
             # 嘗試等待一下讓 Worker 收屍 (選用，避免卡住 UI 太久)
             max_wait_time = 60000 
             start_time = time.time()
-            while self.worker.isRunning():
-                if self.worker.wait(100): 
+            while self.worker.is_alive():
+                self.worker.join(0.1)
+                if not self.worker.is_alive():
                     break # 如果 Worker 結束了就跳出
-                QApplication.processEvents()
+                if pump is not None:
+                    pump()
                 if (time.time() - start_time) * 1000 > max_wait_time:
-                    self.log("Worker thread timeout (30s), forcing close.")
+                    self.log("Worker thread timeout (60s), forcing close.")
                     break
         # -----------------------------        
         try:
@@ -452,25 +1231,60 @@ class BaseRunInApp(QMainWindow):
         # ----------------------------- 
         if self.current_proc and self.current_proc.poll() is None:
              subprocess.run(f"taskkill /F /T /PID {self.current_proc.pid}", shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        # 判斷依據：如果 START 按鈕是 Disabled (且不是 STOPPED 狀態)，代表正在跑
-        if not self.btn_start.isEnabled() and self.btn_start.text() == "RUNNING...":
+        # 收掉所有仍在執行的壓力/監控工具
+        self.supervisor.shutdown(grace=1.0, deadline=5.0)
+        # 判斷依據：測試仍在進行中 (尚未產生 PASS/FAIL) 就被關閉
+        if self.run_state in ("RUNNING", "STOPPING"):
             self.generate_result_file(False)
 
+        self.log_writer.flush(sync=True)
         if os.path.exists(self.current_log_file):
             self.archive_log(prefix="Runin_Debug_UserAbort_")
-        event.accept()
+        self.log_writer.stop()
+        self.event_writer.stop()
+        self.archiver.stop()
+
+    def run_headless(self):
+        """
+        無視窗模式: 依 AutoRun / 斷點續傳啟動後等待結束。
+        回傳 exit code (0=PASS, 1=FAIL/STOP, 2=未啟動, 3=重開機中)。
+        Ctrl+C 視同按下 STOP。
+        """
+        if self.worker is None:
+            self.check_auto_run()
+        if self.worker is None:
+            self.log("Headless mode: nothing to run (AutoRun disabled and no resume state).")
+            self.shutdown()
+            return 2
+        try:
+            while self.worker.is_alive():
+                self.worker.join(0.5)
+        except KeyboardInterrupt:
+            self.stop_test()
+        self.shutdown()
+        if self.is_rebooting:
+            return 3
+        return 0 if self.run_state == "PASS" else 1
 
     def archive_log(self, prefix="Runin_Debug_"):
-        if os.path.exists(self.current_log_file):
-            try:
-                timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S')
-                new_name = f"{prefix}{timestamp_str}.log"
-                new_path = os.path.join(self.log_dir, new_name)
-                if os.path.exists(new_path): os.remove(new_path)
-                os.rename(self.current_log_file, new_path)
-                self.sig_update_ui_log.emit(f"Log archived to: log\\{new_name}")
-            except Exception as e:
-                self.sig_update_ui_log.emit(f"Failed to archive log: {e}")
+        # 寫完、關檔、改名都由 writer 執行緒依序完成，改名前不會被其他執行緒的 log() 重新開啟
+        timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S')
+        try:
+            new_name = f"{prefix}{timestamp_str}.log"
+            new_path = os.path.join(self.log_dir, new_name)
+            if self.log_writer.rotate(new_path):
+                self.listener.on_log(f"Log archived to: log\\{new_name}")
+                self.archiver.submit(new_path, category="log")
+        except Exception as e:
+            self.listener.on_log(f"Failed to archive log: {e}")
+        try:
+            # 事件檔與 Debug Log 使用相同的時間戳記 (Runin_Debug_xxx -> Runin_Events_xxx)
+            event_prefix = prefix.replace("Runin_Debug", "Runin_Events", 1)
+            new_path = os.path.join(self.log_dir, f"{event_prefix}{timestamp_str}.jsonl")
+            if self.event_writer.rotate(new_path):
+                self.archiver.submit(new_path, category="log")
+        except Exception as e:
+            self.listener.on_log(f"Failed to archive events: {e}")
 
     # --- [新增] 結果檔管理功能 ---
     def cleanup_results(self):
@@ -501,8 +1315,5 @@ class BaseRunInApp(QMainWindow):
             self.log(f"Failed to generate result file: {e}")
     
     def set_status(self, text):
-        # 透過 emit 發送訊號，確保在主執行緒更新 UI (Thread-Safe)
-        self.sig_update_status.emit(text)
-
-    def update_status_label(self, text):
-        self.lbl_status.setText(text)
+        # 由 listener 負責切回主執行緒更新 UI (Thread-Safe)
+        self.listener.on_status(text)
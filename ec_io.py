@@ -0,0 +1,871 @@
+import os
+import time
+import json
+import queue
+import ctypes
+import random
+import threading
+from collections import namedtuple, deque
+from datetime import datetime
+
+from core import set_current_thread_priority
+
+# ==========================================
+# EC I/O
+# DirectEC 負責 request / 重試 / 時序選擇，實際的 port 存取交給 transport:
+# - InpOutTransport : inpoutx64.dll 直接存取 0x6C/0x68 (實機)
+# - SimulatedEC     : 純 Python 模擬 EC (非 Windows / 離線測試、benchmark)
+# - RecordingTransport / ReplayTransport : 錄下實機交易，之後離線重播
+# 程式內所有使用者透過 ECBroker 共用同一個 DirectEC
+# ==========================================
+
+# 單筆 EC 交易: cmd + payload，期望回傳 length bytes，decode(bytes) -> 數值
+ECRequest = namedtuple("ECRequest", "name cmd payload length decode retries wait_s")
+# 單筆交易結果: raw 為實際收到的 bytes，latency 為含重試的總耗時 (秒)
+ECResult = namedtuple("ECResult", "name ok value raw latency attempts")
+
+def _decode_u8(resp):
+    return resp[0]
+
+def _decode_u16le(resp):
+    return resp[0] | (resp[1] << 8)
+
+def _decode_s16le(resp):
+    # 先組合成 Unsigned 16-bit，再轉 Signed 16-bit (Two's Complement)
+    raw_val = resp[0] | (resp[1] << 8)
+    return raw_val - 65536 if raw_val >= 32768 else raw_val
+
+def ec_fan_rpm_request(fan_id):
+    # CMD=0x20, SubCmd=0x05, Payload=[0x05, FanID]，回傳: [LowByte, HighByte]
+    return ECRequest(f"fan{fan_id}_rpm", 0x20, (0x05, fan_id), 2, _decode_u16le, 3, 0.05)
+
+# CMD=0x28, TS2_SubCmd=0x05 (對應 thermaltest.py 中的 "ts2")，回傳: [Temp]
+EC_TS2_TEMP = ECRequest("ts2", 0x28, (0x05,), 1, _decode_u8, 3, 0.05)
+# CMD=0x31, SubCmd=0x05，回傳 Signed 16-bit 充電電流
+EC_CHARGING_CURRENT = ECRequest("charging_current", 0x31, (0x05,), 2, _decode_s16le, 3, 0.1)
+
+# EC handshake 時序:
+# cmd_delay / data_delay: 寫完 command / data byte 後的固定延遲
+# ibf_timeout / obf_timeout: 等待 IBF 清除 / OBF 設定的上限
+# spin_s: 等待狀態時先忙等 (不 sleep) 的時間，超過才每 1ms sleep 一次
+ECTiming = namedtuple("ECTiming", "cmd_delay data_delay ibf_timeout obf_timeout spin_s")
+# 原本 ecio 的保守時序 (沒有校正檔時使用；快速時序連續出錯時也退回這裡)
+EC_CONSERVATIVE_TIMING = ECTiming(0.05, 0.005, 0.5, 0.5, 0.0)
+
+# KBC 狀態位元
+EC_STATUS_OBF = 0x01
+EC_STATUS_IBF = 0x02
+
+class ECBatchResult:
+    """read_batch 的結果集，依 request name 取值"""
+    def __init__(self, results, elapsed):
+        self.results = results
+        self.by_name = {r.name: r for r in results}
+        self.elapsed = elapsed
+
+    def __getitem__(self, name):
+        return self.by_name[name]
+
+    def __iter__(self):
+        return iter(self.results)
+
+    @property
+    def ok(self):
+        return all(r.ok for r in self.results)
+
+    def value(self, name, default=0):
+        r = self.by_name.get(name)
+        return r.value if r is not None and r.ok else default
+
+    def latencies(self):
+        return {r.name: r.latency for r in self.results}
+
+# ==========================================
+# 統計: 每個 command 的次數 / 錯誤 / 延遲分佈
+# ==========================================
+class ECTrace:
+    """單次交易的量測 (由 transport 填入)"""
+    __slots__ = ("ibf_wait", "obf_wait", "timeout")
+
+    def __init__(self):
+        self.ibf_wait = 0.0
+        self.obf_wait = 0.0
+        self.timeout = None
+
+class LatencyHistogram:
+    """固定級距 (us) 的延遲分佈，記錄成本固定，不保留原始樣本"""
+    BOUNDS_US = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000)
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS_US) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        us = seconds * 1e6
+        idx = 0
+        for idx, bound in enumerate(self.BOUNDS_US):
+            if us <= bound:
+                break
+        else:
+            idx = len(self.BOUNDS_US)
+        self.buckets[idx] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        """回傳第 p 百分位所在級距的上限 (us，不超過實際最大值)"""
+        if not self.count:
+            return 0
+        target = self.count * p / 100.0
+        running = 0
+        for idx, n in enumerate(self.buckets):
+            running += n
+            if running >= target:
+                if idx < len(self.BOUNDS_US):
+                    return min(self.BOUNDS_US[idx], round(self.max * 1e6))
+                return round(self.max * 1e6)
+        return round(self.max * 1e6)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_us": round(self.total * 1e6 / self.count, 1) if self.count else 0,
+            "p50_us": self.percentile(50),
+            "p99_us": self.percentile(99),
+            "max_us": round(self.max * 1e6, 1),
+            "buckets": {f"<={b}us": n for b, n in zip(self.BOUNDS_US, self.buckets) if n},
+            "overflow": self.buckets[-1],
+        }
+
+class ECCommandStats:
+    """單一 request (如 fan1_rpm) 的累計統計"""
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.attempts = 0
+        self.retries = 0
+        self.ibf_timeouts = 0
+        self.obf_timeouts = 0
+        self.short_reads = 0
+        self.ibf_wait = LatencyHistogram()
+        self.obf_wait = LatencyHistogram()
+        self.total = LatencyHistogram()
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "ibf_timeouts": self.ibf_timeouts,
+            "obf_timeouts": self.obf_timeouts,
+            "short_reads": self.short_reads,
+            "ibf_wait": self.ibf_wait.to_dict(),
+            "obf_wait": self.obf_wait.to_dict(),
+            "total": self.total.to_dict(),
+        }
+
+class ECStats:
+    """DirectEC 的統計 (thread-safe)，用來分辨 EC 不穩與風扇真的異常"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.by_name = {}
+        self.fallbacks = 0
+
+    def _get(self, name):
+        stats = self.by_name.get(name)
+        if stats is None:
+            stats = self.by_name[name] = ECCommandStats()
+        return stats
+
+    def record_attempt(self, name, ok, trace):
+        with self.lock:
+            s = self._get(name)
+            s.attempts += 1
+            s.ibf_wait.add(trace.ibf_wait)
+            if trace.timeout == "ibf":
+                s.ibf_timeouts += 1
+            elif trace.timeout == "obf":
+                s.obf_timeouts += 1
+            else:
+                s.obf_wait.add(trace.obf_wait)
+                if not ok:
+                    s.short_reads += 1
+
+    def record_request(self, name, ok, attempts, latency):
+        with self.lock:
+            s = self._get(name)
+            s.requests += 1
+            s.retries += max(0, attempts - 1)
+            if not ok:
+                s.failures += 1
+            s.total.add(latency)
+
+    def record_fallback(self):
+        with self.lock:
+            self.fallbacks += 1
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.by_name = {}
+            self.fallbacks = 0
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "since": datetime.fromtimestamp(self.started).strftime("%Y-%m-%d %H:%M:%S"),
+                "fallbacks": self.fallbacks,
+                "commands": {name: s.to_dict() for name, s in sorted(self.by_name.items())},
+            }
+
+    def summary_lines(self):
+        """給 Log 用的一行一個 command 摘要"""
+        lines = []
+        with self.lock:
+            for name, s in sorted(self.by_name.items()):
+                lines.append(f"[EC] {name}: req={s.requests} fail={s.failures} retry={s.retries} "
+                             f"ibf_to={s.ibf_timeouts} obf_to={s.obf_timeouts} short={s.short_reads} "
+                             f"p50={s.total.percentile(50)}us p99={s.total.percentile(99)}us "
+                             f"max={s.total.max * 1e6:.0f}us")
+        return lines
+
+# ==========================================
+# Transport
+# ==========================================
+class ECTransport:
+    """
+    EC 傳輸介面。
+    transact(cmd, payload, expect_len, wait_s, timing, trace) 回傳收到的 bytes (list)，失敗回傳 None。
+    trace (ECTrace，可為 None): 由 port 類 transport 填入 IBF/OBF 等待時間與逾時位置。
+    """
+    name = "base"
+    ready = True
+
+    def transact(self, cmd, payload, expect_len, wait_s, timing, trace=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class PortTransport(ECTransport):
+    """以 KBC 風格的 command/data port + IBF/OBF handshake 實作 transact，子類別只需提供 inp/outp"""
+    def __init__(self, cmd_port=0x6C, dat_port=0x68):
+        self.cmd_port = cmd_port
+        self.dat_port = dat_port
+
+    def inp(self, port):
+        raise NotImplementedError
+
+    def outp(self, port, value):
+        raise NotImplementedError
+
+    def _wait_status(self, mask, want_set, timeout_s, spin_s):
+        """
+        等待狀態位元，成功回傳等待秒數，逾時回傳 None。
+        前 spin_s 秒忙等 (EC 通常在數十 us 內回應)，之後每 1ms sleep 一次。
+        """
+        t0 = time.perf_counter()
+        while True:
+            ready = (self.inp(self.cmd_port) & mask) != 0
+            elapsed = time.perf_counter() - t0
+            if ready == want_set:
+                return elapsed
+            if elapsed >= timeout_s:
+                return None
+            if elapsed >= spin_s:
+                time.sleep(0.001)
+
+    def wait_ibf_clear(self, timeout_s=0.5, spin_s=0.0):
+        """等待 Input Buffer Full 清除"""
+        return self._wait_status(EC_STATUS_IBF, False, timeout_s, spin_s) is not None
+
+    def wait_obf_set(self, timeout_s=0.5, spin_s=0.0):
+        """等待 Output Buffer Full 設定 (有資料可讀)"""
+        return self._wait_status(EC_STATUS_OBF, True, timeout_s, spin_s) is not None
+
+    def drain_obf(self, limit=16):
+        """丟掉上一筆交易殘留在 Output Buffer 的資料，避免回應錯位"""
+        for _ in range(limit):
+            if (self.inp(self.cmd_port) & EC_STATUS_OBF) == 0:
+                return
+            self.inp(self.dat_port)
+
+    def transact(self, cmd, payload, expect_len, wait_s, timing, trace=None):
+        t = timing
+        trace = trace if trace is not None else ECTrace()
+        # 校正後的 OBF 上限比 request 的 wait_s 更短時以校正值為準
+        obf_timeout = min(wait_s, t.obf_timeout)
+
+        self.drain_obf()
+        # 1. Write Command
+        w = self._wait_status(EC_STATUS_IBF, False, t.ibf_timeout, t.spin_s)
+        if w is None:
+            trace.timeout = "ibf"
+            return None
+        trace.ibf_wait += w
+        self.outp(self.cmd_port, cmd)
+        if t.cmd_delay:
+            time.sleep(t.cmd_delay) # 模擬 ecio 的 command delay
+
+        # 2. Write Payload
+        for d in payload:
+            w = self._wait_status(EC_STATUS_IBF, False, t.ibf_timeout, t.spin_s)
+            if w is None:
+                trace.timeout = "ibf"
+                return None
+            trace.ibf_wait += w
+            self.outp(self.dat_port, d)
+            if t.data_delay:
+                time.sleep(t.data_delay) # 模擬 ecio 的 data delay
+
+        # 3. Read Response
+        resp = []
+        for _ in range(expect_len):
+            w = self._wait_status(EC_STATUS_OBF, True, obf_timeout, t.spin_s)
+            if w is None:
+                trace.timeout = "obf"
+                break # Timeout or no more data
+            trace.obf_wait += w
+            resp.append(self.inp(self.dat_port) & 0xFF)
+        return resp
+
+    def measure(self, request, ibf_timeout=0.5):
+        """以無延遲、全程忙等的方式執行一筆交易，回傳 (IBF 等待時間 list, OBF 等待時間 list)，失敗回傳 None"""
+        ibf, obf = [], []
+        self.drain_obf()
+        if self._wait_status(EC_STATUS_IBF, False, ibf_timeout, 0.0) is None: return None
+        self.outp(self.cmd_port, request.cmd)
+        for d in request.payload:
+            w = self._wait_status(EC_STATUS_IBF, False, ibf_timeout, ibf_timeout)
+            if w is None: return None
+            ibf.append(w)
+            self.outp(self.dat_port, d)
+        for _ in range(request.length):
+            w = self._wait_status(EC_STATUS_OBF, True, request.wait_s, request.wait_s)
+            if w is None: return None
+            obf.append(w)
+            self.inp(self.dat_port)
+        return ibf, obf
+
+class InpOutTransport(PortTransport):
+    """實機: 透過 inpoutx64.dll 存取 EC port"""
+    name = "inpout"
+
+    def __init__(self, dll_folder, cmd_port=0x6C, dat_port=0x68):
+        super().__init__(cmd_port, dat_port)
+        self.dll = None
+        self.ready = False
+        # 設定 inpoutx64.dll 路徑
+        dll_path = os.path.join(dll_folder, "inpoutx64.dll")
+        if not os.path.exists(dll_path):
+            print(f"[DirectEC] Error: DLL not found at {dll_path}")
+            return
+        try:
+            self.dll = ctypes.WinDLL(dll_path)
+            self.ready = True
+            print("[DirectEC] DLL Loaded successfully.")
+        except Exception as e:
+            print(f"[DirectEC] Failed to load DLL: {e}")
+            self.dll = None
+
+    def inp(self, port):
+        return self.dll.Inp32(port)
+
+    def outp(self, port, value):
+        self.dll.Out32(port, value)
+
+class SimulatedEC(PortTransport):
+    """
+    純 Python 模擬 EC (port 層級，IBF/OBF handshake 與實機相同)。
+    - 風扇: RPM 以一階延遲趨近 duty x max_rpm，加上少量雜訊
+    - TS2 : 溫度以一階延遲趨近 ambient + load x temp_rise
+    - 充電電流: Signed 16-bit (mA)，負值代表放電
+    latency_s / response_s 模擬 EC 收 byte / 準備回應的時間；
+    drop_rate (不回應) / corrupt_rate (回應錯誤值) / stuck_rate (IBF 卡住) 用於注入錯誤。
+    """
+    name = "sim"
+    # 各 command 的 payload 長度 (未列出者視為 1)
+    PAYLOAD_LEN = {0x20: 2, 0x28: 1, 0x31: 1}
+
+    def __init__(self, fan_count=2, max_rpm=6000, duty=60, ambient=35.0, temp_rise=50.0, load=0.0,
+                 charging_current=1500, tau_s=5.0, noise_rpm=30, latency_s=0.00005, response_s=0.0002,
+                 drop_rate=0.0, corrupt_rate=0.0, stuck_rate=0.0, seed=None):
+        super().__init__()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.fan_count = fan_count
+        self.max_rpm = max_rpm
+        self.duty = {fan_id: duty for fan_id in range(1, fan_count + 1)}
+        self.rpm = {fan_id: duty * max_rpm / 100.0 for fan_id in self.duty}
+        self.ambient = ambient
+        self.temp_rise = temp_rise
+        self.load = load
+        self.temp = ambient + load * temp_rise
+        self.charging_current = charging_current
+        self.tau_s = tau_s
+        self.noise_rpm = noise_rpm
+        self.latency_s = latency_s
+        self.response_s = response_s
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.stuck_rate = stuck_rate
+        self.last_update = time.perf_counter()
+        self.ibf_busy_until = 0.0
+        self.obf_ready_at = 0.0
+        self.cmd = None
+        self.payload = []
+        self.output = deque()
+
+    # --- 測試用控制介面 ---
+    def set_duty(self, fan_id, duty):
+        with self.lock:
+            self.duty[fan_id] = duty
+
+    def set_load(self, load):
+        with self.lock:
+            self.load = load
+
+    def set_charging_current(self, current_ma):
+        with self.lock:
+            self.charging_current = current_ma
+
+    # --- 物理模型 ---
+    def _advance(self, now):
+        dt = now - self.last_update
+        self.last_update = now
+        k = min(1.0, dt / self.tau_s) if self.tau_s > 0 else 1.0
+        for fan_id, duty in self.duty.items():
+            target = duty * self.max_rpm / 100.0
+            self.rpm[fan_id] += (target - self.rpm[fan_id]) * k
+        self.temp += (self.ambient + self.load * self.temp_rise - self.temp) * k
+
+    def _respond(self):
+        cmd, payload = self.cmd, self.payload
+        if cmd == 0x20 and payload[0] == 0x05:
+            fan_id = payload[1]
+            if fan_id not in self.rpm:
+                return [0, 0]
+            rpm = max(0, int(self.rpm[fan_id] + self.rng.uniform(-self.noise_rpm, self.noise_rpm)))
+            return [rpm & 0xFF, (rpm >> 8) & 0xFF]
+        if cmd == 0x28:
+            return [max(0, min(255, int(round(self.temp))))]
+        if cmd == 0x31:
+            raw = int(self.charging_current) & 0xFFFF
+            return [raw & 0xFF, raw >> 8]
+        # 其他設定類 command 不回資料
+        return []
+
+    # --- port 介面 ---
+    def inp(self, port):
+        with self.lock:
+            now = time.perf_counter()
+            if port == self.cmd_port:
+                status = 0
+                if now < self.ibf_busy_until:
+                    status |= EC_STATUS_IBF
+                if self.output and now >= self.obf_ready_at:
+                    status |= EC_STATUS_OBF
+                return status
+            return self.output.popleft() if self.output else 0
+
+    def outp(self, port, value):
+        with self.lock:
+            now = time.perf_counter()
+            stuck = self.stuck_rate and self.rng.random() < self.stuck_rate
+            self.ibf_busy_until = now + (1.0 if stuck else self.latency_s)
+            if port == self.cmd_port:
+                self.cmd = value
+                self.payload = []
+                self.output.clear()
+                return
+            self.payload.append(value)
+            if self.cmd is None or len(self.payload) < self.PAYLOAD_LEN.get(self.cmd, 1):
+                return
+            self._advance(now)
+            resp = self._respond()
+            self.cmd = None
+            if self.drop_rate and self.rng.random() < self.drop_rate:
+                return
+            if resp and self.corrupt_rate and self.rng.random() < self.corrupt_rate:
+                resp[0] ^= 0xFF
+            self.output.extend(resp)
+            self.obf_ready_at = now + self.response_s
+
+class RecordingTransport(ECTransport):
+    """包住另一個 transport，把每筆交易 (含回應與耗時) 寫入 JSONL，供 ReplayTransport 重播"""
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.name = f"record({inner.name})"
+        self.ready = inner.ready
+        self.path = path
+        self.lock = threading.Lock()
+        self.t0 = time.perf_counter()
+        self.file = open(path, "a", encoding="utf-8")
+
+    def transact(self, cmd, payload, expect_len, wait_s, timing, trace=None):
+        t0 = time.perf_counter()
+        resp = self.inner.transact(cmd, payload, expect_len, wait_s, timing, trace)
+        latency = time.perf_counter() - t0
+        with self.lock:
+            self.file.write(json.dumps({
+                "t": round(t0 - self.t0, 6), "cmd": cmd, "payload": list(payload), "len": expect_len,
+                "resp": resp, "latency": round(latency, 6),
+            }) + "\n")
+        return resp
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+        self.inner.close()
+
+class ReplayTransport(ECTransport):
+    """
+    重播 RecordingTransport 的紀錄。
+    相同 (cmd, payload) 依錄製順序回應，用完後從頭循環；realtime=True 時重現錄到的耗時。
+    """
+    name = "replay"
+
+    def __init__(self, path, realtime=False, loop=True):
+        self.realtime = realtime
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.records = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue # 錄製中斷時最後一行可能不完整
+                key = (rec["cmd"], tuple(rec["payload"]))
+                self.records.setdefault(key, []).append((rec["resp"], rec["latency"]))
+        self.cursor = {key: 0 for key in self.records}
+
+    def transact(self, cmd, payload, expect_len, wait_s, timing, trace=None):
+        key = (cmd, tuple(payload))
+        with self.lock:
+            entries = self.records.get(key)
+            if not entries:
+                return None
+            idx = self.cursor[key]
+            if idx >= len(entries):
+                if not self.loop:
+                    return None
+                idx = 0
+            self.cursor[key] = idx + 1
+            resp, latency = entries[idx]
+        if self.realtime:
+            time.sleep(latency)
+        return list(resp) if resp is not None else None
+
+def _parse_options(text):
+    """'seed=1,drop_rate=0.01' -> {'seed': 1, 'drop_rate': 0.01}"""
+    options = {}
+    for item in filter(None, (p.strip() for p in text.split(","))):
+        key, _, value = item.partition("=")
+        try:
+            options[key.strip()] = int(value)
+        except ValueError:
+            options[key.strip()] = float(value)
+    return options
+
+def create_transport(dll_folder, spec=None, record_path=None):
+    """
+    依 spec 建立 transport (預設讀環境變數 RUNIN_EC_BACKEND / RUNIN_EC_RECORD):
+      inpout (預設) | sim[:key=value,...] | replay:<path>[:realtime]
+    record_path 有值時另外錄下所有交易。
+    """
+    spec = spec if spec is not None else os.environ.get("RUNIN_EC_BACKEND", "inpout")
+    record_path = record_path if record_path is not None else os.environ.get("RUNIN_EC_RECORD")
+    kind, _, arg = spec.partition(":")
+    if kind == "sim":
+        transport = SimulatedEC(**_parse_options(arg))
+    elif kind == "replay":
+        path, _, flag = arg.partition(":")
+        transport = ReplayTransport(path, realtime=(flag == "realtime"))
+    else:
+        transport = InpOutTransport(dll_folder)
+    if record_path:
+        transport = RecordingTransport(transport, record_path)
+    return transport
+
+# ==========================================
+# DirectEC
+# ==========================================
+class DirectEC:
+    # 校正檔 (每台機器各自一份)
+    PROFILE_NAME = "ec_timing.json"
+    # 連續幾筆交易失敗後退回保守時序
+    FALLBACK_AFTER = 3
+
+    def __init__(self, dll_folder=None, transport=None, profile_path=None):
+        self.transport = transport if transport is not None else create_transport(dll_folder)
+        self.initialized = self.transport.ready
+        # 校正過 (load_profile / calibrate) 才改用不含固定延遲的快速時序
+        self.timing = EC_CONSERVATIVE_TIMING
+        self.fast_timing = None
+        self.consecutive_errors = 0
+        self.stats = ECStats()
+        if profile_path is None and dll_folder is not None:
+            profile_path = os.path.join(dll_folder, self.PROFILE_NAME)
+        self.profile_path = profile_path
+        if self.initialized and self.profile_path:
+            self.load_profile()
+
+    # --- 時序校正檔 ---
+    def load_profile(self):
+        """讀取校正過的時序，沒有或格式錯誤時維持保守時序"""
+        try:
+            with open(self.profile_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.fast_timing = ECTiming(**data["timing"])
+            self.timing = self.fast_timing
+            print(f"[DirectEC] Timing profile loaded: {self.fast_timing}")
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"[DirectEC] Invalid timing profile ({e}), using conservative timing.")
+            return False
+
+    def save_profile(self, timing, stats):
+        tmp_path = self.profile_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "backend": self.transport.name,
+                "timing": timing._asdict(),
+                "stats": stats,
+            }, f, indent=2)
+        os.replace(tmp_path, self.profile_path)
+
+    def txrx(self, cmd, data_payload, expect_len, wait_s=0.05, timing=None, trace=None):
+        """
+        依目前時序 (self.timing) 執行一次交易。
+        保守時序 (未校正) 沿用 ecio 的固定延遲；校正後的時序只依 IBF/OBF 狀態決定節奏。
+        """
+        if not self.initialized: return None
+        try:
+            return self.transport.transact(cmd, data_payload, expect_len, wait_s, timing or self.timing, trace)
+        except Exception as e:
+            print(f"[DirectEC] txrx error: {e}")
+            return None
+
+    def _note_result(self, ok):
+        """記錄交易成功/失敗，快速時序連續出錯就退回保守時序"""
+        if ok:
+            self.consecutive_errors = 0
+            return
+        self.consecutive_errors += 1
+        if self.timing is not EC_CONSERVATIVE_TIMING and self.consecutive_errors >= self.FALLBACK_AFTER:
+            print(f"[DirectEC] {self.consecutive_errors} consecutive EC errors, falling back to conservative timing.")
+            self.timing = EC_CONSERVATIVE_TIMING
+            self.consecutive_errors = 0
+            self.stats.record_fallback()
+
+    # --- 校正模式 ---
+    def calibrate(self, requests, rounds=50, margin=4.0, min_timeout=0.002):
+        """
+        量測本機 EC 的 IBF/OBF 反應時間，產生並驗證快速時序後存檔。
+        逾時上限 = 最大觀測值 x margin (不低於 min_timeout，不超過保守值)。
+        驗證期間只要有一筆失敗就不採用 (維持目前時序)，回傳 (timing 或 None, stats)。
+        """
+        if not self.initialized:
+            return None, {"error": "EC not initialized"}
+        if not hasattr(self.transport, "measure"):
+            return None, {"error": f"backend '{self.transport.name}' does not support calibration"}
+        c = EC_CONSERVATIVE_TIMING
+        ibf_all, obf_all, failures = [], [], 0
+        for _ in range(rounds):
+            for req in requests:
+                m = self.transport.measure(req, ibf_timeout=c.ibf_timeout)
+                if m is None:
+                    failures += 1
+                    continue
+                ibf_all.extend(m[0])
+                obf_all.extend(m[1])
+        stats = {"rounds": rounds, "failures": failures, "samples": len(ibf_all) + len(obf_all)}
+        if not ibf_all or not obf_all or failures:
+            return None, stats
+        ibf_max, obf_max = max(ibf_all), max(obf_all)
+        stats.update(ibf_max_ms=round(ibf_max * 1000, 3), obf_max_ms=round(obf_max * 1000, 3))
+        timing = ECTiming(
+            cmd_delay=0.0,
+            data_delay=0.0,
+            ibf_timeout=min(c.ibf_timeout, max(min_timeout, ibf_max * margin)),
+            obf_timeout=min(c.obf_timeout, max(min_timeout, obf_max * margin)),
+            # 忙等涵蓋大部分回應時間，避免落入 Windows sleep 的 1~15ms 粒度
+            spin_s=min(0.005, max(ibf_max, obf_max) * 2),
+        )
+        # 用新時序再跑一輪驗證
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            for req in requests:
+                resp = self.txrx(req.cmd, req.payload, req.length, wait_s=req.wait_s, timing=timing)
+                if not resp or len(resp) != req.length:
+                    stats["verify_failures"] = stats.get("verify_failures", 0) + 1
+        if stats.get("verify_failures"):
+            return None, stats
+        stats["verify_ms_per_txn"] = round((time.perf_counter() - t0) * 1000 / (rounds * len(requests)), 3)
+        if self.profile_path:
+            self.save_profile(timing, stats)
+        self.fast_timing = timing
+        self.timing = timing
+        return timing, stats
+
+    def read(self, request):
+        """執行單筆 ECRequest (含重試)，回傳 ECResult"""
+        t0 = time.perf_counter()
+        resp = None
+        attempts = 0
+        if self.initialized:
+            for attempts in range(1, request.retries + 1):
+                trace = ECTrace()
+                resp = self.txrx(request.cmd, request.payload, request.length, wait_s=request.wait_s, trace=trace)
+                ok = bool(resp) and len(resp) == request.length
+                self.stats.record_attempt(request.name, ok, trace)
+                self._note_result(ok)
+                if ok:
+                    latency = time.perf_counter() - t0
+                    self.stats.record_request(request.name, True, attempts, latency)
+                    return ECResult(request.name, True, request.decode(resp), tuple(resp), latency, attempts)
+        latency = time.perf_counter() - t0
+        if self.initialized:
+            self.stats.record_request(request.name, False, attempts, latency)
+        return ECResult(request.name, False, None, tuple(resp or ()), latency, attempts)
+
+    def read_batch(self, requests, max_age=None):
+        """
+        依序執行多筆 ECRequest (中間不插固定 sleep，由 IBF/OBF 狀態控制節奏)。
+        回傳 ECBatchResult，每筆含數值與 latency。max_age 只為與 ECBroker 介面相同 (DirectEC 沒有快取)
+        """
+        t0 = time.perf_counter()
+        results = [self.read(req) for req in requests]
+        return ECBatchResult(results, time.perf_counter() - t0)
+
+    def get_fan_rpm(self, fan_id):
+        return self.read(ec_fan_rpm_request(fan_id)).value or 0
+
+    def get_ts2_temp(self):
+        return self.read(EC_TS2_TEMP).value or 0
+
+    def get_charging_current(self):
+        return self.read(EC_CHARGING_CURRENT).value or 0
+
+    def close(self):
+        self.transport.close()
+
+# ==========================================
+# ECBroker: 唯一擁有 EC port 的執行緒
+# ==========================================
+class _PendingRead:
+    """排隊中的讀取，同一個 request 的所有等待者共用"""
+    def __init__(self, request):
+        self.request = request
+        self.result = None
+        self.done = threading.Event()
+
+class ECBroker(threading.Thread):
+    """
+    所有 EC 存取都經過這裡，由單一執行緒依序執行交易 (不同使用者的 byte 不會交錯)。
+    - ttl 秒內重複的讀取直接回傳快取，排隊中的相同讀取合併成一次
+    介面與 DirectEC 相同 (read / read_batch / get_*)，可直接替換。
+    """
+    def __init__(self, ec, ttl=0.2, priority=None, name="ECBroker"):
+        super().__init__(name=name, daemon=True)
+        self.ec = ec
+        self.ttl = ttl
+        self.priority = priority
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.cache = {}
+        self.inflight = {}
+
+    @property
+    def initialized(self):
+        return self.ec.initialized
+
+    @property
+    def stats(self):
+        return self.ec.stats
+
+    @staticmethod
+    def _key(request):
+        return (request.cmd, tuple(request.payload), request.length)
+
+    def submit(self, request, max_age=None):
+        """快取未過期時回傳 ECResult，否則回傳排隊中的 _PendingRead"""
+        ttl = self.ttl if max_age is None else max_age
+        key = self._key(request)
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None and time.perf_counter() - cached[0] <= ttl:
+                return cached[1]._replace(name=request.name)
+            pending = self.inflight.get(key)
+            if pending is None:
+                pending = _PendingRead(request)
+                self.inflight[key] = pending
+                self.queue.put(pending)
+            return pending
+
+    def _wait(self, request, item, timeout):
+        if isinstance(item, ECResult):
+            return item
+        if item.done.wait(timeout) and item.result is not None:
+            return item.result._replace(name=request.name)
+        return ECResult(request.name, False, None, (), timeout, 0)
+
+    def read(self, request, max_age=None, timeout=5.0):
+        return self._wait(request, self.submit(request, max_age), timeout)
+
+    def read_batch(self, requests, max_age=None, timeout=5.0):
+        """先全部排入佇列 (broker 連續執行)，再一起等待結果"""
+        t0 = time.perf_counter()
+        items = [self.submit(req, max_age) for req in requests]
+        results = [self._wait(req, item, timeout) for req, item in zip(requests, items)]
+        return ECBatchResult(results, time.perf_counter() - t0)
+
+    def get_fan_rpm(self, fan_id):
+        return self.read(ec_fan_rpm_request(fan_id)).value or 0
+
+    def get_ts2_temp(self):
+        return self.read(EC_TS2_TEMP).value or 0
+
+    def get_charging_current(self):
+        return self.read(EC_CHARGING_CURRENT).value or 0
+
+    def run(self):
+        if self.priority is not None:
+            set_current_thread_priority(self.priority)
+        while True:
+            pending = self.queue.get()
+            if pending is None:
+                break
+            result = self.ec.read(pending.request)
+            key = self._key(pending.request)
+            with self.lock:
+                if result.ok:
+                    self.cache[key] = (time.perf_counter(), result)
+                self.inflight.pop(key, None)
+            pending.result = result
+            pending.done.set()
+        # 停止後仍在等待的讀取直接結束
+        with self.lock:
+            leftovers = list(self.inflight.values())
+            self.inflight.clear()
+        for pending in leftovers:
+            pending.done.set()
+
+    def stop(self, timeout=2.0):
+        self.queue.put(None)
+        if self.is_alive():
+            self.join(timeout)
+        self.ec.close()
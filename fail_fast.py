@@ -0,0 +1,59 @@
+from collections import defaultdict, namedtuple
+
+# ==========================================
+# 燒機期間的即時檢查 (Fail Fast)
+# Fan Monitor / PTAT / GPUMon 的新樣本陸續送進來，硬性上下限連續超出 grace 秒即判定失敗，
+# 不必等整段燒機跑完才在驗證階段發現
+# ==========================================
+
+# limit: runin_config.AbortLimit；value: 最後一筆超出的值；since / last: 連續超出的第一筆與最後一筆時間 (epoch 秒)
+AbortTrip = namedtuple("AbortTrip", "limit value since last")
+
+class _Watch:
+    __slots__ = ("limit", "since", "tripped")
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.since = None
+        self.tripped = False
+
+class LiveVerifier:
+    """
+    每個 AbortLimit 記錄目前連續超出的起點，回到範圍內即重新計算；
+    超出持續時間以樣本本身的時間計算 (不受檢查週期影響)，>= grace_seconds 即觸發。
+    讀取失敗的值 (None) 不影響判定。
+    """
+    def __init__(self, limits, grace_seconds):
+        self.grace_seconds = grace_seconds
+        self.limits = tuple(limits)
+        # source (小寫) -> {column: [_Watch, ...]}
+        self.watches = defaultdict(dict)
+        for limit in self.limits:
+            self.watches[limit.source.lower()].setdefault(limit.column, []).append(_Watch(limit))
+        self.trips = []
+
+    def columns(self, source):
+        """source 需要檢查的欄位"""
+        return tuple(self.watches.get(source.lower(), ()))
+
+    def feed(self, source, t, values):
+        """一筆樣本: values 為 {column: value}，沒有設定上下限的欄位略過"""
+        watches = self.watches.get(source.lower())
+        if not watches:
+            return
+        for column, value in values.items():
+            if value is None:
+                continue
+            for w in watches.get(column, ()):
+                if w.limit.limit.contains(value):
+                    w.since = None
+                    continue
+                if w.since is None:
+                    w.since = t
+                if not w.tripped and t - w.since >= self.grace_seconds:
+                    w.tripped = True
+                    self.trips.append(AbortTrip(w.limit, value, w.since, t))
+
+    def tripped(self):
+        """已觸發的上下限 (觸發後不會解除)"""
+        return list(self.trips)
@@ -0,0 +1,265 @@
+import csv
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from stats_engine import Series, summary
+from timestamps import TimestampParser, detect_date_order, to_epoch, DMY, MDY, YMD
+
+# ==========================================
+# 外部工具 Log 分析 (PTAT / GPUMon / Fan Log / Config 自訂來源)
+# 各來源只描述 Header 位置與時間欄位 (LogSource)，讀檔 / 時間解析 / 統計共用同一套流程：
+# 檔頭只讀一次 (Header + 判斷日期格式)，資料從檔尾往回讀，只解析最後 N 秒
+# 燒機中仍在寫入的 Log 用 LogTailer 增量讀取新增的行
+# ==========================================
+
+# 從檔尾往回讀的區塊大小
+TAIL_BLOCK_SIZE = 64 * 1024
+# 判斷日期格式時讀取的資料列數
+DETECT_ROWS = 50
+
+# Log 來源描述
+# header_row: Header 所在列 (0 起算，之前的說明列略過)
+# date_col / time_col: 時間欄位 (欄位位置 int 或 Header 名稱)；time_col=None 表示日期時間在同一欄 (空白分隔)
+# date_order: DMY / MDY / YMD；None 表示依檔頭資料判斷，判斷不出來時用 default_order
+LogSource = namedtuple("LogSource", "name header_row date_col time_col date_order default_order")
+
+# rows: 時間範圍內的資料列數；missing: Header 找不到的欄位；stats: {欄位名稱: WindowStats}
+# series: {欄位名稱: stats_engine.Series (時間遞增)}，進一步統計 (P95 / slope ...) 用
+LogScan = namedtuple("LogScan", "path rows missing stats series")
+
+LOG_SOURCES = {}
+
+def register_source(source):
+    """登記 (或覆蓋) 一個 Log 來源，名稱不分大小寫"""
+    if source.date_order not in (None, DMY, MDY, YMD):
+        raise ValueError(f"{source.name}: unknown date order '{source.date_order}'")
+    LOG_SOURCES[source.name.lower()] = source
+    return source
+
+def get_source(source):
+    """名稱 -> LogSource (已經是 LogSource 時直接回傳)"""
+    if isinstance(source, LogSource):
+        return source
+    try:
+        return LOG_SOURCES[source.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown log source '{source}'") from None
+
+# PTAT: Version, Date (DD/MM/YYYY 或舊版 MM/DD/YYYY), Time (HH:MM:SS:fff), 數據...
+register_source(LogSource("PTAT", 0, 1, 2, None, DMY))
+# GPUMon: Iteration, Date (YYYY/MM/DD), Timestamp (HH:MM:SS:fff), 數據...
+register_source(LogSource("GPUMon", 0, 1, 2, YMD, YMD))
+# Fan Log: Timestamp (YYYY-mm-dd HH:MM:SS[.fff]), 各通道...
+register_source(LogSource("Fan", 0, 0, None, YMD, YMD))
+
+def _parse_line(raw, encoding='utf-8'):
+    text = raw.decode(encoding, errors='ignore').rstrip('\r\n')
+    return next(csv.reader([text]), None) or []
+
+def _read_head(f, source):
+    """讀檔頭: 回傳 (headers, 資料起始 offset, 前 DETECT_ROWS 筆資料列)"""
+    f.seek(0)
+    for _ in range(source.header_row):
+        f.readline()
+    headers = _parse_line(f.readline(), 'utf-8-sig')
+    data_start = f.tell()
+    samples = []
+    while len(samples) < DETECT_ROWS:
+        line = f.readline()
+        if not line:
+            break
+        row = _parse_line(line)
+        if row:
+            samples.append(row)
+    return headers, data_start, samples
+
+def _column_index(col, header_map):
+    if col is None or isinstance(col, int):
+        return col
+    return header_map.get(col.strip(), -1)
+
+def _row_time(source, header_map, samples):
+    """
+    依來源描述建立 row -> epoch 秒 的函式 (日期格式只判斷一次)，欄位不足或格式不符時該函式回傳 None。
+    時間欄位在 Header 找不到時回傳 None (整個檔案都無法解析)。
+    """
+    date_col = _column_index(source.date_col, header_map)
+    time_col = _column_index(source.time_col, header_map)
+    if date_col < 0 or (time_col is not None and time_col < 0):
+        return None
+    order = source.date_order
+    if order is None:
+        dates = (row[date_col].strip().partition(" ")[0] for row in samples if len(row) > date_col)
+        order = detect_date_order(dates, source.default_order)
+    parser = TimestampParser(order)
+
+    if time_col is None:
+        def row_time(row):
+            return parser.parse_joined(row[date_col]) if len(row) > date_col else None
+    else:
+        min_len = max(date_col, time_col) + 1
+        def row_time(row):
+            return parser.parse(row[date_col], row[time_col]) if len(row) >= min_len else None
+    return row_time
+
+def _lines_backwards(f, data_start, block_size):
+    """由檔尾往前逐行回傳 (新 -> 舊)，到 data_start 為止 (不含 Header)"""
+    pos = f.seek(0, 2)
+    carry = b""
+    while pos > data_start:
+        size = min(block_size, pos - data_start)
+        pos -= size
+        f.seek(pos)
+        lines = (f.read(size) + carry).split(b"\n")
+        # 第一段可能是被切斷的行，留到下一個 block 補齊 (已到 data_start 則是完整的第一筆)
+        carry = lines.pop(0) if pos > data_start else b""
+        for line in reversed(lines):
+            if line.strip():
+                yield line
+
+def _tail(f, data_start, row_time, cutoff, block_size=TAIL_BLOCK_SIZE):
+    """
+    回傳時間 >= cutoff (epoch 秒) 的 (epoch 秒, 資料列) (新 -> 舊)，時間無法解析的列略過。
+    Log 依時間順序寫入，遇到第一筆早於 cutoff 的列就停止，不再往前讀。
+    """
+    for line in _lines_backwards(f, data_start, block_size):
+        row = _parse_line(line)
+        if not row:
+            continue
+        t = row_time(row)
+        if t is None:
+            continue
+        if t < cutoff:
+            return
+        yield t, row
+
+def tail_rows(csv_path, source, cutoff_time, block_size=TAIL_BLOCK_SIZE):
+    """csv_path 內時間 >= cutoff_time (datetime 或 epoch 秒) 的 (epoch 秒, 資料列)，由新到舊"""
+    source = get_source(source)
+    with open(csv_path, 'rb') as f:
+        headers, data_start, samples = _read_head(f, source)
+        row_time = _row_time(source, {h.strip(): i for i, h in enumerate(headers)}, samples)
+        if row_time is None:
+            return
+        yield from _tail(f, data_start, row_time, to_epoch(cutoff_time), block_size)
+
+def scan_log(csv_path, columns, source, duration_sec=120, now=None):
+    """
+    只讀最近 duration_sec 秒 (以 now 為準) 的資料，同時收集 columns 每個欄位的 Series / WindowStats。
+    source: LogSource 或已登記的名稱。欄位依 Header 名稱 (去除空白) 對應；
+    每列時間只解析一次，無法轉成數字的值略過。檔案只開啟一次。
+    """
+    source = get_source(source)
+    cutoff = to_epoch((now or datetime.now()) - timedelta(seconds=duration_sec))
+    columns = list(dict.fromkeys(columns))
+    rows = 0
+    with open(csv_path, 'rb') as f:
+        headers, data_start, samples = _read_head(f, source)
+        header_map = {name.strip(): idx for idx, name in enumerate(headers)}
+        found = [(name, header_map[name]) for name in columns if name in header_map]
+        missing = tuple(name for name in columns if name not in header_map)
+        series = {name: Series() for name, _ in found}
+        slots = [(idx, series[name]) for name, idx in found]
+
+        row_time = _row_time(source, header_map, samples)
+        for t, row in (_tail(f, data_start, row_time, cutoff) if row_time else ()):
+            rows += 1
+            width = len(row)
+            for idx, s in slots:
+                if idx < width:
+                    try:
+                        value = float(row[idx])
+                    except ValueError:
+                        continue
+                    if value == value:
+                        s.append(t, value)
+
+    for s in series.values():
+        s.reverse()
+    stats = {name: summary(s) for name, s in series.items()}
+    return LogScan(csv_path, rows, missing, stats, series)
+
+def column_average(csv_path, col_idx, source, duration_sec=120, now=None):
+    """依欄位位置計算最近 duration_sec 秒的平均，回傳 (count, avg)"""
+    cutoff_time = (now or datetime.now()) - timedelta(seconds=duration_sec)
+    series = Series()
+    for t, row in tail_rows(csv_path, source, cutoff_time):
+        if len(row) <= col_idx:
+            continue
+        try:
+            value = float(row[col_idx])
+        except ValueError:
+            continue
+        if value == value:
+            series.append(t, value)
+    stats = summary(series)
+    return stats.count, stats.mean
+
+class LogTailer:
+    """
+    寫入中的 Log 增量讀取 (燒機期間即時檢查用)。
+    locate: Log 路徑，或回傳路徑的函式 (Log 尚未產生時回傳 None)。
+    poll() 只讀上次之後新增的完整行，回傳 [(epoch 秒, columns 對應的值), ...]，無法轉成數字的值為 None。
+    Header 之後至少有一筆資料才開始 (日期格式需要資料判斷)；檔案被換掉或截短時從頭重讀。
+    """
+    def __init__(self, locate, columns, source):
+        self.locate = locate if callable(locate) else (lambda: locate)
+        self.columns = tuple(columns)
+        self.source = get_source(source)
+        self.path = None
+        self.offset = None
+        self.row_time = None
+        self.indexes = ()
+        self.missing = ()
+
+    def _open(self, f):
+        headers, data_start, samples = _read_head(f, self.source)
+        if not samples:
+            return False
+        header_map = {name.strip(): idx for idx, name in enumerate(headers)}
+        self.row_time = _row_time(self.source, header_map, samples)
+        if self.row_time is None:
+            return False
+        self.indexes = tuple(header_map.get(name) for name in self.columns)
+        self.missing = tuple(name for name in self.columns if name not in header_map)
+        self.offset = data_start
+        return True
+
+    def poll(self):
+        path = self.locate()
+        if not path:
+            return []
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return []
+        if path != self.path or (self.offset is not None and size < self.offset):
+            self.path = path
+            self.offset = None
+        with open(path, 'rb') as f:
+            if self.offset is None and not self._open(f):
+                return []
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        # 最後一行可能還沒寫完，留到下次
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+        rows = []
+        for line in data[:end].split(b"\n"):
+            if not line.strip():
+                continue
+            row = _parse_line(line)
+            t = self.row_time(row)
+            if t is None:
+                continue
+            width = len(row)
+            values = []
+            for idx in self.indexes:
+                try:
+                    value = float(row[idx]) if idx is not None and idx < width else None
+                except ValueError:
+                    value = None
+                values.append(value if value == value else None)
+            rows.append((t, tuple(values)))
+        return rows
@@ -0,0 +1,447 @@
+import re
+import math
+from collections import namedtuple
+from types import MappingProxyType
+
+from stats_engine import parse_stat, stat_label
+from log_analysis import LogSource, LOG_SOURCES
+from timestamps import YMD
+
+# ==========================================
+# Config.ini 編譯層
+# 啟動時一次解析 + 檢查，之後測試流程只查已轉型好的唯讀表格
+# ==========================================
+
+class ConfigError(Exception):
+    """Config.ini 內容錯誤 (啟動時即拋出，列出所有問題)"""
+    def __init__(self, problems):
+        self.problems = list(problems)
+        super().__init__(" | ".join(self.problems))
+
+class RangeSpec(namedtuple("RangeSpec", "low high")):
+    __slots__ = ()
+
+    def contains(self, value):
+        return self.low <= value <= self.high
+
+    def __str__(self):
+        # 只設定單邊 (另一邊為 ±inf) 時顯示 <= / >=
+        if self.low == -math.inf:
+            return f"<={self.high}"
+        if self.high == math.inf:
+            return f">={self.low}"
+        return f"{self.low}~{self.high}"
+
+GlobalSpec = namedtuple("GlobalSpec", "total_cycles auto_run")
+# Test1 / Test3 壓力測試
+# fans: {fan_id: RangeSpec} (每個監控中的風扇都必須有)
+# sensor_limits: {channel key: RangeSpec} (非風扇通道，有設定才檢查)
+StressSpec = namedtuple("StressSpec", "name duration reboot fans sensor_limits cpu_power gpu_power total_power")
+# Test2 風扇轉速測試
+FanTestSpec = namedtuple("FanTestSpec", "fan_count sample_count duty retry_limit reboot fans")
+# PTAT / GPUMon 欄位與各 Test 的上下限 (limits: {"Test1": RangeSpec, ...}，檢查平均值)
+# stat_limits: {"Test3": (StatLimit, ...)}，其他統計量的上下限 (Test3_P95_High / Test3_Slope_High ...)
+MetricSpec = namedtuple("MetricSpec", "column limits stat_limits")
+# stat: stats_engine 的統計量名稱 (p95 / slope / above:90 ...)；只設定單邊時另一邊為 ±inf
+StatLimit = namedtuple("StatLimit", "stat limit")
+# Config 自訂的外部 Log ([LogSource_<Name>])，source 為 log_analysis.LogSource；
+# 驗證時取 folder 內最新的 <file_prefix>*.csv，metrics 同 PTAT_Key_* (每個欄位一個上下限 section)
+ExtraLogSpec = namedtuple("ExtraLogSpec", "source folder file_prefix metrics")
+# 燒機期間即時檢查的硬性上下限 ([FailFast] / 欄位 section 的 Abort_Low/High)
+# source: "Fan" (Fan Monitor) / "PTAT" / "GPUMon" / LogSource 名稱；column: CSV 欄位；只設定單邊時另一邊為 ±inf
+AbortLimit = namedtuple("AbortLimit", "source column limit")
+# 超出持續 grace_seconds 秒即提前結束燒機；check_interval: 增量讀取 Log 的週期 (秒)
+FailFastSpec = namedtuple("FailFastSpec", "enabled grace_seconds check_interval limits")
+ThermalSpec = namedtuple("ThermalSpec", "enabled cycles start_battery_threshold fan_mode tests test2 "
+                                        "ptat_metrics ptat_watt_key gpumon_metrics gpumon_watt_key extra_logs "
+                                        "fail_fast")
+AgingItem = namedtuple("AgingItem", "name cmd will_interrupt capture_log")
+AgingSpec = namedtuple("AgingSpec", "enabled cycles items")
+BatterySpec = namedtuple("BatterySpec", "enabled cycles")
+# 封存檔壓縮與保留政策 ([Archive]，可省略)
+ArchiveSpec = namedtuple("ArchiveSpec", "compress retention_days max_total_mb")
+# Fan Monitor 監控通道: key (Config 用，如 Fan1 / TS2)、column (CSV 欄位)、kind (fan/temp/current)、index (風扇 ID)
+MonitorChannel = namedtuple("MonitorChannel", "key column kind index")
+# 取樣階段: 前 seconds 秒使用 interval 取樣 (seconds=None 代表之後都用這個)
+SamplePhase = namedtuple("SamplePhase", "name seconds interval")
+MonitorSpec = namedtuple("MonitorSpec", "channels phases")
+RunInSpec = namedtuple("RunInSpec", "global_ thermal aging battery archive monitor")
+
+STRESS_TESTS = ("Test1", "Test3")
+# 非風扇的監控通道 (目前 EC 支援的項目)
+SENSOR_CHANNELS = {
+    "ts2": MonitorChannel("TS2", "TS2", "temp", None),
+    "chargecurrent": MonitorChannel("ChargeCurrent", "Charge_Current_mA", "current", None),
+}
+# [Monitor] Channels 省略時的監控通道
+DEFAULT_MONITOR_CHANNELS = "Fan1, Fan2, TS2"
+DEFAULT_PTAT_WATT_KEY = "Power-Package Power(Watts)"
+DEFAULT_GPUMON_WATT_KEY = "1:TGP (W)"
+
+# [Block2_Aging_Items] 不存在或為空時使用的預設清單
+DEFAULT_AGING_ITEMS = (
+    AgingItem("Battery Info",   r"call .\RI\BatteryInfo.bat", False, False),
+    AgingItem("Battery Aging",  r"call .\RI\Battery.bat",     False, True),
+    AgingItem("Screen On/Off",  r"call .\RI\TurnOnOff.bat",   False, True),
+    AgingItem("Camera Test",    r"call .\RI\RICamera.bat",    False, True),
+    AgingItem("Cold Boot",      r"call .\RI\ColdBoot.bat",    True,  True),
+    AgingItem("RTC Check",      r"call .\RI\RTC.bat",         False, True),
+    AgingItem("Memory Stress",  r"call .\RI\Memory.bat",      False, False),
+    AgingItem("Storage Test",   r"call .\RI\HDD_CMD.bat",     False, True),
+    AgingItem("3DMark Test",    r"call .\RI\3DMark.bat",      False, True),
+    AgingItem("Fan Speed Set",  r"call .\RI\SetFanSpeed.bat", False, True),
+    AgingItem("S3 Sleep Test",  r"call .\RI\S3sleeptest.bat", True,  True),
+    AgingItem("S4 Sleep Test",  r"call .\RI\S4sleeptest.bat", True,  True),
+    AgingItem("Driver Check",   r"call .\RI\CheckDriver.bat", False, True),
+    AgingItem("BT/WiFi Test",   r"call .\RI\BTWIFI.bat",      False, True),
+)
+
+class _Reader:
+    """包裝 ConfigParser section，轉型失敗時記錄錯誤而不是立即拋出"""
+    def __init__(self, config, section, problems):
+        self.section = section
+        self.problems = problems
+        self.data = config[section] if config.has_section(section) else None
+
+    def has(self, key):
+        return self.data is not None and key in self.data
+
+    def _get(self, key, conv, default, required):
+        if not self.has(key):
+            if required:
+                self.problems.append(f"[{self.section}] missing key '{key}'")
+            return default
+        raw = self.data[key].strip()
+        try:
+            return conv(raw)
+        except ValueError:
+            self.problems.append(f"[{self.section}] {key} = '{raw}' is not a valid {conv.__name__}")
+            return default
+
+    def int(self, key, default=None, required=False):
+        return self._get(key, int, default, required)
+
+    def float(self, key, default=None, required=False):
+        return self._get(key, float, default, required)
+
+    def bool(self, key, default=False):
+        if not self.has(key):
+            return default
+        try:
+            return self.data.getboolean(key)
+        except ValueError:
+            self.problems.append(f"[{self.section}] {key} = '{self.data[key]}' is not a valid bool")
+            return default
+
+    def str(self, key, default=None):
+        if not self.has(key):
+            return default
+        value = self.data[key].strip()
+        return value if value else default
+
+    def range(self, prefix, low_suffix="_Min", high_suffix="_Max", default=None, conv=None):
+        conv = conv or self.int
+        if default is None:
+            return RangeSpec(conv(prefix + low_suffix, required=True), conv(prefix + high_suffix, required=True))
+        return RangeSpec(conv(prefix + low_suffix, default[0]), conv(prefix + high_suffix, default[1]))
+
+    def keys_with_prefix(self, prefix):
+        """依序回傳 prefix_1, prefix_2 ... 的值 (ConfigParser key 皆為小寫)"""
+        if self.data is None:
+            return ()
+        pattern = re.compile(re.escape(prefix.lower()) + r"(\d+)$")
+        found = []
+        for key, value in self.data.items():
+            m = pattern.match(key)
+            if m and value.strip():
+                found.append((int(m.group(1)), value.strip()))
+        return tuple(v for _, v in sorted(found))
+
+def _require_section(config, section, problems):
+    if not config.has_section(section):
+        problems.append(f"missing section [{section}]")
+
+def _compile_stat_limits(r, test_name, problems):
+    """
+    [欄位] 內 TestN_<Stat>_Low / TestN_<Stat>_High (如 Test3_P95_High、Test3_Slope_High、Test3_Above90_High)。
+    Low / High 可只設定一邊。
+    """
+    pattern = re.compile(re.escape(test_name.lower()) + r"_(.+)_(low|high)$")
+    bounds = {}
+    for key in r.data:
+        m = pattern.match(key)
+        if not m:
+            continue
+        try:
+            stat = parse_stat(m.group(1))
+        except ValueError as e:
+            problems.append(f"[{r.section}] {key}: {e}")
+            continue
+        value = r.float(key)
+        if value is not None:
+            bounds.setdefault(stat, {})[m.group(2)] = value
+    limits = []
+    for stat, b in bounds.items():
+        limit = RangeSpec(b.get("low", -math.inf), b.get("high", math.inf))
+        if limit.low > limit.high:
+            problems.append(f"[{r.section}] {test_name}_{stat_label(stat)}: Low > High")
+        limits.append(StatLimit(stat, limit))
+    return tuple(limits)
+
+def _compile_metrics(config, columns, tests, problems):
+    metrics = []
+    for column in columns:
+        if not config.has_section(column):
+            problems.append(f"missing limit section [{column}]")
+            metrics.append(MetricSpec(column, MappingProxyType({}), MappingProxyType({})))
+            continue
+        r = _Reader(config, column, problems)
+        limits = {}
+        stat_limits = {}
+        for test_name in tests:
+            stat_limits[test_name] = _compile_stat_limits(r, test_name, problems)
+            # 有其他統計量的上下限時 (只用 P95 等當 Spec)，平均值的 TestN_Low/High 可省略
+            if stat_limits[test_name] and not (r.has(f"{test_name}_Low") or r.has(f"{test_name}_High")):
+                continue
+            limits[test_name] = r.range(test_name, "_Low", "_High", conv=r.float)
+        metrics.append(MetricSpec(column, MappingProxyType(limits), MappingProxyType(stat_limits)))
+    return tuple(metrics)
+
+def _column_ref(value):
+    """欄位設定: 純數字為欄位位置，否則為 Header 名稱"""
+    return int(value) if value.isdigit() else value
+
+def _compile_extra_logs(config, tests, problems):
+    """
+    [LogSource_<Name>] 新增外部 Log 來源 (HWiNFO 等)，不需改程式:
+    Folder / File_Prefix: 取最新的 Log；Header_Row: Header 所在列 (0 起算)；
+    Date_Column / Time_Column: 欄位位置或名稱 (Time_Column 省略表示日期時間同一欄)；
+    Date_Order: Auto / DMY / MDY / YMD；Key_1, Key_2 ...: 要檢查的欄位 (上下限 section 同 PTAT_Key)
+    """
+    logs = []
+    for section in config.sections():
+        if not section.lower().startswith("logsource_"):
+            continue
+        name = section[len("LogSource_"):].strip()
+        if not name or name.lower() in LOG_SOURCES:
+            problems.append(f"[{section}] invalid or reserved source name '{name}'")
+            continue
+        r = _Reader(config, section, problems)
+        folder = r.str("Folder")
+        if folder is None:
+            problems.append(f"[{section}] missing key 'Folder'")
+        date_col = r.str("Date_Column")
+        if date_col is None:
+            problems.append(f"[{section}] missing key 'Date_Column'")
+            date_col = "0"
+        time_col = r.str("Time_Column")
+        order = (r.str("Date_Order", "Auto")).upper()
+        if order not in ("AUTO", "DMY", "MDY", "YMD"):
+            problems.append(f"[{section}] Date_Order = '{order}' must be Auto / DMY / MDY / YMD")
+            order = "AUTO"
+        source = LogSource(name, r.int("Header_Row", 0), _column_ref(date_col),
+                           _column_ref(time_col) if time_col else None,
+                           None if order == "AUTO" else order, YMD if order == "AUTO" else order)
+        metrics = _compile_metrics(config, r.keys_with_prefix("Key_"), tests, problems)
+        logs.append(ExtraLogSpec(source, folder, r.str("File_Prefix", ""), metrics))
+    return tuple(logs)
+
+def _abort_range(r, prefix, problems):
+    """<prefix>Abort_Low / <prefix>Abort_High，可只設定一邊；都沒設定時回傳 None"""
+    low = r.float(f"{prefix}Abort_Low")
+    high = r.float(f"{prefix}Abort_High")
+    if low is None and high is None:
+        return None
+    limit = RangeSpec(-math.inf if low is None else low, math.inf if high is None else high)
+    if limit.low > limit.high:
+        problems.append(f"[{r.section}] {prefix}Abort: Low > High")
+    return limit
+
+def _metric_abort_limits(config, source, metrics, problems):
+    """PTAT / GPUMon / LogSource 欄位 section 內的 Abort_Low / Abort_High (所有 Test 共用)"""
+    limits = []
+    for metric in metrics:
+        if not config.has_section(metric.column):
+            continue
+        limit = _abort_range(_Reader(config, metric.column, problems), "", problems)
+        if limit is not None:
+            limits.append(AbortLimit(source, metric.column, limit))
+    return limits
+
+def _compile_fail_fast(config, monitor, thermal_logs, problems):
+    """
+    [FailFast] 可省略 (預設停用)。Enabled / Grace_Seconds / Check_Interval；
+    Fan Monitor 通道用 <Key>_Abort_Low / _High (如 Fan1 / TS2)，Fan_Abort_Low / _High 套用所有風扇；
+    thermal_logs: ((source 名稱, metrics), ...)，各欄位 section 的 Abort_Low / Abort_High
+    """
+    r = _Reader(config, "FailFast", problems)
+    grace = r.float("Grace_Seconds", 30.0)
+    interval = r.float("Check_Interval", 5.0)
+    if grace is not None and grace < 0:
+        problems.append("[FailFast] Grace_Seconds must be >= 0")
+    if interval is not None and interval <= 0:
+        problems.append("[FailFast] Check_Interval must be > 0")
+
+    channels = {c.key.lower(): c for c in monitor.channels}
+    if r.data is not None:
+        for key in r.data:
+            m = re.fullmatch(r"(.+)_abort_(low|high)", key)
+            if m and m.group(1) != "fan" and m.group(1) not in channels:
+                problems.append(f"[FailFast] {key}: '{m.group(1)}' is not a monitored channel")
+
+    limits = []
+    all_fans = _abort_range(r, "Fan_", problems)
+    for channel in monitor.channels:
+        limit = _abort_range(r, f"{channel.key}_", problems)
+        if limit is None and channel.kind == "fan":
+            limit = all_fans
+        if limit is not None:
+            limits.append(AbortLimit("Fan", channel.column, limit))
+    for source, metrics in thermal_logs:
+        limits.extend(_metric_abort_limits(config, source, metrics, problems))
+    return FailFastSpec(r.bool("Enabled"), grace, interval, tuple(limits))
+
+def _compile_monitor(config, problems):
+    """
+    [Monitor] 可省略: 預設監控 Fan1 + Fan2 + TS2，每秒取樣一次。
+    (與 Test2_Fan_Count 無關，Test2 設為 0 不影響 Test1 / Test3 的風扇檢查)
+    """
+    r = _Reader(config, "Monitor", problems)
+    names = [n.strip() for n in r.str("Channels", DEFAULT_MONITOR_CHANNELS).split(",") if n.strip()]
+    channels = []
+    for name in names:
+        m = re.fullmatch(r"(?i)fan(\d+)", name)
+        if m:
+            fan_id = int(m.group(1))
+            channels.append(MonitorChannel(f"Fan{fan_id}", f"Fan{fan_id}_RPM", "fan", fan_id))
+        elif name.lower() in SENSOR_CHANNELS:
+            channels.append(SENSOR_CHANNELS[name.lower()])
+        else:
+            problems.append(f"[Monitor] Channels: unknown channel '{name}' (use FanN / TS2 / ChargeCurrent)")
+    if len({c.key for c in channels}) != len(channels):
+        problems.append("[Monitor] Channels: duplicated channel")
+    if not any(c.kind == "fan" for c in channels):
+        problems.append("[Monitor] Channels: at least one FanN channel is required (Test1 / Test3 fan check)")
+
+    interval = r.float("Interval", 1.0)
+    ramp_seconds = r.float("RampUp_Seconds", 0.0)
+    ramp_interval = r.float("RampUp_Interval", 0.2)
+    for key, value in (("Interval", interval), ("RampUp_Interval", ramp_interval)):
+        if value is not None and value <= 0:
+            problems.append(f"[Monitor] {key} must be > 0")
+    phases = []
+    if ramp_seconds:
+        phases.append(SamplePhase("RampUp", ramp_seconds, ramp_interval))
+    phases.append(SamplePhase("Steady", None, interval))
+    return MonitorSpec(tuple(channels), tuple(phases))
+
+def _compile_thermal(config, monitor, problems):
+    r = _Reader(config, "Block1_Thermal", problems)
+    fan_ids = [c.index for c in monitor.channels if c.kind == "fan"]
+    sensor_keys = [c.key for c in monitor.channels if c.kind != "fan"]
+
+    tests = {}
+    for test_name in STRESS_TESTS:
+        duration = r.int(f"{test_name}_Duration", 1200)
+        fans = {}
+        sensor_limits = {}
+        if duration > 0:
+            # 每個監控中的風扇都要有規格；其他通道有設定上下限才檢查
+            for fan_id in fan_ids:
+                fans[fan_id] = r.range(f"{test_name}_Fan{fan_id}")
+            for key in sensor_keys:
+                if r.has(f"{test_name}_{key}_Min") or r.has(f"{test_name}_{key}_Max"):
+                    sensor_limits[key] = r.range(f"{test_name}_{key}", conv=r.float)
+        tests[test_name] = StressSpec(
+            name=test_name,
+            duration=duration,
+            reboot=r.bool(f"{test_name}_Reboot"),
+            fans=MappingProxyType(fans),
+            sensor_limits=MappingProxyType(sensor_limits),
+            cpu_power=r.range(f"{test_name}_CPUPower", default=(0, 9999), conv=r.float),
+            gpu_power=r.range(f"{test_name}_GPUPower", default=(0, 9999), conv=r.float),
+            total_power=r.range(f"{test_name}_TotalPower", default=(0, 9999), conv=r.float),
+        )
+
+    fan_count = r.int("Test2_Fan_Count", 2)
+    fans = {}
+    if fan_count > 0:
+        for fan_id in range(1, fan_count + 1):
+            fans[fan_id] = r.range(f"Test2_Fan{fan_id}")
+    test2 = FanTestSpec(
+        fan_count=fan_count,
+        sample_count=r.int("Test2_Sample_Count", required=fan_count > 0),
+        duty=r.int("Test2_Duty", required=fan_count > 0),
+        retry_limit=r.int("Fan_Retry_Count", 3),
+        reboot=r.bool("Test2_Reboot"),
+        fans=MappingProxyType(fans),
+    )
+
+    # 只有要跑的 Test 才需要上下限
+    active_tests = tuple(t for t in STRESS_TESTS if tests[t].duration > 0)
+    ptat_metrics = _compile_metrics(config, r.keys_with_prefix("PTAT_Key_"), active_tests, problems)
+    gpumon_metrics = _compile_metrics(config, r.keys_with_prefix("GPUMon_Key_"), active_tests, problems)
+    extra_logs = _compile_extra_logs(config, active_tests, problems)
+    thermal_logs = [("PTAT", ptat_metrics), ("GPUMon", gpumon_metrics)]
+    thermal_logs += [(extra.source.name, extra.metrics) for extra in extra_logs]
+    return ThermalSpec(
+        enabled=r.bool("Enabled"),
+        cycles=r.int("Cycles", 1),
+        start_battery_threshold=r.int("Start_Battery_Threshold", 90),
+        fan_mode=r.str("Fan_Mode"),
+        tests=MappingProxyType(tests),
+        test2=test2,
+        ptat_metrics=ptat_metrics,
+        ptat_watt_key=r.str("PTAT_Watt_Key", DEFAULT_PTAT_WATT_KEY),
+        gpumon_metrics=gpumon_metrics,
+        gpumon_watt_key=r.str("GPUMon_Watt_Key", DEFAULT_GPUMON_WATT_KEY),
+        extra_logs=extra_logs,
+        fail_fast=_compile_fail_fast(config, monitor, thermal_logs, problems),
+    )
+
+def _compile_aging_items(config, problems):
+    section = "Block2_Aging_Items"
+    if not config.has_section(section):
+        return DEFAULT_AGING_ITEMS
+    items = []
+    idx = 1
+    while f"Item_{idx}" in config[section]:
+        key = f"Item_{idx}"
+        # 格式: Name | Command | Interrupt(1/0) | CaptureLog(1/0)
+        parts = [p.strip() for p in config[section][key].split('|')]
+        if len(parts) < 4 or parts[2] not in ("0", "1") or parts[3] not in ("0", "1"):
+            problems.append(f"[{section}] {key} must be 'Name | Command | 0/1 | 0/1'")
+        else:
+            items.append(AgingItem(parts[0], parts[1], parts[2] == '1', parts[3] == '1'))
+        idx += 1
+    return tuple(items) if items else DEFAULT_AGING_ITEMS
+
+def compile_config(config):
+    """
+    將 ConfigParser 轉成唯讀的 RunInSpec。
+    有任何缺漏或格式錯誤時拋出 ConfigError (一次列出全部問題)。
+    """
+    problems = []
+    for section in ("Global", "Block1_Thermal", "Block2_Aging", "Block3_Battery"):
+        _require_section(config, section, problems)
+
+    g = _Reader(config, "Global", problems)
+    global_spec = GlobalSpec(total_cycles=g.int("Total_RunIn_Cycles", 1), auto_run=g.bool("AutoRun"))
+
+    monitor = _compile_monitor(config, problems)
+    thermal = _compile_thermal(config, monitor, problems)
+
+    a = _Reader(config, "Block2_Aging", problems)
+    aging = AgingSpec(enabled=a.bool("Enabled"), cycles=a.int("Cycles", 1),
+                      items=_compile_aging_items(config, problems))
+
+    b = _Reader(config, "Block3_Battery", problems)
+    battery = BatterySpec(enabled=b.bool("Enabled"), cycles=b.int("Cycles", 1))
+
+    ar = _Reader(config, "Archive", problems)
+    archive = ArchiveSpec(compress=ar.bool("Compress", True), retention_days=ar.int("Retention_Days", 30),
+                          max_total_mb=ar.int("Max_Total_MB", 2048))
+
+    if problems:
+        raise ConfigError(problems)
+    return RunInSpec(global_spec, thermal, aging, battery, archive, monitor)
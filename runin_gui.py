@@ -0,0 +1,163 @@
+import os
+import sys
+from collections import deque
+from datetime import datetime
+
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+                             QPlainTextEdit, QLabel, QPushButton, QMessageBox)
+from PyQt5.QtCore import QTimer, QLockFile, QDir, pyqtSignal, Qt
+
+from core import acquire_instance_lock
+
+# ==========================================
+# GUI 視窗 (只負責顯示，測試流程在 core.BaseRunInApp)
+# ==========================================
+class RunInWindow(QMainWindow):
+    # 引擎在背景執行緒呼叫 listener，透過 signal 切回主執行緒更新 UI
+    sig_log = pyqtSignal(str)
+    sig_status = pyqtSignal(str)
+    sig_run_state = pyqtSignal(str)
+
+    # UI Log 只保留最後 N 行 (完整紀錄在 log/Runin_Debug.log)
+    UI_LOG_MAX_LINES = 5000
+    # UI Log 重繪間隔 (ms)，期間收到的訊息合併成一次 append
+    UI_LOG_REFRESH_MS = 100
+
+    def __init__(self, title="ACER Run-In Test"):
+        super().__init__()
+        self.engine = None
+        self.setWindowTitle(title)
+        self.resize(800, 600)
+        self.setWindowFlags(self.windowFlags() | Qt.WindowStaysOnTopHint)
+
+        self.sig_log.connect(self.append_log_text)
+        self.sig_status.connect(self.update_status_label)
+        self.sig_run_state.connect(self.update_buttons)
+
+        central = QWidget()
+        self.setCentralWidget(central)
+        main_layout = QVBoxLayout(central)
+
+        # 建立一個醒目的狀態標籤 (Status Label)
+        self.lbl_status = QLabel("READY")
+        self.lbl_status.setFixedHeight(60) # 設定高度
+        self.lbl_status.setAlignment(Qt.AlignCenter) # 文字置中
+        # 設定樣式: 深灰底、黃字、大字體、粗體
+        self.lbl_status.setStyleSheet("""
+            background-color: #333333;
+            color: #FFD700;
+            font-size: 24px;
+            font-weight: bold;
+            border: 2px solid #555;
+            border-radius: 5px;
+        """)
+        # Log 區域
+        self.txt_log = QPlainTextEdit()
+        self.txt_log.setReadOnly(True)
+        self.txt_log.setMaximumBlockCount(self.UI_LOG_MAX_LINES)
+        self.txt_log.setStyleSheet("background: black; color: #00FF00; font-family: Consolas; font-size: 15pt;")
+        # 待顯示的訊息 (由 Timer 定時批次寫入 txt_log)
+        self.pending_ui_log = deque(maxlen=self.UI_LOG_MAX_LINES)
+        self.ui_log_timer = QTimer(self)
+        self.ui_log_timer.setInterval(self.UI_LOG_REFRESH_MS)
+        self.ui_log_timer.timeout.connect(self.flush_ui_log)
+        self.ui_log_timer.start()
+
+        # 按鈕區域
+        btn_layout = QHBoxLayout()
+        self.btn_start = QPushButton("START TEST")
+        self.btn_start.setFixedHeight(40)
+        self.btn_start.setEnabled(False) # bind() 之後才能啟動
+        self.btn_start.clicked.connect(lambda: self.engine.start_test(False))
+
+        self.btn_stop = QPushButton("STOP")
+        self.btn_stop.setFixedHeight(40)
+        self.btn_stop.setEnabled(False)
+        self.btn_stop.setStyleSheet("background-color: #D32F2F; color: white; font-weight: bold;")
+        self.btn_stop.clicked.connect(lambda: self.engine.stop_test())
+
+        btn_layout.addWidget(self.btn_start)
+        btn_layout.addWidget(self.btn_stop)
+
+        main_layout.addWidget(QLabel(title))
+        main_layout.addWidget(self.lbl_status)
+        main_layout.addWidget(self.txt_log)
+        main_layout.addLayout(btn_layout)
+
+    def bind(self, engine):
+        self.engine = engine
+        self.update_buttons(engine.run_state)
+
+    # --- listener 介面 (可能在背景執行緒被呼叫) ---
+    def on_log(self, text):
+        self.sig_log.emit(text)
+
+    def on_status(self, text):
+        self.sig_status.emit(text)
+
+    def on_run_state(self, state):
+        self.sig_run_state.emit(state)
+
+    # --- 以下都在主執行緒執行 ---
+    def append_log_text(self, msg):
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        self.pending_ui_log.append(f"[{timestamp}] {msg}")
+
+    def flush_ui_log(self):
+        """把累積的訊息一次寫入 UI (一次重繪)"""
+        if not self.pending_ui_log:
+            return
+        lines = list(self.pending_ui_log)
+        self.pending_ui_log.clear()
+        self.txt_log.appendPlainText("\n".join(lines))
+        scroll_bar = self.txt_log.verticalScrollBar()
+        scroll_bar.setValue(scroll_bar.maximum())
+
+    def update_status_label(self, text):
+        self.lbl_status.setText(text)
+
+    def update_buttons(self, state):
+        if state == "READY":
+            self.btn_start.setEnabled(self.engine is not None)
+            self.btn_start.setText("START TEST")
+            self.btn_stop.setEnabled(False)
+        elif state == "RUNNING":
+            self.btn_start.setEnabled(False)
+            self.btn_start.setText("RUNNING...")
+            self.btn_stop.setEnabled(True)
+        elif state == "STOPPING":
+            self.btn_start.setEnabled(False)
+            self.btn_stop.setEnabled(False)
+        else:
+            # STOPPED / PASS / FAIL: 需重新開啟程式
+            self.btn_start.setText(state)
+            self.btn_start.setEnabled(False)
+            self.btn_stop.setEnabled(False)
+
+    def closeEvent(self, event):
+        if self.engine is not None:
+            self.engine.shutdown(pump=QApplication.processEvents)
+        self.flush_ui_log()
+        event.accept()
+
+def run_gui(engine_cls, title="ACER Run-In Test"):
+    """建立視窗 + 引擎並進入 Qt 事件迴圈，回傳 exit code"""
+    os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "1"
+    QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
+    QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps)
+    app = QApplication(sys.argv)
+    lock_file_path = os.path.join(QDir.tempPath(), 'odm_runin_instance.lock')
+    lock_file = QLockFile(lock_file_path)
+    # 嘗試鎖定，Timeout 設定 100ms；Headless 實例以 Mutex 判斷
+    if not lock_file.tryLock(100) or not acquire_instance_lock():
+        # 如果鎖定失敗，代表已經有一個實例在執行
+        QMessageBox.critical(None, "Error", "Run-In program is already running!\n(Please close the existing window first)")
+        return 1
+
+    win = RunInWindow(title=title)
+    engine = engine_cls(title=title, listener=win)
+    win.bind(engine)
+    win.show()
+    # 在介面顯示後 1 秒檢查是否要 Auto Run，確保 UI 已經完全 Load 好
+    QTimer.singleShot(1000, engine.check_auto_run)
+    return app.exec_()
@@ -7,173 +7,142 @@ import subprocess
 import threading
 import ctypes
 import shutil  # 用於複製檔案
-from datetime import datetime, timedelta
-from PyQt5.QtWidgets import QApplication, QMessageBox
-from core import BaseRunInApp
-from PyQt5.QtCore import Qt, QThread, QLockFile, QDir, QTimer, pyqtSignal
+import math
+from datetime import datetime
+from core import BaseRunInApp, acquire_instance_lock, set_current_thread_priority, THREAD_PRIORITY_TIME_CRITICAL
+from runin_config import compile_config, ConfigError
 import json
-# ==========================================
-# Helper: EC io txrx class
-# ==========================================
-class DirectEC:
-    def __init__(self, dll_folder):
-        # 設定 inpoutx64.dll 路徑
-        dll_path = os.path.join(dll_folder, "inpoutx64.dll")
-        if not os.path.exists(dll_path):
-            print(f"[DirectEC] Error: DLL not found at {dll_path}")
-            self.dll = None
-            return
-
-        try:
-            self.dll = ctypes.WinDLL(dll_path)
-            self.cmd_port = 0x6C
-            self.dat_port = 0x68
-            self.initialized = True
-            print("[DirectEC] DLL Loaded successfully.")
-        except Exception as e:
-            print(f"[DirectEC] Failed to load DLL: {e}")
-            self.dll = None
-            self.initialized = False
-
-    def wait_ibf_clear(self, timeout_s=0.5):
-        """等待 Input Buffer Full 清除"""
-        t0 = time.perf_counter()
-        while time.perf_counter() - t0 < timeout_s:
-            if (self.dll.Inp32(self.cmd_port) & 0x02) == 0:
-                return True
-            time.sleep(0.001)
-        return False
-
-    def wait_obf_set(self, timeout_s=0.5):
-        """等待 Output Buffer Full 設定 (有資料可讀)"""
-        t0 = time.perf_counter()
-        while time.perf_counter() - t0 < timeout_s:
-            if (self.dll.Inp32(self.cmd_port) & 0x01) != 0:
-                return True
-            time.sleep(0.001)
-        return False
-
-    def txrx(self, cmd, data_payload, expect_len, wait_s=0.05):
-        if not self.initialized: return None
-
-        try:
-            # 1. Write Command
-            if not self.wait_ibf_clear(): return None
-            self.dll.Out32(self.cmd_port, cmd)
-            time.sleep(0.05) # 模擬 ecio 的 command delay
-
-            # 2. Write Payload
-            for d in data_payload:
-                if not self.wait_ibf_clear(): return None
-                self.dll.Out32(self.dat_port, d)
-                time.sleep(0.005) # 模擬 ecio 的 data delay
-
-            # 3. Read Response
-            resp = []
-            for _ in range(expect_len):
-                if self.wait_obf_set(timeout_s=wait_s):
-                    val = self.dll.Inp32(self.dat_port) & 0xFF
-                    resp.append(val)
-                else:
-                    break # Timeout or no more data
-            
-            return resp
-        except Exception as e:
-            print(f"[DirectEC] txrx error: {e}")
-            return None
-    def get_fan_rpm(self, fan_id):
-        # CMD=0x20, SubCmd=0x05, Payload=[0x05, FanID]
-        # 回傳: [LowByte, HighByte]
-        if not self.initialized: return 0
-        
-        CMD = 0x20
-        payload = [0x05, fan_id]
-        
-        # 嘗試 3 次 (如原始碼)
-        for _ in range(3):
-            resp = self.txrx(CMD, payload, expect_len=2, wait_s=0.05)
-            if resp and len(resp) == 2:
-                rpm = resp[0] | (resp[1] << 8)
-                return rpm
-        return 0
-
-    def get_ts2_temp(self):
-        # CMD=0x28, TS2_SubCmd=0x05
-        # 回傳: [Temp]
-        if not self.initialized: return 0
-        
-        CMD = 0x28
-        payload = [0x05] # 0x05 對應 thermaltest.py 中的 "ts2"
-        
-        for _ in range(3):
-            resp = self.txrx(CMD, payload, expect_len=1, wait_s=0.05)
-            if resp and len(resp) == 1:
-                return resp[0]
-        return 0
-    
-    def get_charging_current(self):
-        if not self.initialized: return 0
-        
-        CMD = 0x31
-        payload = [0x05]
-        
-        for _ in range(3):
-            resp = self.txrx(CMD, payload, expect_len=2, wait_s=0.1)
-            if resp and len(resp) == 2:
-                # 1. 先組合成 Unsigned 16-bit (0 ~ 65535)
-                raw_val = resp[0] | (resp[1] << 8)               
-                # 2. Signed 16-bit (Two's Complement)
-                if raw_val >= 32768:
-                    raw_val -= 65536
-                    
-                return raw_val
-        return 0
-        
+from ec_io import DirectEC, ECBroker, ec_fan_rpm_request, EC_TS2_TEMP, EC_CHARGING_CURRENT
+from telemetry import TelemetryRing, TelemetryCsvWriter, TelemetryBinWriter, TelemetryBinReader, export_csv
+from runin_config import MonitorChannel, SamplePhase
+from scheduler import PeriodicSchedule
+from log_analysis import scan_log, column_average, get_source, register_source, LogTailer
+from fail_fast import LiveVerifier
+from stats_engine import compute, stat_label
 # ==========================================
 # Helper: 風扇監控執行緒 (背景執行)
 # ==========================================
-class FanMonitorThread(QThread):
-    update_signal = pyqtSignal(int, int, int)
-    def __init__(self, csv_path, interval=1):
-        super().__init__()
+def channel_request(channel):
+    """MonitorChannel -> 對應的 ECRequest (request name 使用 channel column)"""
+    if channel.kind == "fan":
+        req = ec_fan_rpm_request(channel.index)
+    elif channel.kind == "temp":
+        req = EC_TS2_TEMP
+    elif channel.kind == "current":
+        req = EC_CHARGING_CURRENT
+    else:
+        raise ValueError(f"Unsupported monitor channel: {channel}")
+    return req._replace(name=channel.column)
+
+class FanMonitorThread(threading.Thread):
+    """
+    依 channels (MonitorChannel) 讀取 EC 風扇轉速 / 溫度 / 充電電流並寫入 CSV，欄位順序同 channels。
+    phases: SamplePhase 序列，依監控開始後經過的時間決定取樣週期 (未指定時固定 interval 秒)
+    on_sample(*values): 每筆取樣後呼叫 (選用，在本執行緒內執行)，讀取失敗的值為 None
+    time_critical: 以 TIME_CRITICAL 優先權執行，避免壓力測試時取樣延遲
+    ec: 共用的 ECBroker (未指定時自行建立 DirectEC，只適合單獨使用)
+    ring: 最近 ring_capacity 筆樣本 + windows 秒數的滾動統計 (驗證 / UI 直接查詢)
+    flush_interval / flush_rows / fsync_interval: CSV 批次寫出與 fsync 的週期 (見 TelemetryCsvWriter)
+    binary_path: 有值時取樣期間改寫 .ritl 二進位檔，stop() 時再轉出 csv_path (格式不變)
+    schedule: 取樣節奏 (PeriodicSchedule，固定 deadline)，stats() 可查 overrun / jitter
+    """
+    DEFAULT_CHANNELS = (
+        MonitorChannel("Fan1", "Fan1_RPM", "fan", 1),
+        MonitorChannel("Fan2", "Fan2_RPM", "fan", 2),
+        MonitorChannel("TS2", "TS2", "temp", None),
+    )
+
+    def __init__(self, csv_path, interval=1, on_sample=None, time_critical=True, ec=None,
+                 ring_capacity=7200, windows=(120,), flush_interval=5.0, flush_rows=30, fsync_interval=60.0,
+                 channels=None, phases=None, binary_path=None):
+        super().__init__(name="FanMonitor", daemon=True)
         self.csv_path = csv_path
+        self.binary_path = binary_path
         self.interval = interval
+        self.on_sample = on_sample
+        self.time_critical = time_critical
         self.running = True
+        self.stop_event = threading.Event()
+        self.channels = tuple(channels) if channels else self.DEFAULT_CHANNELS
+        self.phases = tuple(phases) if phases else (SamplePhase("Steady", None, interval),)
+        self.columns = tuple(c.column for c in self.channels)
+        # 取樣快於 1 秒時 Timestamp 加上毫秒，否則同一秒會有多筆無法區分
+        self.sub_second = min(p.interval for p in self.phases) < 1
 
         if getattr(sys, 'frozen', False):
             self.base_dir = os.path.dirname(sys.executable)
         else:
             self.base_dir = os.path.dirname(os.path.abspath(__file__))
-        ri_folder = os.path.join(self.base_dir, "RI")
-        self.ec = DirectEC(ri_folder)
+        if ec is None:
+            ec = DirectEC(os.path.join(self.base_dir, "RI"))
+        self.ec = ec
+        self.requests = tuple(channel_request(c) for c in self.channels)
+        self.ring = TelemetryRing(self.columns, capacity=ring_capacity, windows=windows)
+        self.csv_options = dict(flush_interval=flush_interval, flush_rows=flush_rows,
+                                fsync_interval=fsync_interval)
+        self.schedule = PeriodicSchedule(self.current_interval(0), name="FanMonitor")
+
+    def current_interval(self, elapsed):
+        """依經過秒數找出目前階段的取樣週期"""
+        boundary = 0.0
+        for phase in self.phases:
+            if phase.seconds is None:
+                return phase.interval
+            boundary += phase.seconds
+            if elapsed < boundary:
+                return phase.interval
+        return self.phases[-1].interval
+
     def run(self):
+        if self.time_critical:
+            set_current_thread_priority(THREAD_PRIORITY_TIME_CRITICAL)
         # 確保目錄存在
         os.makedirs(os.path.dirname(self.csv_path), exist_ok=True)
         
-        # 寫入 CSV Header
-        with open(self.csv_path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Timestamp", "Fan1_RPM", "Fan2_RPM", "TS2"])
+        # 寫入檔頭 (檔案在取樣期間保持開啟，批次寫出)
+        if self.binary_path:
+            bin_writer = TelemetryBinWriter(self.binary_path, self.columns, **self.csv_options,
+                                            meta={"source": "FanMonitor", "sub_second": self.sub_second})
+            csv_writer = None
+        else:
+            bin_writer = None
+            csv_writer = TelemetryCsvWriter(self.csv_path, ["Timestamp"] + list(self.columns), **self.csv_options)
+        monitor_start = time.monotonic()
+        try:
+            while self.running and self.schedule.wait(self.stop_event):
+                start_time = time.time()
+                try:
+                    # 一次交易批次讀完所有感測值
+                    # 讀取失敗留空白 (不寫 0)，避免拉低 analyze_fan_log_average 的平均
+                    # max_age=0: 不使用 broker 快取 (RampUp 0.2 秒週期會拿到上一筆的快取，變成重複樣本)
+                    batch = self.ec.read_batch(self.requests, max_age=0)
+                    values = [batch.value(column, None) for column in self.columns]
+                    self.ring.append(start_time, values)
+                    if bin_writer is not None:
+                        bin_writer.write_row(start_time, values)
+                    else:
+                        now = datetime.fromtimestamp(start_time).strftime('%Y-%m-%d %H:%M:%S.%f')
+                        now = now[:-3] if self.sub_second else now[:19]
+                        csv_writer.write_row([now] + values)
 
-        while self.running:
-            start_time = time.time()
-            try:
-                now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                rpm1 = self.ec.get_fan_rpm(1)
-                rpm2 = self.ec.get_fan_rpm(2)
-                ts2 = self.ec.get_ts2_temp()
-                with open(self.csv_path, 'a', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow([now, rpm1, rpm2, ts2])
-
-                self.update_signal.emit(rpm1, rpm2, ts2)
-            except Exception as e:
-                pass 
+                    if self.on_sample is not None:
+                        self.on_sample(*values)
+                except Exception as e:
+                    pass 
 
-            #間隔休息
-            elapsed = time.time() - start_time
-            sleep_time = max(0.1, self.interval - elapsed)
-            time.sleep(sleep_time)
+                # 下一筆的週期 (取樣階段切換)
+                self.schedule.set_interval(self.current_interval(time.monotonic() - monitor_start))
+        finally:
+            # stop() 後寫完剩下的資料再關檔 (之後才會被 archive_fan_log 搬走)
+            if bin_writer is not None:
+                bin_writer.close()
+                # 給人看 / 既有分析流程用的 CSV
+                try:
+                    export_csv(self.binary_path, self.csv_path)
+                except Exception as e:
+                    print(f"[FanMonitor] CSV export failed: {e}")
+            else:
+                csv_writer.close()
 
     def get_rpm(self, fan_id):
         try:
@@ -213,14 +182,20 @@ class FanMonitorThread(QThread):
 
     def stop(self):
         self.running = False
-        self.wait()
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def window_stats(self, channel, seconds=120, now=None):
+        """最近 seconds 秒的 WindowStats (不重讀 CSV)"""
+        return self.ring.window_stats(channel, seconds, now)
 
 # ==========================================
 # 主程式邏輯
 # ==========================================
 class ODM_RunIn_Project(BaseRunInApp):
 
-    def __init__(self, title="ODM Run-In"):
+    def __init__(self, title="ODM Run-In", listener=None):
         self.global_cycle = 1
         self.block1_cycle = 1
         self.block2_cycle = 1
@@ -230,18 +205,25 @@ class ODM_RunIn_Project(BaseRunInApp):
         self.total_b1_cycles = 1
         self.total_b2_cycles = 1
         self.total_b3_cycles = 1
-        super().__init__(title=title)   
-        # 設定一個 Timer，在介面顯示後 1 秒檢查是否要 Auto Run
-        # 這樣可以確保 UI 已經完全 Load 好
+        # 編譯後的 Config (on_config_loaded 時建立)
+        self.spec = None
+        self.config_error = None
+        super().__init__(title=title, listener=listener)   
+        # Auto Run 檢查由啟動端負責 (GUI: 介面顯示後 1 秒；Headless: run_headless)
         if getattr(sys, 'frozen', False):
             # 打包後：抓 .exe 的位置
             self.base_dir = os.path.dirname(sys.executable)
         else:
             # 開發時：抓 .py 的位置
             self.base_dir = os.path.dirname(os.path.abspath(__file__))
-        QTimer.singleShot(1000, self.check_auto_run)
         ri_folder = os.path.join(self.base_dir, "RI")
-        self.ec = DirectEC(ri_folder)
+        # EC port 只由 ECBroker 存取 (Fan Monitor / 電量檢查共用，不會互相打斷交易)
+        self.ec = ECBroker(DirectEC(ri_folder), priority=THREAD_PRIORITY_TIME_CRITICAL)
+        self.ec.start()
+
+    def shutdown(self, pump=None):
+        super().shutdown(pump)
+        self.ec.stop()
 
     def save_state(self, block, step, cycle=1, status="IDLE"):
         state = {
@@ -255,25 +237,51 @@ class ODM_RunIn_Project(BaseRunInApp):
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         try:
-            # 寫入 core.py 指定的 self.state_file (runin_state.json)
-            with open(self.state_file, "w") as f:
-                json.dump(state, f, indent=4)
+            # 寫入 core.py 的 state_store (journal append + 定期 snapshot)
+            self.state_store.save(state)
             self.last_saved_state = state # 更新 Core 的快取
         except Exception as e:
             self.log(f"Save State Error: {e}")
+        self.emit_event("state", status=status)
+
+    def event_context(self):
+        ctx = super().event_context()
+        ctx.update({
+            "global_cycle": self.global_cycle,
+            "block1_cycle": self.block1_cycle,
+            "block2_cycle": self.block2_cycle,
+            "block3_cycle": self.block3_cycle,
+        })
+        return ctx
+
+    def on_config_loaded(self):
+        # 啟動時一次檢查 Config，錯誤直接顯示，不要等到測試中途才發現
+        try:
+            self.spec = compile_config(self.config)
+            # [LogSource_*] 登記到 log_analysis，之後可用名稱取用
+            for extra in self.spec.thermal.extra_logs:
+                register_source(extra.source)
+            archive = self.spec.archive
+            self.archiver.configure(enabled=archive.compress, retention_days=archive.retention_days,
+                                    max_total_mb=archive.max_total_mb)
+        except ConfigError as e:
+            self.spec = None
+            self.config_error = str(e)
+            self.log("!!! CONFIG ERROR !!!")
+            for problem in e.problems:
+                self.log(f"Config: {problem}")
+            self.set_status("CONFIG ERROR")
 
     # Auto Run 檢查邏輯
     def check_auto_run(self):
         try:
             # 讀取 Config [Global] AutoRun
-            # 注意: 需確保 config.ini 有 [Global] Section
-            if 'Global' in self.config and self.config['Global'].getboolean('AutoRun'):
+            if self.spec and self.spec.global_.auto_run:
+                # 斷點續傳已啟動時不重複啟動
+                if self.run_state != "READY":
+                    return
                 self.log("[AutoRun] Config detected. Starting test automatically...")              
-                # 假設 BaseRunInApp 有一個 self.btn_start 按鈕
-                if hasattr(self, 'btn_start'):
-                    self.btn_start.click()
-                else:
-                    self.log("Error: Start button not found, cannot auto run.")
+                self.start_test()
         except Exception as e:
             self.log(f"AutoRun Error: {e}")
 
@@ -293,15 +301,17 @@ class ODM_RunIn_Project(BaseRunInApp):
         return f"[{block_name}] Global: {self.global_cycle}/{self.total_global_cycles} | Cycle: {b_cyc}/{b_total} | {action}"
     
     def user_test_sequence(self):
+        if self.spec is None:
+            raise Exception(f"Config Error: {self.config_error}")
         state = self.load_state()
         current_block = "1"
         current_step = 0
         last_status = "IDLE"
 
-        self.total_global_cycles = int(self.config['Global'].get('Total_RunIn_Cycles', 1))
-        self.total_b1_cycles = int(self.config['Block1_Thermal'].get('Cycles', 1))
-        self.total_b2_cycles = int(self.config['Block2_Aging'].get('Cycles', 1))
-        self.total_b3_cycles = int(self.config['Block3_Battery'].get('Cycles', 1))
+        self.total_global_cycles = self.spec.global_.total_cycles
+        self.total_b1_cycles = self.spec.thermal.cycles
+        self.total_b2_cycles = self.spec.aging.cycles
+        self.total_b3_cycles = self.spec.battery.cycles
         # 斷點續傳恢復邏輯
         if state:
             current_block = state.get("block", "1")
@@ -317,13 +327,12 @@ class ODM_RunIn_Project(BaseRunInApp):
 
             if last_status == "FINISHED_PASS":
                 self.log("Test Previously PASSED. Showing Result...")
-                self.worker.sig_finished.emit(True, "Loaded from State History")
-                return 
+                # 回傳結果給 RunInWorker (只觸發一次 on_finished)
+                return True, "Loaded from State History"
             
             if last_status == "FINISHED_FAIL":
                 self.log("Test Previously FAILED. Showing Result...")
-                self.worker.sig_finished.emit(False, "Loaded from State History")
-                return 
+                return False, "Loaded from State History"
             # 偵測非預期當機 (上次狀態仍為 RUNNING)
             if last_status == "REBOOTING":
                 self.log(">>> System returned from Reboot Test. Resuming...")
@@ -344,7 +353,7 @@ class ODM_RunIn_Project(BaseRunInApp):
         # Block 1: Thermal
         # ---------------------------------------------------
         if current_block == "1":
-            if self.config['Block1_Thermal'].getboolean('Enabled'):
+            if self.spec.thermal.enabled:
                 if self.block1_cycle <= self.total_b1_cycles:
                     self.log(f"--- Block 1: Cycle {self.block1_cycle}/{self.total_b1_cycles} ---")
                     self.run_block_1(start_from_step=current_step, current_cycle=self.block1_cycle)
@@ -369,7 +378,7 @@ class ODM_RunIn_Project(BaseRunInApp):
         # Block 2: Aging
         # ---------------------------------------------------
         if current_block == "2":
-            if self.config['Block2_Aging'].getboolean('Enabled'):
+            if self.spec.aging.enabled:
                 if self.block2_cycle <= self.total_b2_cycles:
                     self.log(f"--- Block 2: Cycle {self.block2_cycle}/{self.total_b2_cycles} ---")
                     self.run_block_2(start_from_step=current_step, current_cycle=self.block2_cycle)
@@ -395,7 +404,7 @@ class ODM_RunIn_Project(BaseRunInApp):
         # Block 3: Battery
         # ---------------------------------------------------
         if current_block == "3":
-            if self.config['Block3_Battery'].getboolean('Enabled'):
+            if self.spec.battery.enabled:
                 if self.block3_cycle <= self.total_b3_cycles:
                     self.log(f"--- Block 3: Cycle {self.block3_cycle}/{self.total_b3_cycles} ---")
                     self.run_block_3() # Block 3 比較簡單，通常是單次 Script
@@ -426,46 +435,86 @@ class ODM_RunIn_Project(BaseRunInApp):
             self.log("=== ALL BLOCKS FINISHED ===")   
 
     # --- Helper: 計算 CSV 平均值 ---
+    def fan_window_average(self, fan_thread, channel, duration_sec=120):
+        stats = fan_thread.window_stats(channel, duration_sec, now=time.time())
+        self.log(f"{channel} ({duration_sec}s): count={stats.count} avg={stats.mean:.2f} "
+                 f"min={stats.min} max={stats.max}")
+        if not stats.count:
+            self.log("Warning: No valid data found in timeframe.")
+        return stats.mean
+
+    def telemetry_window_average(self, bin_path, channel, duration_sec=120):
+        """從 .ritl 二進位檔取最近 duration_sec 秒的平均 (二分搜尋切片，不逐行 parse)"""
+        try:
+            with TelemetryBinReader(bin_path) as reader:
+                stats = reader.stats(channel, start=time.time() - duration_sec)
+        except Exception as e:
+            self.log(f"Analysis Error: {e}")
+            return 0.0
+        self.log(f"{channel} ({duration_sec}s, {os.path.basename(bin_path)}): count={stats.count} "
+                 f"avg={stats.mean:.2f}")
+        if not stats.count:
+            self.log("Warning: No valid data found in timeframe.")
+        return stats.mean
+
+    def on_fan_sample(self, fan_thread):
+        """Fan Monitor 每筆取樣後呼叫，每 60 筆在畫面上顯示一次滾動平均"""
+        if len(fan_thread.ring) % 60:
+            return
+        parts = []
+        for channel in fan_thread.columns:
+            stats = fan_thread.window_stats(channel)
+            parts.append(f"{channel}={stats.mean:.0f}" if stats.count else f"{channel}=N/A")
+        self.log("[FanMon] 120s avg: " + ", ".join(parts))
+
     def analyze_fan_log_average(self, csv_path, col_idx, duration_sec=120):
         self.log(f"Analyzing {os.path.basename(csv_path)}...")
         if not os.path.exists(csv_path):
             self.log("Error: Log file not found.")
             return 0.0
             
-        values = []
-        cutoff_time = datetime.now() - timedelta(seconds=duration_sec)
-        
         try:
-            with open(csv_path, 'r') as f:
-                reader = csv.reader(f)
-                next(reader, None) # Skip Header
-                for row in reader:
-                    if len(row) <= col_idx: continue
-                    try:
-                        t_str = row[0]
-                        # 假設 CSV 時間格式 YYYY-mm-dd HH:MM:SS
-                        t_obj = datetime.strptime(t_str, '%Y-%m-%d %H:%M:%S')
-                        if t_obj >= cutoff_time:
-                            values.append(float(row[col_idx]))
-                    except: continue
-            
-            if not values: 
+            # 從檔尾往回讀，只解析最後 duration_sec 秒
+            count, avg = column_average(csv_path, col_idx, "fan", duration_sec)
+            if not count: 
                 self.log("Warning: No valid data found in timeframe.")
                 return 0.0
             
-            avg = sum(values) / len(values)
             self.log(f"Average: {avg:.2f}")
             return avg
         except Exception as e:
             self.log(f"Analysis Error: {e}")
             return 0.0
         
+    def dump_ec_stats(self, log_dir, test_name, mode_suffix, schedules=()):
+        """EC 交易統計 (次數 / 逾時 / 重試 / 延遲分佈) 寫到 Summary 旁的 JSON，並記在 Log 與事件
+        schedules: 取樣器的 PeriodicSchedule，overrun / jitter 一併寫入"""
+        stats = self.ec.stats.to_dict()
+        stats["schedules"] = [schedule.stats()._asdict() for schedule in schedules]
+        self.log_lines(self.ec.stats.summary_lines())
+        for schedule in schedules:
+            self.log(schedule.summary_line())
+            self.emit_event("schedule", test=test_name, **schedule.stats()._asdict())
+        self.emit_event("ec_stats", test=test_name, fallbacks=stats["fallbacks"],
+                        commands={name: {k: c[k] for k in ("requests", "failures", "retries",
+                                                           "ibf_timeouts", "obf_timeouts")}
+                                  for name, c in stats["commands"].items()})
+        try:
+            timestamp_str = datetime.now().strftime("%Y%m%d%H%M%S")
+            stats_path = os.path.join(log_dir, f"EC_Stats_{timestamp_str}_{mode_suffix}.json")
+            with open(stats_path, 'w', encoding='utf-8') as f:
+                json.dump(stats, f, indent=2)
+            self.log(f"EC Stats saved to: {os.path.basename(stats_path)}")
+        except Exception as e:
+            self.log(f"Error saving EC stats: {e}")
+
     def archive_fan_log(self, src_path, prefix_name):
         if not os.path.exists(src_path):
             return None # 檔案不存在回傳 None
         try:
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            new_filename = f"{timestamp}_{prefix_name}.csv"
+            # 副檔名沿用原檔 (.csv / .ritl)
+            new_filename = f"{timestamp}_{prefix_name}{os.path.splitext(src_path)[1]}"
             dest_dir = os.path.dirname(src_path)
             dest_path = os.path.join(dest_dir, new_filename)
             
@@ -479,320 +528,213 @@ class ODM_RunIn_Project(BaseRunInApp):
             self.log(f"Error archiving fan log: {e}")
             return None
 
-    def analyze_ptat_log(self, csv_path, col_idx, duration_sec=120):
-            """ 
-            讀取 PTAT CSV: 
-            - Date 在第 1 欄 (MM/DD/YYYY)
-            - Time 在第 2 欄 (HH:MM:SS:fff) (毫秒用冒號分隔)
-            """
-            self.log(f"[PTAT Analysis] {os.path.basename(csv_path)}")
-            if not os.path.exists(csv_path):
-                self.log("Error: Log file not found.")
-                return 0.0
-                
-            values = []
-            cutoff_time = datetime.now() - timedelta(seconds=duration_sec)
-            
-            try:
-                with open(csv_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    reader = csv.reader(f)
-                    next(reader, None) # Skip Header
-                    
-                    for row in reader:
-                        # PTAT 至少要有 3 欄 (Version, Date, Time) + 數據
-                        if len(row) <= col_idx or len(row) < 3: continue
-                        
-                        try:
-                            date_str = row[1] # e.g. 10/01/2026
-                            time_str = row[2] # e.g. 08:53:58:985
-                            
-                            # 修正 PTAT 的毫秒格式: 08:53:58:985 -> 08:53:58.985
-                            if time_str.count(':') == 3:
-                                last_colon = time_str.rfind(':')
-                                time_str = time_str[:last_colon] + '.' + time_str[last_colon+1:]
-                            
-                            full_time_str = f"{date_str} {time_str}"
-                            # 解析合併後的時間
-                            try:
-                                # 嘗試使用 DD/MM/YYYY (適配您目前的 CSV)
-                                t_obj = datetime.strptime(full_time_str, '%d/%m/%Y %H:%M:%S.%f')
-                            except ValueError:
-                                # 若失敗，嘗試原本的 MM/DD/YYYY (相容舊格式)
-                                t_obj = datetime.strptime(full_time_str, '%m/%d/%Y %H:%M:%S.%f')                            
-                            if t_obj >= cutoff_time:
-                                values.append(float(row[col_idx]))
-                        except ValueError:
-                            continue
-                
-                if not values: 
-                    self.log("Warning: No valid PTAT data found in timeframe.")
-                    return 9999.0
-                
-                avg = sum(values) / len(values)
-                return avg  # 這裡不印 log 避免洗版，由上層呼叫者印
-                
-            except Exception as e:
-                self.log(f"PTAT Analysis Error: {e}")
-                return 9999.0
-    # --- Helper: 尋找最新 Log ---
-    def find_latest_log(self, folder, prefix="PTATMonitor", extension=".csv"):
-        try:
-            if not os.path.exists(folder): return None
-            files = [os.path.join(folder, f) for f in os.listdir(folder) 
-                     if f.startswith(prefix) and f.endswith(extension)]
-            if not files: return None
-            return max(files, key=os.path.getmtime)
-        except Exception as e:
-            self.log(f"Error finding log: {e}")
-            return None
-
-    # --- Helper: 確保 Process 關閉 ---
-    def ensure_process_killed(self, process_name):
-        self.log(f"Stopping {process_name}...")
-        subprocess.run(f"taskkill /F /IM {process_name}", shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        time.sleep(1)
-        # Retry check
-        for _ in range(10):
-            self.log(f"Stopping {process_name} retry...")
-            is_running = False
-            for proc in psutil.process_iter(['name']):
-                if proc.info['name'] and proc.info['name'].lower() == process_name.lower():
-                    is_running = True
-                    break
-            if not is_running: return
-            time.sleep(2)
-            subprocess.run(f"taskkill /F /IM {process_name}", shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    def analyze_log(self, source, csv_path, columns, duration_sec=120):
+        """一次讀取外部 Log (PTAT / GPUMon / LogSource_*)，計算 columns 的統計 (LogScan)"""
+        name = get_source(source).name
+        self.log(f"[{name} Analysis] {os.path.basename(csv_path)}")
+        scan = scan_log(csv_path, columns, source, duration_sec=duration_sec)
+        if not scan.rows:
+            self.log(f"Warning: No valid {name} data found in timeframe.")
+        return scan
+
+    @staticmethod
+    def scan_average(scan, column, empty=9999.0):
+        """欄位平均；時間範圍內沒有資料時回傳 empty (PTAT 用 9999.0，必定超出 Spec)"""
+        stats = scan.stats.get(column)
+        if not stats or not stats.count:
+            return empty
+        return stats.mean
+
+    def scan_power_average(self, scan, column, label, empty=9999.0):
+        """Watt Key 欄位的平均 (找不到欄位時回傳 0.0)"""
+        if column in scan.missing:
+            self.log(f"Warning: {label} Watt Key '{column}' not found in CSV.")
+            return 0.0
+        avg_val = self.scan_average(scan, column, empty)
+        self.log(f"{label} Power ({column}): {avg_val:.2f} W")
+        return avg_val
 
-    # --- Helper: PTAT 檢查 (依 Config 欄位) ---
-    def check_ptat_metrics(self, csv_path, test_mode="Test1"):
-        self.log(f"Verifying PTAT Metrics in {os.path.basename(csv_path)}...")
+    def check_log_metrics(self, scan, metrics, test_mode, label, item_prefix="", log_prefix="", empty=9999.0):
+        """
+        檢查 metrics (MetricSpec) 在 test_mode 的平均值上下限 (TestN_Low/High) 與其他統計量，
+        全部使用同一份 scan。回傳 (errors, detailed_data)
+        """
+        self.log(f"Verifying {label} Metrics in {os.path.basename(scan.path)} ({test_mode})...")
         errors = []
         detailed_data = []
-        if not os.path.exists(csv_path): return ["PTAT Log not found"]
-
-        # 1. 找出 Config 定義的 Keys
-        ptat_keys = []
-        for key, value in self.config['Block1_Thermal'].items():
-            if key.lower().startswith('ptat_key_'):
-                ptat_keys.append(value)
-        
-        if not ptat_keys:
-            self.log("No PTAT_Key defined in Config. Skipping check.")
-            return [], []
-
-        # 2. 建立 Header Map
-        header_map = {}
-        with open(csv_path, 'r') as f:
-            reader = csv.reader(f)
-            headers = next(reader, None)
-            if not headers: return ["PTAT CSV is empty"]
-            header_map = {name.strip(): idx for idx, name in enumerate(headers)}
-
-        # 3. 檢查每個 Key
-        for target_col_name in ptat_keys:
-            if target_col_name not in header_map:
-                msg = f"Config Error: Column '{target_col_name}' not found in CSV"
+        if not metrics:
+            self.log(f"No {label} Key defined in Config. Skipping check.")
+            return errors, detailed_data
+
+        for metric in metrics:
+            target_col_name = metric.column
+            if target_col_name in scan.missing:
+                msg = f"Config Error: {label} Column '{target_col_name}' not found in CSV"
                 self.log(msg)
                 errors.append(msg) 
                 continue
                 
-            col_idx = header_map[target_col_name]
-            avg_val = self.analyze_ptat_log(csv_path, col_idx, duration_sec=120)
+            avg_val = self.scan_average(scan, target_col_name, empty)
             
-            try:
-                cfg_low_key = f"{test_mode}_Low"
-                cfg_high_key = f"{test_mode}_High"
-                
-                limit_low = float(self.config[target_col_name][cfg_low_key])
-                limit_high = float(self.config[target_col_name][cfg_high_key])
+            if test_mode in metric.limits:
+                limit_low, limit_high = metric.limits[test_mode]
                 item_result = "PASS"
                 if avg_val < limit_low or avg_val > limit_high:
-                    msg = f"{target_col_name} FAIL: {avg_val:.2f} (Spec: {limit_low}~{limit_high})"
+                    msg = f"{log_prefix}{target_col_name} FAIL: {avg_val:.2f} (Spec: {limit_low}~{limit_high})"
                     self.log(msg)
                     errors.append(msg)
                     item_result = "FAIL"
                 else:
-                    self.log(f"PASS: {target_col_name} = {avg_val:.2f} (Spec: {limit_low}~{limit_high})")
+                    self.log(f"{log_prefix}PASS: {target_col_name} = {avg_val:.2f} (Spec: {limit_low}~{limit_high})")
 
                 detailed_data.append({
-                    "Item": target_col_name,
+                    "Item": f"{item_prefix}{target_col_name}",
                     "Value": f"{avg_val:.2f}",
                     "Min": limit_low,
                     "Max": limit_high,
                     "Result": item_result
                 })
 
-            except KeyError:
-                self.log(f"WARNING: Config key '{cfg_low_key}/{cfg_high_key}' missing for [{target_col_name}]")
-            except ValueError:
-                self.log(f"WARNING: Invalid value for [{target_col_name}]")
-        
-        return errors, detailed_data
+            elif not metric.stat_limits.get(test_mode):
+                # 只設定其他統計量 (TestN_P95_High 等) 時不檢查平均值
+                self.log(f"WARNING: Config key '{test_mode}_Low/{test_mode}_High' missing for [{target_col_name}]")
 
-    def get_ptat_avg_power_value(self, csv_path, test_mode="Test1"):
-        self.log(f"Calculating PTAT Power Avg ({test_mode})...") # Log 可視需求開關        
-        if not os.path.exists(csv_path): 
-            return 0.0
-
-        # 1. 找出 Config 定義的 Watt Key (只取第一個找到的)
-        target_col_name = None
-        for key, value in self.config['Block1_Thermal'].items():
-            if key.lower() == 'ptat_watt_key': # 精確比對 key 名稱
-                target_col_name = value
-                break
+            # 其他統計量 (TestN_P95_High 等)
+            stat_errors, stat_data = self.check_stat_limits(scan, metric, test_mode, item_prefix, log_prefix)
+            errors.extend(stat_errors)
+            detailed_data.extend(stat_data)
         
-        if not target_col_name:
-            target_col_name = "Power-Package Power(Watts)"
+        return errors, detailed_data
 
-        try:
-            # 2. 讀取 Header 並找 Index
-            col_idx = -1
-            with open(csv_path, 'r', encoding='utf-8', errors='ignore') as f:
-                reader = csv.reader(f)
-                headers = next(reader, None)
-                if headers:
-                    # 去除空白並比對
-                    clean_headers = [h.strip() for h in headers]
-                    if target_col_name in clean_headers:
-                        col_idx = clean_headers.index(target_col_name)
-            
-            if col_idx != -1:
-                # 3. 呼叫底層函式計算 (重用 analyze_ptat_log)
-                avg_val = self.analyze_ptat_log(csv_path, col_idx, duration_sec=120)
-                # self.log(f"PTAT Power ({target_col_name}): {avg_val:.2f} W")
-                return avg_val
+    def check_stat_limits(self, scan, metric, test_mode, item_prefix="", log_prefix=""):
+        """
+        檢查 metric.stat_limits[test_mode] (P95 / Slope / AboveN ...)，
+        同一欄位需要的統計量從 scan.series 一次算完。回傳 (errors, detailed_data)
+        """
+        errors = []
+        detailed_data = []
+        stat_limits = metric.stat_limits.get(test_mode, ())
+        if not stat_limits:
+            return errors, detailed_data
+        series = scan.series.get(metric.column)
+        values = compute(series, [sl.stat for sl in stat_limits]) if series is not None else {}
+        for stat, limit in stat_limits:
+            name = f"{metric.column} {stat_label(stat)}"
+            value = values.get(stat)
+            item_result = "PASS"
+            if value is None or not limit.contains(value):
+                shown = "no data" if value is None else f"{value:.2f}"
+                msg = f"{log_prefix}{name} FAIL: {shown} (Spec: {limit})"
+                self.log(msg)
+                errors.append(msg)
+                item_result = "FAIL"
             else:
-                self.log(f"Warning: PTAT Watt Key '{target_col_name}' not found in CSV.")
-                return 0.0
+                self.log(f"{log_prefix}PASS: {name} = {value:.2f} (Spec: {limit})")
+
+            detailed_data.append({
+                "Item": f"{item_prefix}{name}",
+                "Value": "N/A" if value is None else f"{value:.2f}",
+                "Min": "" if limit.low == -math.inf else limit.low,
+                "Max": "" if limit.high == math.inf else limit.high,
+                "Result": item_result
+            })
+        return errors, detailed_data
 
-        except Exception as e:
-            self.log(f"Error getting PTAT power: {e}")
-            return 0.0
-        
-    def analyze_gpumon_log(self, csv_path, col_idx, duration_sec=120):
-        if not os.path.exists(csv_path): return 0.0
-        values = []
-        cutoff_time = datetime.now() - timedelta(seconds=duration_sec)       
+    # --- Helper: 尋找最新 Log ---
+    def find_latest_log(self, folder, prefix="PTATMonitor", extension=".csv"):
         try:
-            with open(csv_path, 'r', encoding='utf-8', errors='ignore') as f:
-                reader = csv.reader(f)
-                next(reader, None) # Skip Header
-                for row in reader:
-                    # GPUMon CSV: Iteration(0), Date(1), Timestamp(2), Data(3...)
-                    if len(row) <= col_idx or len(row) < 3: continue
-                    try:
-                        date_str = row[1].strip() # 2026/01/11
-                        time_str = row[2].strip() # 22:34:39:692
-                        
-                        # 處理毫秒分隔符號
-                        if time_str.count(':') == 3:
-                            last_colon = time_str.rfind(':')
-                            time_str = time_str[:last_colon] + '.' + time_str[last_colon+1:]
-                        
-                        full_time_str = f"{date_str} {time_str}"
-                        # 格式: YYYY/MM/DD HH:MM:SS.f
-                        t_obj = datetime.strptime(full_time_str, '%Y/%m/%d %H:%M:%S.%f')
-                        
-                        if t_obj >= cutoff_time:
-                            values.append(float(row[col_idx]))
-                    except ValueError: continue
-
-            if not values: return 0.0
-            return sum(values) / len(values)
+            if not os.path.exists(folder): return None
+            files = [os.path.join(folder, f) for f in os.listdir(folder) 
+                     if f.startswith(prefix) and f.endswith(extension)]
+            if not files: return None
+            return max(files, key=os.path.getmtime)
         except Exception as e:
-            self.log(f"GPUMon Analysis Error: {e}")
-            return 0.0
-    
-
-    def check_gpumon_metrics(self, csv_path, test_mode="Test1"):
-        self.log(f"Verifying GPUMon Metrics ({test_mode})...")
-        errors = []       
-        detailed_data = []
-        # 1. 找出 Config Keys
-        gpu_keys = []
-        for key, value in self.config['Block1_Thermal'].items():
-            if key.lower().startswith('gpumon_key_'):
-                gpu_keys.append(value)
-        
-        if not gpu_keys: return [], []
-        # 2. 建立 Header Map
-        header_map = {}
-        with open(csv_path, 'r') as f:
-            reader = csv.reader(f)
-            headers = next(reader, None)
-            if not headers: return ["GPUMon CSV is empty"]
-            header_map = {name.strip(): idx for idx, name in enumerate(headers)}
-        # 3. 檢查數值
-        for target_col in gpu_keys:
-            if target_col not in header_map:
-                errors.append(f"GPUMon Column '{target_col}' not found")
-                continue           
-            avg_val = self.analyze_gpumon_log(csv_path, header_map[target_col], duration_sec=120)
-            
-            try:
-                cfg_low = f"{test_mode}_Low"
-                cfg_high = f"{test_mode}_High"
-                limit_low = float(self.config[target_col][cfg_low])
-                limit_high = float(self.config[target_col][cfg_high])
-                
-                item_result = "PASS"
-                if avg_val < limit_low or avg_val > limit_high:
-                    msg = f"GPUMon {target_col} FAIL: {avg_val:.2f} (Spec: {limit_low}~{limit_high})"
-                    self.log(msg)
-                    errors.append(msg)
-                    item_result = "FAIL"
-                else:
-                    self.log(f"GPUMon PASS: {target_col} = {avg_val:.2f}")
-                
-                detailed_data.append({
-                    "Item": f"GPUMon_{target_col}",
-                    "Value": f"{avg_val:.2f}",
-                    "Min": limit_low,
-                    "Max": limit_high,
-                    "Result": item_result
-                })
-            except Exception as e:
-                errors.append(f"GPUMon Config Error [{target_col}]: {e}")               
-        return errors, detailed_data
-    
-    def get_gpumon_power_avg(self, csv_path, test_mode="Test1"):
-        # self.log(f"Calculating GPUMon Power Avg ({test_mode})...")
-        
-        if not os.path.exists(csv_path):
-            return 0.0
-            
-        target_col_name = None
-        for key, value in self.config['Block1_Thermal'].items():
-            if key.lower() == 'gpumon_watt_key':
-                target_col_name = value
-                break
-        
-        if not target_col_name:
-            target_col_name = "1:TGP (W)" # 預設值
+            self.log(f"Error finding log: {e}")
+            return None
 
+    def find_new_log(self, folder, prefix, since, extension=".csv"):
+        """folder 內最新的 Log；修改時間早於 since (epoch 秒) 視為上一輪留下的，回傳 None"""
+        path = self.find_latest_log(folder, prefix=prefix, extension=extension)
         try:
-            col_idx = -1
-            with open(csv_path, 'r', encoding='utf-8', errors='ignore') as f:
-                reader = csv.reader(f)
-                headers = next(reader, None)
-                if headers:
-                    clean_headers = [h.strip() for h in headers]
-                    if target_col_name in clean_headers:
-                        col_idx = clean_headers.index(target_col_name)
-
-            if col_idx != -1:
-                # 這裡假設 analyze_gpumon_log 參數與 analyze_ptat_log 類似
-                # 如果 analyze_gpumon_log 邏輯不同，請對應調整
-                avg_val = self.analyze_gpumon_log(csv_path, col_idx, duration_sec=120)                
-                if test_mode == "Test1": return 0.0                 
-                self.log(f"GPUMon Power ({target_col_name}): {avg_val:.2f} W")
-                return avg_val
-            else:
-                return 0.0
+            return path if path and os.path.getmtime(path) >= since else None
+        except OSError:
+            return None
+
+    def open_live_tailers(self, verifier, started):
+        """燒機中的 PTAT / GPUMon / LogSource_* Log 各建立一個 LogTailer (只建立有 Abort 上下限的來源)"""
+        thermal = self.spec.thermal
+        ptat_log_dir = os.path.join(os.path.expanduser("~"), "Documents", "iPTAT", "log")
+        sources = [("PTAT", ptat_log_dir, "PTATMonitor")]
+        if thermal.gpumon_metrics:
+            sources.append(("GPUMon", os.path.join(self.base_dir, "RI", "GPUMon"), "cpu_gpumon"))
+        for extra in thermal.extra_logs:
+            sources.append((extra.source.name, os.path.expandvars(os.path.expanduser(extra.folder)),
+                            extra.file_prefix))
+        tailers = []
+        for name, folder, prefix in sources:
+            columns = verifier.columns(name)
+            if columns:
+                locate = lambda folder=folder, prefix=prefix: self.find_new_log(folder, prefix, started)
+                tailers.append(LogTailer(locate, columns, name))
+        return tailers
+
+    def run_stress_phase(self, test_name, duration, fan_thread, started):
+        """
+        燒機 duration 秒。[FailFast] 啟用時每 Check_Interval 秒增量讀取 Fan Monitor 與 PTAT / GPUMon Log，
+        硬性上下限連續超出 Grace_Seconds 秒即提前結束，回傳觸發的 AbortTrip list (正常跑完為空)
+        """
+        fail_fast = self.spec.thermal.fail_fast
+        if not fail_fast.enabled or not fail_fast.limits:
+            self.wait_seconds(duration)
+            return []
+
+        verifier = LiveVerifier(fail_fast.limits, fail_fast.grace_seconds)
+        tailers = self.open_live_tailers(verifier, started)
+        warned = set()
+        fan_seq = 0
+        self.log(f"[FailFast] {len(fail_fast.limits)} abort limit(s), grace {fail_fast.grace_seconds:g}s, "
+                 f"check every {fail_fast.check_interval:g}s")
+        deadline = time.monotonic() + duration
+        schedule = PeriodicSchedule(fail_fast.check_interval, name="FailFast")
+        while True:
+            # 時間到時 wait() 回傳 False，最後再檢查一次新資料
+            running = schedule.wait(lambda: self.stop_flag or time.monotonic() >= deadline)
+            self.check_stop()
+            if fan_thread is not None:
+                fan_seq, samples = fan_thread.ring.since(fan_seq)
+                for t, values in samples:
+                    verifier.feed("Fan", t, dict(zip(fan_thread.columns, values)))
+            for tailer in tailers:
+                try:
+                    rows = tailer.poll()
+                except OSError as e:
+                    self.log(f"[FailFast] {tailer.source.name} read error: {e}")
+                    continue
+                if tailer.missing and tailer.path not in warned:
+                    warned.add(tailer.path)
+                    self.log(f"[FailFast] Warning: {tailer.source.name} column(s) not found: "
+                             f"{', '.join(tailer.missing)}")
+                for t, values in rows:
+                    verifier.feed(tailer.source.name, t, dict(zip(tailer.columns, values)))
+
+            trips = verifier.tripped()
+            if trips:
+                elapsed = duration - max(0.0, deadline - time.monotonic())
+                for trip in trips:
+                    self.log(f"[FailFast] {trip.limit.source} {trip.limit.column} = {trip.value:.2f} "
+                             f"(Abort Spec: {trip.limit.limit}) for {trip.last - trip.since:.0f}s")
+                self.log(f"[FailFast] Abort {test_name} stress after {elapsed:.0f}s / {duration}s")
+                return trips
+            if not running:
+                return []
+
+    # --- Helper: 確保 Process 關閉 ---
+    def ensure_process_killed(self, *process_names):
+        """依 image name 關閉未經 supervisor 啟動的程式 (一次掃描、平行等待)"""
+        self.log(f"Stopping {', '.join(process_names)}...")
+        if not self.supervisor.shutdown(names=[], extra_images=process_names):
+            self.log(f"WARNING: {', '.join(process_names)} still running!")
 
-        except Exception as e:
-            self.log(f"Error getting GPUMon power: {e}")
-            return 0.0
     # ==========================================
     # Helper: 取得風扇轉速 (單純讀取版)
     # ==========================================
@@ -824,18 +766,12 @@ class ODM_RunIn_Project(BaseRunInApp):
             log_file = os.path.join(log_dir, f"{timestamp}_fan_rpm_test.log")   
             tool_path = os.path.join(self.base_dir, "RI", "DiagECtool.exe")  
             try:
-                try:
-                    fan_count = int(self.config['Block1_Thermal']['Test2_Fan_Count'])
-                    fan_ids = [str(i) for i in range(1, fan_count + 1)]
-                except ValueError:
-                    raise Exception("Config Error: Test2_Fan_Count must be an integer")
-
-                try:
-                    sample_count = int(self.config['Block1_Thermal']['Test2_Sample_Count'])
-                    target_duty = self.config['Block1_Thermal']['Test2_Duty']   
-                    retry_limit = int(self.config['Block1_Thermal'].get('Fan_Retry_Count', '3'))
-                except KeyError as e:
-                    raise Exception(f"Config Error: Missing key {e}")                                
+                test2 = self.spec.thermal.test2
+                fan_count = test2.fan_count
+                fan_ids = [str(i) for i in range(1, fan_count + 1)]
+                sample_count = test2.sample_count
+                target_duty = test2.duty
+                retry_limit = test2.retry_limit
                 # A. 切換 Mode Debug
                 self.log("Set Fan Mode: DEBUG")
                 self.exec_cmd_wait(f"{tool_path} fan --mode debug", capture_log=True)
@@ -860,23 +796,12 @@ class ODM_RunIn_Project(BaseRunInApp):
                     
                     # 3. 等待穩定
                     self.log("Waiting 5 seconds for fan to stabilize...")
-                    for _ in range(5):
-                        time.sleep(1)
-                        QApplication.processEvents()
+                    self.wait_seconds(5, stoppable=False)
 
                     # 4. 抓取 RPM 並判定
                     for fan_id in fan_ids:
-                        # Key 變更為 Test2_FanX_Min/Max (移除 Level 字眼)
-                        key_min = f"Test2_Fan{fan_id}_Min"
-                        key_max = f"Test2_Fan{fan_id}_Max"
-                        
-                        try:
-                            spec_min = int(self.config['Block1_Thermal'][key_min])
-                            spec_max = int(self.config['Block1_Thermal'][key_max])
-                        except KeyError:
-                            self.log(f"ERROR: Config key '{key_min}' or '{key_max}' missing!")
-                            all_failures.append(f"Config Missing for Fan {fan_id}")
-                            continue
+                        # Test2_FanX_Min/Max (啟動時已檢查)
+                        spec_min, spec_max = test2.fans[int(fan_id)]
 
                         # 抓取 RPM (取樣平均)
                         rpms = []
@@ -926,77 +851,70 @@ class ODM_RunIn_Project(BaseRunInApp):
         log_dir = r"C:\Diag\Thermal"
         tool_path = os.path.join(self.base_dir, "RI", "DiagECtool.exe")  
         os.makedirs(log_dir, exist_ok=True)
-        try:
-            # 動態讀取對應的 Duration (例如 Test1_Duration 或 Test3_Duration)
-            duration = int(self.config['Block1_Thermal'][f'{test_name}_Duration'])
-        except KeyError:
-            self.log(f"Config Error: {test_name}_Duration not found, default to 1200")
-            duration = 1200
+        # 對應的 Test Spec (Test1 或 Test3)
+        test_spec = self.spec.thermal.tests[test_name]
+        duration = test_spec.duration
 
         # Log 檔名 (區分 Test1 / Test3)
         fan_log = os.path.join(log_dir, f"{test_name}_Fan.csv")
+        # 取樣期間寫二進位檔，結束時轉出 fan_log (CSV)
+        fan_bin = os.path.join(log_dir, f"{test_name}_Fan.ritl")
         fan_thread = None
+        # 燒機中觸發的 Fail Fast 上下限 (驗證階段記為失敗)
+        fail_fast_trips = []
+        stress_started = time.time()
 
         # 檢查 GPUMon 是否啟用
-        gpumon_keys = [k for k in self.config['Block1_Thermal'] if k.lower().startswith('gpumon_key_')]
-        is_gpumon_enabled = len(gpumon_keys) > 0
+        is_gpumon_enabled = len(self.spec.thermal.gpumon_metrics) > 0
         if is_gpumon_enabled:
             self.log(f"[{test_name}] GPUMon Enabled.")
         else:
             self.log(f"[{test_name}] GPUMon Disabled.")
         try:
             # 0. set fan mode
-            fan_mode = self.config['Block1_Thermal'].get('Fan_Mode', None)
-            if fan_mode and str(fan_mode).strip():
-                fan_mode = str(fan_mode).strip()
+            fan_mode = self.spec.thermal.fan_mode
+            if fan_mode:
                 self.log(f"Set Fan Mode: {fan_mode}")
                 self.exec_cmd_wait(f"{tool_path} raw --cmd 0x20 --subcmd 0x01 --data 0x03", capture_log=True)
                 self.exec_cmd_wait(f"{tool_path} raw --cmd 0x20 --subcmd 0x06 --data 0x0{fan_mode}", capture_log=True)
-                for _ in range(10):
-                    self.check_stop()
-                    QApplication.processEvents()
-                    time.sleep(1)
+                self.wait_seconds(10)
             # --- 階段 A: 啟動壓力工具 (Staggered Start) ---          
             # 1. 啟動 Furmark (傳入的指令)
             self.log(f"Starting Furmark: {furmark_cmd}")
-            p_furmark = subprocess.Popen(furmark_cmd, shell=True)
+            # FurMark GUI 與 CLI 名稱不同，兩個都登記
+            self.supervisor.spawn("FurMark", furmark_cmd, image_names=("FurMark_GUI.exe", "furmark.exe"))
             # 等待 10 秒 (讓 GPU warmup and stable)
-            for _ in range(10):
-                self.check_stop()
-                QApplication.processEvents()
-                time.sleep(1)
+            self.wait_seconds(10)
 
             # 2. 啟動 Prime95
             self.log(f"Starting Prime95: {prime95_cmd}")
-            p_prime95 = subprocess.Popen(prime95_cmd, shell=True)
+            self.supervisor.spawn("Prime95", prime95_cmd, image_names=("prime95.exe",))
             
             # 3. 等待 40 秒 (PTAT 前置緩衝)
             self.log("Waiting 40s before starting PTAT...")
-            for _ in range(40):
-                self.check_stop()
-                QApplication.processEvents()
-                time.sleep(1)
+            self.wait_seconds(40)
 
             # 4. 啟動 PTAT
             ptat_dir = r"C:\Program Files\Intel Corporation\Intel(R)PTAT"
             if os.path.exists(ptat_dir):                    
                 ptat_cmd = "PTAT.exe -start -w=cpu.json"
                 self.log(f"Starting PTAT: {ptat_cmd}")
-                p_ptat = subprocess.Popen(ptat_cmd, cwd=ptat_dir, shell=True)
+                self.supervisor.spawn("PTAT", ptat_cmd, image_names=("PTAT.exe",), cwd=ptat_dir)
             else:
                 self.log("PTAT not installed (dir not found)")
                 raise Exception("PTAT not installed")
 
             # 5. 等待 20 秒 (Fan/GPUMon 前置緩衝)
             self.log("Waiting 20s before starting Fan Monitor...")
-            for _ in range(20):
-                self.check_stop()
-                QApplication.processEvents()
-                time.sleep(1)
+            self.wait_seconds(20)
 
-            # 6. 啟動 Fan Monitor
-            fan_thread = FanMonitorThread(fan_log)
-            fan_thread.start(QThread.TimeCriticalPriority)
+            # 6. 啟動 Fan Monitor (EC 統計從這裡開始算，結果附在 Summary 旁)
+            self.ec.stats.reset()
+            monitor = self.spec.monitor
+            fan_thread = FanMonitorThread(fan_log, ec=self.ec, channels=monitor.channels, phases=monitor.phases,
+                                          binary_path=fan_bin)
+            fan_thread.on_sample = lambda *values: self.on_fan_sample(fan_thread)
+            fan_thread.start()
 
             # 7. 啟動 GPUMon (若啟用)
             if is_gpumon_enabled:
@@ -1004,23 +922,20 @@ class ODM_RunIn_Project(BaseRunInApp):
                 if not os.path.exists(gpu_mon_dir): os.makedirs(gpu_mon_dir)
                 gpu_ppab_cmd = f"GPUMonCmd.exe -db:0"
                 self.log(f"Disable PPAB: {gpu_ppab_cmd}")
-                subprocess.Popen(gpu_ppab_cmd, cwd=gpu_mon_dir, shell=True)
-                for _ in range(10):
-                    self.check_stop()
-                    QApplication.processEvents()
-                    time.sleep(1)
+                self.supervisor.spawn("GPUMon_PPAB", gpu_ppab_cmd, cwd=gpu_mon_dir)
+                self.wait_seconds(10)
                 # 這裡 Log 檔名先用暫存的，最後再備份改名
                 gpu_temp_log = "cpu_gpumon.csv" 
                 gpu_cmd = f"GPUMonCmd.exe -custom:timestamp,temp,pwr,clk -wake -log:{gpu_temp_log}"
                 self.log(f"Starting GPUMon: {gpu_cmd}")
-                p_gpumon = subprocess.Popen(gpu_cmd, cwd=gpu_mon_dir, shell=True)
+                self.supervisor.spawn("GPUMon", gpu_cmd, image_names=("GPUMonCmd.exe",), cwd=gpu_mon_dir)
+
+            # 所有工具已啟動，重新登記各自的子程序樹
+            self.supervisor.refresh()
 
             # --- 階段 B: 正式燒機測試 ---
             self.log(f"Running Stress for {duration} seconds...")
-            for i in range(duration):
-                if i % 10 == 0: QApplication.processEvents()
-                self.check_stop()
-                time.sleep(1)
+            fail_fast_trips = self.run_stress_phase(test_name, duration, fan_thread, stress_started)
 
         except Exception as e:
             self.log(f"[{test_name}] Interrupted or Error: {e}")
@@ -1039,32 +954,25 @@ class ODM_RunIn_Project(BaseRunInApp):
                 pass            
             self.log("Waiting 15s for PTAT logs...")
             # 關鍵: 保持 Prime95/Furmark 活著，等待 PTAT 寫完
-            for i in range(15):
-                if i % 10 == 0: QApplication.processEvents()
-                time.sleep(1)           
-            self.ensure_process_killed("PTAT.exe")           
+            self.wait_seconds(15, stoppable=False)
+            self.supervisor.shutdown(["PTAT"], extra_images=("PTAT.exe",))           
             # 2. 停 GPUMon
             if is_gpumon_enabled:
                 gpu_ppab_cmd = f"GPUMonCmd.exe -db:1"
                 self.log(f"Enable PPAB: {gpu_ppab_cmd}")
-                subprocess.Popen(gpu_ppab_cmd, cwd=gpu_mon_dir, shell=True)
-                for _ in range(10):
-                    self.check_stop()
-                    QApplication.processEvents()
-                    time.sleep(1)
-                self.ensure_process_killed("GPUMonCmd.exe")           
+                self.supervisor.spawn("GPUMon_PPAB", gpu_ppab_cmd, cwd=gpu_mon_dir)
+                self.wait_seconds(10)
+                self.supervisor.shutdown(["GPUMon", "GPUMon_PPAB"], extra_images=("GPUMonCmd.exe",))           
             # 3. 停 Fan Monitor
             if fan_thread: fan_thread.stop()
             
-            # 4. 停 Stress Tools (最後才殺)
-            self.ensure_process_killed("prime95.exe")
-            # 殺 Furmark (注意: FurMark GUI 與 CLI 可能名稱不同，通殺)
-            self.ensure_process_killed("FurMark_GUI.exe")
-            self.ensure_process_killed("furmark.exe")    
+            # 4. 停 Stress Tools (最後才殺，Prime95 與 FurMark 平行關閉)
+            self.supervisor.shutdown(["Prime95", "FurMark"],
+                                     extra_images=("prime95.exe", "FurMark_GUI.exe", "furmark.exe"))
+            # 其餘仍登記在 supervisor 的工具一併收掉
+            self.supervisor.shutdown()    
             # 釋放資源
-            for i in range(10):
-                if i % 10 == 0: QApplication.processEvents()
-                time.sleep(1)  
+            self.wait_seconds(10, stoppable=False)
             self.log("Teardown: Set Fan Mode AUTO")
             subprocess.run(f"{tool_path} fan --mode auto", shell=True)    
 
@@ -1073,54 +981,69 @@ class ODM_RunIn_Project(BaseRunInApp):
         all_failures = []
         
         summary_csv_data = []
+        # 0. 燒機中提前結束的項目 (Fail Fast)
+        for trip in fail_fast_trips:
+            limit = trip.limit
+            msg = (f"FailFast {limit.source} {limit.column}: {trip.value:.2f} (Abort Spec: {limit.limit}) "
+                   f"for {trip.last - trip.since:.0f}s")
+            all_failures.append(msg)
+            self.emit_event("fail_fast", test=test_name, source=limit.source, item=limit.column,
+                            value=trip.value, duration=round(trip.last - trip.since, 1))
+            summary_csv_data.append({
+                "Item": f"FailFast_{limit.source}_{limit.column}", "Value": trip.value,
+                "Min": "" if limit.limit.low == -math.inf else limit.limit.low,
+                "Max": "" if limit.limit.high == math.inf else limit.limit.high,
+                "Result": "FAIL"
+            })
         # 1. 備份與檢查 Fan Log
         archived_fan_log = None
-
-        if test_name == "Test1":
-            archived_fan_log = self.archive_fan_log(fan_log, f"CPU_only_Fan")
-        else:
-            archived_fan_log = self.archive_fan_log(fan_log, f"Dual_Fan")
+        fan_prefix = "CPU_only_Fan" if test_name == "Test1" else "Dual_Fan"
+        archived_fan_log = self.archive_fan_log(fan_log, fan_prefix)
+        archived_fan_bin = self.archive_fan_log(fan_bin, fan_prefix)
         target_log_to_analyze = archived_fan_log if (archived_fan_log and os.path.exists(archived_fan_log)) else fan_log    
         try:
-            # 讀取對應 Test1 或 Test3 的 Fan Spec
-            spec_f1_min = int(self.config['Block1_Thermal'][f'{test_name}_Fan1_Min'])
-            spec_f1_max = int(self.config['Block1_Thermal'][f'{test_name}_Fan1_Max'])       
-            spec_f2_min = int(self.config['Block1_Thermal'][f'{test_name}_Fan2_Min'])
-            spec_f2_max = int(self.config['Block1_Thermal'][f'{test_name}_Fan2_Max'])
-            
-            avg_fan1 = self.analyze_fan_log_average(target_log_to_analyze, 1) 
-            avg_fan2 = self.analyze_fan_log_average(target_log_to_analyze, 2)
-            
+            # 依監控通道產生檢查項目: 風扇用 TestX_FanN 規格，其他通道有設定上下限才檢查
+            channels = fan_thread.channels if fan_thread is not None else self.spec.monitor.channels
             fan_failed = False
-            # --- 驗證 Fan 1 ---
-            res_f1 = "PASS"
-            if not (spec_f1_min <= avg_fan1 <= spec_f1_max):
-                msg = f"Fan1 RPM FAIL: {avg_fan1} (Spec: {spec_f1_min}-{spec_f1_max})"
-                self.log(msg)
-                all_failures.append(msg)
-                fan_failed = True
-                res_f1 = "FAIL"
+            fan_avgs = []
+            for col_idx, channel in enumerate(channels, start=1):
+                if channel.kind == "fan":
+                    spec_range = test_spec.fans[channel.index]
+                else:
+                    spec_range = test_spec.sensor_limits.get(channel.key)
+                    if spec_range is None:
+                        continue
+                spec_min, spec_max = spec_range
+
+                if fan_thread is not None and len(fan_thread.ring):
+                    # 取樣時已累計，直接讀最近 120 秒的平均 (與 analyze_fan_log_average 相同的視窗)
+                    avg = self.fan_window_average(fan_thread, channel.column)
+                elif archived_fan_bin:
+                    avg = self.telemetry_window_average(archived_fan_bin, channel.column)
+                else:
+                    avg = self.analyze_fan_log_average(target_log_to_analyze, col_idx)
 
-            summary_csv_data.append({
-                "Item": "Fan1_RPM", "Value": avg_fan1, 
-                "Min": spec_f1_min, "Max": spec_f1_max, "Result": res_f1
-            })            
-            # --- 驗證 Fan 2 ---
-            res_f2 = "PASS"
-            if not (spec_f2_min <= avg_fan2 <= spec_f2_max):
-                msg = f"Fan2 RPM FAIL: {avg_fan2} (Spec: {spec_f2_min}-{spec_f2_max})"
-                self.log(msg)
-                all_failures.append(msg)
-                fan_failed = True
-                res_f2 = "FAIL"
-            
-            summary_csv_data.append({
-                "Item": "Fan2_RPM", "Value": avg_fan2, 
-                "Min": spec_f2_min, "Max": spec_f2_max, "Result": res_f2
-            })
-            # 若兩者都沒失敗才算 PASS
-            if not fan_failed:
-                self.log(f"Fan RPM PASS: Fan1={avg_fan1}, Fan2={avg_fan2}")    
+                res = "PASS"
+                if not (spec_min <= avg <= spec_max):
+                    label = f"{channel.key} RPM" if channel.kind == "fan" else channel.key
+                    msg = f"{label} FAIL: {avg} (Spec: {spec_min}-{spec_max})"
+                    self.log(msg)
+                    all_failures.append(msg)
+                    res = "FAIL"
+                    if channel.kind == "fan":
+                        fan_failed = True
+                elif channel.kind != "fan":
+                    self.log(f"{channel.key} PASS: {avg}")
+                if channel.kind == "fan":
+                    fan_avgs.append(f"{channel.key}={avg}")
+
+                summary_csv_data.append({
+                    "Item": channel.column, "Value": avg, 
+                    "Min": spec_min, "Max": spec_max, "Result": res
+                })
+            # 所有風扇都沒失敗才算 PASS
+            if fan_avgs and not fan_failed:
+                self.log(f"Fan RPM PASS: {', '.join(fan_avgs)}")    
 
         except KeyError as k:
             all_failures.append(f"Config Key Missing: {k}")       
@@ -1128,6 +1051,8 @@ class ODM_RunIn_Project(BaseRunInApp):
             all_failures.append(f"Fan Check Error: {e}")
 
         # 2. 備份與檢查 PTAT Log
+        ptat_copy_path = None
+        gpumon_copy_path = None
         ptat_power_avg_val = 0
         gpumon_power_avg_val = 0
         user_home = os.path.expanduser("~")
@@ -1143,9 +1068,13 @@ class ODM_RunIn_Project(BaseRunInApp):
             dest_path = os.path.join(log_dir, new_filename)
             try:
                 shutil.copy2(ptat_log, dest_path)
+                ptat_copy_path = dest_path
                 # 傳入 test_mode=test_name，這樣就會去讀 Test3_Low/High
-                ptat_errors, ptat_data = self.check_ptat_metrics(dest_path, test_mode=test_name) 
-                ptat_power_avg_val = self.get_ptat_avg_power_value(dest_path, test_mode=test_name)
+                thermal = self.spec.thermal
+                ptat_scan = self.analyze_log("PTAT", dest_path,
+                                             [m.column for m in thermal.ptat_metrics] + [thermal.ptat_watt_key])
+                ptat_errors, ptat_data = self.check_log_metrics(ptat_scan, thermal.ptat_metrics, test_name, "PTAT")
+                ptat_power_avg_val = self.scan_power_average(ptat_scan, thermal.ptat_watt_key, "PTAT")
                 if ptat_errors:
                     all_failures.extend(ptat_errors)
                 else:
@@ -1168,9 +1097,17 @@ class ODM_RunIn_Project(BaseRunInApp):
                 dest_gpu_path = os.path.join(log_dir, dest_gpu_name)              
                 try:
                     shutil.copy2(src_gpu_log, dest_gpu_path)
+                    gpumon_copy_path = dest_gpu_path
                     # 傳入 test_mode=test_name
-                    gpu_errors, gpu_data = self.check_gpumon_metrics(dest_gpu_path, test_mode=test_name)
-                    gpumon_power_avg_val = self.get_gpumon_power_avg(dest_gpu_path, test_mode=test_name)
+                    thermal = self.spec.thermal
+                    gpu_scan = self.analyze_log("GPUMon", dest_gpu_path,
+                                                [m.column for m in thermal.gpumon_metrics] + [thermal.gpumon_watt_key])
+                    gpu_errors, gpu_data = self.check_log_metrics(gpu_scan, thermal.gpumon_metrics, test_name, "GPUMon",
+                                                                  item_prefix="GPUMon_", log_prefix="GPUMon ", empty=0.0)
+                    # CPU only 測試不計 GPU 功耗
+                    if test_name != "Test1":
+                        gpumon_power_avg_val = self.scan_power_average(gpu_scan, thermal.gpumon_watt_key, "GPUMon",
+                                                                       empty=0.0)
                     if gpu_errors:
                         all_failures.extend(gpu_errors)
                     else:
@@ -1182,15 +1119,40 @@ class ODM_RunIn_Project(BaseRunInApp):
             else:
                 self.log("WARNING: GPUMon Log missing!")
                 all_failures.append("GPUMon Log missing")
+
+        # 3.1 Config 自訂的外部 Log ([LogSource_<Name>])
+        extra_copy_paths = []
+        for extra in self.spec.thermal.extra_logs:
+            name = extra.source.name
+            src_log = self.find_latest_log(os.path.expandvars(os.path.expanduser(extra.folder)),
+                                           prefix=extra.file_prefix)
+            if not src_log:
+                self.log(f"WARNING: {name} Log missing!")
+                all_failures.append(f"{name} Log missing")
+                continue
+            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+            dest_extra_path = os.path.join(log_dir, f"{timestamp}_{test_name}_{name}.csv")
+            try:
+                shutil.copy2(src_log, dest_extra_path)
+                extra_copy_paths.append(dest_extra_path)
+                extra_scan = self.analyze_log(extra.source, dest_extra_path, [m.column for m in extra.metrics])
+                extra_errors, extra_data = self.check_log_metrics(extra_scan, extra.metrics, test_name, name,
+                                                                  item_prefix=f"{name}_", log_prefix=f"{name} ")
+                if extra_errors:
+                    all_failures.extend(extra_errors)
+                else:
+                    self.log(f"{name} Check PASS.")
+                summary_csv_data.extend(extra_data)
+            except Exception as e:
+                all_failures.append(f"{name} Error: {e}")
                 
         # ==========================================
         # 4. 功耗檢查 (Power Check)
         # ==========================================
         # 4.1 CPU
         try:
-            # 讀取 Config (若沒設則預設 0~9999)
-            cpu_min = float(self.config['Block1_Thermal'].get(f'{test_name}_CPUPower_Min', 0))
-            cpu_max = float(self.config['Block1_Thermal'].get(f'{test_name}_CPUPower_Max', 9999))
+            # Config 若沒設則預設 0~9999
+            cpu_min, cpu_max = test_spec.cpu_power
             
             res_cpu = "PASS"
             if not (cpu_min <= ptat_power_avg_val <= cpu_max):
@@ -1211,8 +1173,7 @@ class ODM_RunIn_Project(BaseRunInApp):
         # 4.2 GPU Power
         if is_gpumon_enabled and test_name == "Test3":
             try:
-                gpu_min = float(self.config['Block1_Thermal'].get(f'{test_name}_GPUPower_Min', 0))
-                gpu_max = float(self.config['Block1_Thermal'].get(f'{test_name}_GPUPower_Max', 9999))
+                gpu_min, gpu_max = test_spec.gpu_power
                 
                 res_gpu = "PASS"
                 if not (gpu_min <= gpumon_power_avg_val <= gpu_max):
@@ -1234,10 +1195,8 @@ class ODM_RunIn_Project(BaseRunInApp):
         self.log(f"[Power Check] CPU: {ptat_power_avg_val:.2f}W + GPU: {gpumon_power_avg_val:.2f}W = Total: {total_pwr:.2f}W")
         
         try:
-            # 從 Config 讀取 Total Power Spec
-            # 格式: Test1_TotalPower_Min / Max
-            spec_min = float(self.config['Block1_Thermal'].get(f'{test_name}_TotalPower_Min', 0))
-            spec_max = float(self.config['Block1_Thermal'].get(f'{test_name}_TotalPower_Max', 9999))
+            # Total Power Spec (Config 格式: Test1_TotalPower_Min / Max)
+            spec_min, spec_max = test_spec.total_power
             
             res_pwr = "PASS"
             if not (spec_min <= total_pwr <= spec_max):
@@ -1270,6 +1229,8 @@ class ODM_RunIn_Project(BaseRunInApp):
                 writer = csv.DictWriter(csvfile, fieldnames=["Item", "Value", "Min", "Max", "Result"])
                 writer.writeheader()
                 for row in summary_csv_data:
+                    self.emit_event("metric", test=test_name, item=row["Item"], value=row["Value"],
+                                    min=row["Min"], max=row["Max"], result=row["Result"])
                     if isinstance(row["Value"], float):
                         row["Value"] = f"{row['Value']:.1f}"
                     writer.writerow(row)
@@ -1278,8 +1239,15 @@ class ODM_RunIn_Project(BaseRunInApp):
             
         except Exception as e:
             self.log(f"Error generating summary CSV: {e}")
+        self.dump_ec_stats(log_dir, test_name, "cpu_only" if test_name == "Test1" else "dual",
+                           schedules=(fan_thread.schedule,) if fan_thread else ())
+        # 分析完成後，原始 CSV 交給背景壓縮 (Summary CSV 保持原樣)
+        for archived_path in (archived_fan_log, archived_fan_bin, ptat_copy_path, gpumon_copy_path, *extra_copy_paths):
+            self.archiver.submit(archived_path, category="thermal")
         # ==========================================
         # 最終判定
+        self.emit_event("test_result", test=test_name, result="FAIL" if all_failures else "PASS",
+                        failures=all_failures)
         if all_failures:
             error_summary = " | ".join(all_failures)
             raise Exception(f"{test_name} FAILED: {error_summary}")
@@ -1290,17 +1258,16 @@ class ODM_RunIn_Project(BaseRunInApp):
     # 電量檢查
     # ==========================================
     def check_battery_threshold(self):
-        try:
-            threshold = int(self.config['Block1_Thermal']['Start_Battery_Threshold'])
-        except KeyError:
-            threshold = 90 # 預設值
+        threshold = self.spec.thermal.start_battery_threshold
 
         self.log(f"Waiting for Battery > {threshold}%...")          
         
+        # 每 5 秒檢查一次 (固定 deadline，PowerShell/EC 耗時不會拉長週期)
+        schedule = PeriodicSchedule(5, name="BatteryThreshold")
         while True:
+            schedule.wait(lambda: self.stop_flag)
             # 檢查是否有人按 STOP
             self.check_stop()
-            QApplication.processEvents() 
             
             try:
                 bat = psutil.sensors_battery()
@@ -1312,6 +1279,8 @@ class ODM_RunIn_Project(BaseRunInApp):
 
                     charging_current = self.ec.get_charging_current()
                     self.log(f"Battery charging current: {charging_current}mA")
+                    self.emit_event("battery", percent=current_pct, plugged=is_plugged,
+                                    charging_current_ma=charging_current, threshold=threshold)
 
                     if current_pct >= threshold:
                         self.log("Battery Threshold Reached!")
@@ -1324,26 +1293,21 @@ class ODM_RunIn_Project(BaseRunInApp):
                     break
             except Exception as e:
                 self.log(f"Error reading battery: {e}")
-            
-            # 等待 5 秒再檢查
-            time.sleep(5)
+        self.log(schedule.summary_line())
+
+    def log_battery_percentage(self, context=""):
+        percent = psutil.sensors_battery().percent
+        self.log(f"Battery percentage:{percent}")
+        self.emit_event("battery", percent=percent, context=context)
 
     def update_state_step(self, block, step, status):
-        import json
         try:
-            if os.path.exists("runin_state.json"):
-                with open("runin_state.json", "r") as f:
-                    state = json.load(f)
-            else:
-                state = {}
-            
-            state["block"] = str(block)
-            state["step"] = int(step)
-            state["status"] = status
-            state["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            with open("runin_state.json", "w") as f:
-                json.dump(state, f, indent=4)
+            self.last_saved_state = self.state_store.update(
+                block=str(block),
+                step=int(step),
+                status=status,
+                timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            )
         except Exception as e:
             self.log(f"Update State Error: {e}")
             
@@ -1358,9 +1322,7 @@ class ODM_RunIn_Project(BaseRunInApp):
         # Step 0: 電量檢查
         tool_path = os.path.join(self.base_dir, "RI", "DiagECtool.exe")
         self.exec_cmd_wait(f"{tool_path} battery --mode auto", capture_log=True)
-        for i in range(5):
-            if i % 10 == 0: QApplication.processEvents()
-            time.sleep(1)
+        self.wait_seconds(5, stoppable=False)
         if start_from_step == 0:
             self.set_status(self.fmt_status("Block 1", "Waiting for Battery"))
             self.check_battery_threshold() 
@@ -1368,7 +1330,7 @@ class ODM_RunIn_Project(BaseRunInApp):
         # ==========================================
         # [Test 1] Single Stress
         # ==========================================
-        test1_duration = int(self.config['Block1_Thermal'].get('Test1_Duration', 1200))
+        test1_duration = self.spec.thermal.tests['Test1'].duration
         if start_from_step <= 1:
             if test1_duration <= 0:
                 self.log("[Test 1] Duration=0, Skipping...")
@@ -1386,14 +1348,14 @@ class ODM_RunIn_Project(BaseRunInApp):
                     
                     # 若沒拋出 Exception 代表 PASS
                     self.save_state("1", 2, self.global_cycle, "IDLE")
-                    if self.config['Block1_Thermal'].getboolean('Test1_Reboot'):
+                    if self.spec.thermal.tests['Test1'].reboot:
                         self.log("Rebooting as per config...")
                         self.trigger_reboot()
                 except Exception as e:
                     # 錯誤已在 run_stress_test_common Log 過，這裡直接往上拋即可
                     raise e
         # Step 2: Fan Max Speed
-        fan_count = int(self.config['Block1_Thermal'].get('Test2_Fan_Count', 2))
+        fan_count = self.spec.thermal.test2.fan_count
         if start_from_step <= 2:
             if fan_count <= 0:
                 self.log("[Test 2] Fan_Count=0, Skipping...")
@@ -1402,12 +1364,10 @@ class ODM_RunIn_Project(BaseRunInApp):
                 self.set_status(self.fmt_status("Block 1", "Sleep 3min before Fan test..."))
                 self.log("Sleep 3min before Fan test...")   
                 #self.set_status(f"Cycle {current_cycle} | Running Test 2: Fan Speed Test")      
-                for i in range(180):
-                    if i % 10 == 0: QApplication.processEvents()
-                    time.sleep(1)
+                self.wait_seconds(180, stoppable=False)
                 self.log("[Test 2] Fan Speed Test Start")   
                 self.set_status(self.fmt_status("Block 1", "Test 2: Fan Speed Test"))
-                self.log(f"Battery percentage:{psutil.sensors_battery().percent}")     
+                self.log_battery_percentage("Test2")
                 try:
                     # 呼叫剛剛寫好的 Helper 函式
                     self.run_fan_curve_test()
@@ -1415,7 +1375,7 @@ class ODM_RunIn_Project(BaseRunInApp):
                     # 測試通過後，儲存狀態並準備重開機
                     self.save_state("1", 3, self.global_cycle, "IDLE")               
                     # 檢查 Config 是否需要重開機 (需求說 PASS 後 Reboot 往 Test 3)
-                    if self.config['Block1_Thermal'].getboolean('Test2_Reboot'):
+                    if self.spec.thermal.test2.reboot:
                         self.log("Rebooting for Test 3...")
                         self.trigger_reboot()
                     else:
@@ -1425,7 +1385,7 @@ class ODM_RunIn_Project(BaseRunInApp):
                     # 這裡直接 raise，core.py 會捕捉並停止測試 (STOPPED: FAIL)
                     raise e           
         # Step 3: Dual Stress
-        test3_duration = int(self.config['Block1_Thermal'].get('Test3_Duration', 1200))
+        test3_duration = self.spec.thermal.tests['Test3'].duration
         if start_from_step <= 3:
             if test3_duration <= 0:
                 self.log("[Test 3] Duration=0, Skipping...")
@@ -1433,9 +1393,7 @@ class ODM_RunIn_Project(BaseRunInApp):
                 self.set_status(self.fmt_status("Block 1", "Sleep 3min before Dual burn test..."))
                 self.log("Sleep 3min before Dual burn test...")    
                 #self.set_status(f"B1-C{self.block1_cycle} | Running Test 3: Dual Stress")     
-                for i in range(180):
-                    if i % 10 == 0: QApplication.processEvents()
-                    time.sleep(1)
+                self.wait_seconds(180, stoppable=False)
                 self.check_battery_threshold() 
                 self.set_status(self.fmt_status("Block 1", "Test 3: Dual Stress"))
                 self.log("[Test 3] Dual Stress Test")
@@ -1446,7 +1404,7 @@ class ODM_RunIn_Project(BaseRunInApp):
                     self.run_stress_test_common("Test3", cmd_furmark, cmd_prime95)
                     self.log("Block 1 PASS.")                               
                     # 若為最後一個 Step，準備接續
-                    # if self.config['Block1_Thermal'].getboolean('Test3_Reboot'):
+                    # if self.spec.thermal.tests['Test3'].reboot:
                     #     self.log("Rebooting...")
                     #     self.trigger_reboot()
                 except Exception as e:
@@ -1458,60 +1416,15 @@ class ODM_RunIn_Project(BaseRunInApp):
     # ==========================================
     def run_block_2(self, start_from_step=0, current_cycle=1):
         self.log("--- Block 2: Aging Test ---")
-        items = []
-        # 1. 嘗試從 Config 讀取測試項目
-        if 'Block2_Aging_Items' in self.config:
-            self.log("Loading Aging Items from Config...")
-            section = self.config['Block2_Aging_Items']
-            idx = 1
-            while True:
-                key = f"Item_{idx}"
-                if key not in section:
-                    break
-                
-                try:
-                    # 格式: Name | Command | Interrupt(1/0) | CaptureLog(1/0)
-                    raw_val = section[key]
-                    parts = [p.strip() for p in raw_val.split('|')]
-                    
-                    if len(parts) >= 4:
-                        name = parts[0]
-                        cmd = parts[1]
-                        will_interrupt = (parts[2] == '1')
-                        capture_log = (parts[3] == '1')
-                        items.append((name, cmd, will_interrupt, capture_log))
-                    else:
-                        self.log(f"Warning: Invalid format in {key}, skipping.")
-                except Exception as e:
-                    self.log(f"Error parsing {key}: {e}")
-                
-                idx += 1
-
-        if not items:
-            self.log("Config [Block2_Aging_Items] not found or empty. Using default list.")
-            items = [
-                ("Battery Info",   r"call .\RI\BatteryInfo.bat", False, False),
-                ("Battery Aging",  r"call .\RI\Battery.bat",     False, True),
-                ("Screen On/Off",  r"call .\RI\TurnOnOff.bat",   False, True),
-                ("Camera Test",    r"call .\RI\RICamera.bat",    False, True),
-                ("Cold Boot",      r"call .\RI\ColdBoot.bat",    True,  True),
-                ("RTC Check",      r"call .\RI\RTC.bat",         False, True),
-                ("Memory Stress",  r"call .\RI\Memory.bat",      False, False),
-                ("Storage Test",   r"call .\RI\HDD_CMD.bat",     False, True),
-                ("3DMark Test",    r"call .\RI\3DMark.bat",      False, True),
-                ("Fan Speed Set",  r"call .\RI\SetFanSpeed.bat", False, True),
-                ("S3 Sleep Test",  r"call .\RI\S3sleeptest.bat", True,  True),
-                ("S4 Sleep Test",  r"call .\RI\S4sleeptest.bat", True,  True),
-                ("Driver Check",   r"call .\RI\CheckDriver.bat", False, True),
-                ("BT/WiFi Test",   r"call .\RI\BTWIFI.bat",      False, True)
-            ]
+        # 測試項目 (Config [Block2_Aging_Items]，未設定時為預設清單)
+        items = self.spec.aging.items
         
         for idx, (test_name, cmd, will_interrupt, capture_log) in enumerate(items):
             if idx < start_from_step: continue           
             # 更新 UI 狀態
-            self.set_status(self.fmt_status("Block 2", f"Running {name}"))
+            self.set_status(self.fmt_status("Block 2", f"Running {test_name}"))
             self.log(f"Starting {test_name}...")
-            self.log(f"Battery percentage:{psutil.sensors_battery().percent}")
+            self.log_battery_percentage(test_name)
             # S3/S4 特殊處理 (Save RUNNING)
             if "sleeptest" in cmd.lower() or "coldboot" in cmd.lower(): 
                 if "coldboot" in cmd.lower():
@@ -1538,19 +1451,15 @@ class ODM_RunIn_Project(BaseRunInApp):
     def run_block_3(self):
         try:
             tool_path = os.path.join(self.base_dir, "RI", "DiagECtool.exe") 
-            fan_mode = self.config['Block1_Thermal'].get('Fan_Mode', None)
-            if fan_mode and str(fan_mode).strip():
-                fan_mode = str(fan_mode).strip()
+            fan_mode = self.spec.thermal.fan_mode
+            if fan_mode:
                 self.log(f"Set Fan Mode: {fan_mode}")
                 self.exec_cmd_wait(f"{tool_path} raw --cmd 0x20 --subcmd 0x01 --data 0x03", capture_log=True)
                 self.exec_cmd_wait(f"{tool_path} raw --cmd 0x20 --subcmd 0x06 --data 0x0{fan_mode}", capture_log=True)
-                for _ in range(10):
-                    self.check_stop()
-                    QApplication.processEvents()
-                    time.sleep(1)
+                self.wait_seconds(10)
             self.log("--- Block 3: Battery Charge/Discharge ---")
             self.set_status(self.fmt_status("Block 3", "Running Battery Test")) 
-            self.log(f"Battery percentage:{psutil.sensors_battery().percent}")
+            self.log_battery_percentage("Block3")
             self.save_state("3", 0, self.global_cycle, status="RUNNING")
             self.exec_cmd_wait(r"call .\RI\BatteryControl.bat")
         except Exception as e:
@@ -1579,18 +1488,26 @@ if __name__ == "__main__":
 
     os.chdir(application_path)
     print(f"Current Working Directory: {os.getcwd()}")
-    os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "1"
-    QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
-    QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps)
-    app = QApplication(sys.argv)
-    lock_file_path = os.path.join(QDir.tempPath(), 'odm_runin_instance.lock')
-    lock_file = QLockFile(lock_file_path)
-    # 嘗試鎖定，Timeout 設定 100ms
-    if not lock_file.tryLock(100):
-        # 如果鎖定失敗，代表已經有一個實例在執行
-        QMessageBox.critical(None, "Error", "Run-In program is already running!\n(Please close the existing window first)")
-        sys.exit(1)
-
-    win = ODM_RunIn_Project(title="ACER Run-In Test")
-    win.show()
-    sys.exit(app.exec_())
+
+    if "--ec-calibrate" in sys.argv:
+        # EC 時序校正: 量測本機 IBF/OBF 反應時間並存成 RI\ec_timing.json
+        ec = DirectEC(os.path.join(application_path, "RI"))
+        timing, stats = ec.calibrate(tuple(channel_request(c) for c in FanMonitorThread.DEFAULT_CHANNELS)
+                                    + (EC_CHARGING_CURRENT,))
+        print(f"[EC Calibrate] {stats}")
+        if timing is None:
+            print("[EC Calibrate] FAILED, keeping current timing.")
+            sys.exit(1)
+        print(f"[EC Calibrate] Saved: {timing}")
+        sys.exit(0)
+
+    if "--headless" in sys.argv:
+        # 無視窗模式: 不載入 PyQt5，結果以 exit code 回報
+        if not acquire_instance_lock():
+            print("Run-In program is already running!")
+            sys.exit(1)
+        engine = ODM_RunIn_Project(title="ACER Run-In Test")
+        sys.exit(engine.run_headless())
+
+    from runin_gui import run_gui
+    sys.exit(run_gui(ODM_RunIn_Project, title="ACER Run-In Test"))
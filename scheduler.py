@@ -0,0 +1,125 @@
+import math
+import time
+from collections import namedtuple
+
+# ==========================================
+# 週期排程 (固定 deadline，不累積漂移)
+# ==========================================
+# 工作耗時超過一個週期 (overrun) 時的處理方式
+SKIP = "skip"          # 丟掉錯過的 tick，對齊到下一個未來的 deadline (取樣器預設，避免連續補讀)
+CATCH_UP = "catch_up"  # 立刻補跑錯過的 tick (最多 max_catch_up 個)，再多就丟掉並重新對齊
+
+# late_*: 實際醒來時間 - deadline；work_*: 兩次 tick 之間的工作耗時
+ScheduleStats = namedtuple("ScheduleStats",
+                           "name interval policy ticks overruns skipped "
+                           "late_mean_ms late_max_ms work_mean_ms work_max_ms")
+
+class PeriodicSchedule:
+    """
+    以 time.monotonic 的絕對 deadline (start + n * interval) 排程週期工作，
+    deadline 不受每次工作耗時影響，因此長時間取樣不會漂移。
+
+        sched = PeriodicSchedule(1.0, name="FanMonitor")
+        while sched.wait(stop_event):
+            sample()
+
+    第一次 wait() 立即回傳 (tick 0)。stop 可為 threading.Event 或回傳 bool 的函式，
+    設定後 wait() 回傳 False。
+    """
+    # stop 為函式時，每隔多久檢查一次
+    STOP_POLL_S = 0.1
+
+    def __init__(self, interval, policy=SKIP, name="", max_catch_up=3):
+        if policy not in (SKIP, CATCH_UP):
+            raise ValueError(f"Unknown schedule policy: {policy}")
+        self.name = name
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.interval = self._check_interval(interval)
+        self.deadline = None
+        self.last_wake = None
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.late_sum = 0.0
+        self.late_max = 0.0
+        self.work_sum = 0.0
+        self.work_max = 0.0
+
+    @staticmethod
+    def _check_interval(interval):
+        interval = float(interval)
+        if interval <= 0:
+            raise ValueError(f"Schedule interval must be > 0: {interval}")
+        return interval
+
+    def set_interval(self, interval):
+        """變更週期，下一個 deadline 從上一個 deadline 以新週期起算 (取樣階段切換用)"""
+        self.interval = self._check_interval(interval)
+
+    def _stopped(self, stop):
+        if stop is None:
+            return False
+        if callable(stop):
+            return bool(stop())
+        return stop.is_set()
+
+    def _sleep_until(self, deadline, stop):
+        """睡到 deadline；途中 stop 成立則回傳 False"""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return not self._stopped(stop)
+            if stop is None:
+                time.sleep(remaining)
+            elif callable(stop):
+                if stop():
+                    return False
+                time.sleep(min(self.STOP_POLL_S, remaining))
+            elif stop.wait(remaining):
+                return False
+
+    def wait(self, stop=None):
+        """等到下一個 tick 的 deadline，回傳 True 表示該執行工作"""
+        if self._stopped(stop):
+            return False
+        now = time.monotonic()
+        if self.deadline is None:
+            self.deadline = self.last_wake = now
+            self.ticks = 1
+            return True
+
+        work = now - self.last_wake
+        self.work_sum += work
+        self.work_max = max(self.work_max, work)
+
+        self.deadline += self.interval
+        if now > self.deadline:
+            self.overruns += 1
+            missed = math.ceil((now - self.deadline) / self.interval)
+            if self.policy == SKIP or missed > self.max_catch_up:
+                # 只保留下一個未來的 deadline，相位不變
+                self.deadline += missed * self.interval
+                self.skipped += missed
+
+        if not self._sleep_until(self.deadline, stop):
+            return False
+
+        self.last_wake = time.monotonic()
+        late = max(0.0, self.last_wake - self.deadline)
+        self.late_sum += late
+        self.late_max = max(self.late_max, late)
+        self.ticks += 1
+        return True
+
+    def stats(self):
+        waited = max(1, self.ticks - 1)
+        return ScheduleStats(self.name, self.interval, self.policy, self.ticks, self.overruns, self.skipped,
+                             round(self.late_sum / waited * 1000, 3), round(self.late_max * 1000, 3),
+                             round(self.work_sum / waited * 1000, 3), round(self.work_max * 1000, 3))
+
+    def summary_line(self):
+        s = self.stats()
+        return (f"[Schedule] {s.name}: interval={s.interval:g}s ticks={s.ticks} overruns={s.overruns} "
+                f"skipped={s.skipped} late avg/max={s.late_mean_ms:.1f}/{s.late_max_ms:.1f}ms "
+                f"work avg/max={s.work_mean_ms:.1f}/{s.work_max_ms:.1f}ms")
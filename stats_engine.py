@@ -0,0 +1,137 @@
+import math
+import re
+from array import array
+
+from telemetry import WindowStats, EMPTY_STATS
+
+try:
+    import numpy as np
+except ImportError:  # 選用: 沒有 NumPy 時改用 array + 純 Python 計算 (結果相同)
+    np = None
+
+# ==========================================
+# 時間序列統計 (驗證用)
+# 一個欄位的資料只收集一次，所有 Spec 需要的統計量一起算
+# ==========================================
+# 支援的統計量:
+#   mean / min / max / std (母體標準差)
+#   pNN      百分位數 (線性內插，同 numpy.percentile)，如 p95
+#   slope    最小平方法斜率，單位 / 分鐘 (判斷溫度持續上升)
+#   above:T  數值 > T 的累計秒數 (每筆樣本算到下一筆為止)
+_STAT_RE = re.compile(r"(?i)(mean|min|max|std|slope)$|p(\d{1,3}(?:\.\d+)?)$|above:?(-?\d+(?:\.\d+)?)$")
+
+def parse_stat(name):
+    """Config 上的統計量名稱 (P95 / Slope / Above90 ...) 轉成標準名稱，不支援時丟 ValueError"""
+    m = _STAT_RE.match(name.strip())
+    if not m:
+        raise ValueError(f"unknown statistic '{name}'")
+    basic, pct, threshold = m.groups()
+    if basic:
+        return basic.lower()
+    if pct is not None:
+        if not 0 <= float(pct) <= 100:
+            raise ValueError(f"percentile out of range '{name}'")
+        return f"p{float(pct):g}"
+    return f"above:{float(threshold):g}"
+
+def stat_label(stat):
+    """報表用名稱: p95 -> P95, above:90 -> Above90"""
+    if stat.startswith("above:"):
+        return "Above" + stat[6:]
+    return stat.upper() if stat.startswith("p") else stat.capitalize()
+
+class Series:
+    """(epoch 秒, 值) 序列，array('d') 儲存；統計前需為時間遞增 (見 reverse)"""
+    __slots__ = ("times", "values")
+
+    def __init__(self):
+        self.times = array('d')
+        self.values = array('d')
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, t, value):
+        self.times.append(t)
+        self.values.append(value)
+
+    def reverse(self):
+        """tail_rows 由新到舊讀取，收集完後反轉成時間遞增"""
+        self.times.reverse()
+        self.values.reverse()
+
+def summary(series):
+    """count / mean / min / max (WindowStats)"""
+    if not len(series):
+        return EMPTY_STATS
+    r = compute(series, ("mean", "min", "max"))
+    return WindowStats(len(series), r["mean"], r["min"], r["max"])
+
+def _percentile(sorted_vals, pct):
+    pos = (len(sorted_vals) - 1) * pct / 100.0
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (pos - lo)
+
+def _compute_numpy(series, stats):
+    t = np.frombuffer(series.times, dtype=np.float64)
+    v = np.frombuffer(series.values, dtype=np.float64)
+    out = {}
+    for stat in stats:
+        if stat == "mean":
+            out[stat] = float(v.mean())
+        elif stat == "min":
+            out[stat] = float(v.min())
+        elif stat == "max":
+            out[stat] = float(v.max())
+        elif stat == "std":
+            out[stat] = float(v.std())
+        elif stat == "slope":
+            dt = t - t.mean()
+            denom = float((dt * dt).sum())
+            out[stat] = float((dt * (v - v.mean())).sum()) / denom * 60.0 if denom else 0.0
+        elif stat.startswith("above:"):
+            threshold = float(stat[6:])
+            out[stat] = float((np.diff(t) * (v[:-1] > threshold)).sum())
+        else:
+            out[stat] = float(np.percentile(v, float(stat[1:])))
+    return out
+
+def _compute_python(series, stats):
+    t = series.times
+    v = series.values
+    n = len(v)
+    mean = math.fsum(v) / n
+    sorted_vals = None
+    out = {}
+    for stat in stats:
+        if stat == "mean":
+            out[stat] = mean
+        elif stat == "min":
+            out[stat] = min(v)
+        elif stat == "max":
+            out[stat] = max(v)
+        elif stat == "std":
+            out[stat] = math.sqrt(math.fsum((x - mean) ** 2 for x in v) / n)
+        elif stat == "slope":
+            t_mean = math.fsum(t) / n
+            denom = math.fsum((ti - t_mean) ** 2 for ti in t)
+            num = math.fsum((ti - t_mean) * (x - mean) for ti, x in zip(t, v))
+            out[stat] = num / denom * 60.0 if denom else 0.0
+        elif stat.startswith("above:"):
+            threshold = float(stat[6:])
+            out[stat] = math.fsum(t[i + 1] - t[i] for i in range(n - 1) if v[i] > threshold)
+        else:
+            if sorted_vals is None:
+                sorted_vals = sorted(v)
+            out[stat] = _percentile(sorted_vals, float(stat[1:]))
+    return out
+
+def compute(series, stats):
+    """一次計算 stats 列出的所有統計量，回傳 {stat: value}；沒有資料時值為 None"""
+    stats = tuple(dict.fromkeys(stats))
+    if not len(series):
+        return {stat: None for stat in stats}
+    if np is not None:
+        return _compute_numpy(series, stats)
+    return _compute_python(series, stats)
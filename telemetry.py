@@ -0,0 +1,420 @@
+import os
+import sys
+import csv
+import json
+import math
+import mmap
+import time
+import bisect
+import struct
+import threading
+from array import array
+from collections import namedtuple, deque
+from datetime import datetime
+
+# ==========================================
+# Telemetry (風扇 / 溫度等時間序列)
+# 取樣端直接累計統計，驗證時不必再重新解析 CSV
+# ==========================================
+
+NAN = float("nan")
+
+# count: 視窗內有效樣本數 (讀取失敗的 NaN 不計)
+WindowStats = namedtuple("WindowStats", "count mean min max")
+EMPTY_STATS = WindowStats(0, 0.0, None, None)
+
+class _RollingWindow:
+    """單一 channel、單一時間長度的滾動統計 (sum + 單調 deque 維護 min/max)"""
+    __slots__ = ("seconds", "head", "count", "total", "mins", "maxs")
+
+    def __init__(self, seconds, head):
+        self.seconds = seconds
+        self.head = head        # 視窗內最舊樣本的序號
+        self.count = 0
+        self.total = 0.0
+        self.mins = deque()     # 序號，對應值遞增
+        self.maxs = deque()     # 序號，對應值遞減
+
+    def add(self, seq, value):
+        if value != value:      # NaN: 讀取失敗
+            return
+        self.count += 1
+        self.total += value
+        self.mins.append(seq)
+        self.maxs.append(seq)
+
+    def drop(self, seq, value):
+        if value != value:
+            return
+        self.count -= 1
+        self.total -= value
+        if self.mins and self.mins[0] == seq:
+            self.mins.popleft()
+        if self.maxs and self.maxs[0] == seq:
+            self.maxs.popleft()
+
+class TelemetryRing:
+    """
+    固定容量的 array ring buffer，存 (timestamp, channel values)。
+    每個 windows 指定的秒數都有滾動 mean/min/max/count，append 與查詢都是 O(1) (攤銷)。
+    timestamp 用 epoch 秒 (time.time())，值為 float，None 代表讀取失敗。
+    """
+    def __init__(self, channels, capacity=7200, windows=(120,)):
+        self.channels = tuple(channels)
+        self.index = {name: i for i, name in enumerate(self.channels)}
+        self.capacity = capacity
+        self.times = array('d', [0.0]) * capacity
+        self.values = [array('d', [NAN]) * capacity for _ in self.channels]
+        self.seq = 0            # 下一筆樣本的序號
+        self.lock = threading.Lock()
+        self.windows = {}
+        for seconds in windows:
+            self.add_window(seconds)
+
+    def __len__(self):
+        return min(self.seq, self.capacity)
+
+    def add_window(self, seconds):
+        """新增滾動視窗 (已存在就略過)，會用 ring 內現有樣本初始化"""
+        with self.lock:
+            if seconds in self.windows:
+                return
+            oldest = self.seq - len(self)
+            wins = [_RollingWindow(seconds, oldest) for _ in self.channels]
+            for seq in range(oldest, self.seq):
+                self._add_to(wins, seq)
+            self.windows[seconds] = wins
+            if self.seq:
+                self._evict(wins, self.times[(self.seq - 1) % self.capacity] - seconds)
+
+    def _value(self, ch, seq):
+        return self.values[ch][seq % self.capacity]
+
+    def _add_to(self, wins, seq):
+        for ch, win in enumerate(wins):
+            value = self._value(ch, seq)
+            if value == value:
+                vals = self.values[ch]
+                cap = self.capacity
+                while win.mins and vals[win.mins[-1] % cap] >= value:
+                    win.mins.pop()
+                while win.maxs and vals[win.maxs[-1] % cap] <= value:
+                    win.maxs.pop()
+            win.add(seq, value)
+
+    def _evict(self, wins, cutoff, upto=None):
+        """移除 timestamp < cutoff (或序號 < upto) 的樣本"""
+        for ch, win in enumerate(wins):
+            while win.head < self.seq and (
+                    (upto is not None and win.head < upto) or self.times[win.head % self.capacity] < cutoff):
+                win.drop(win.head, self._value(ch, win.head))
+                win.head += 1
+
+    def append(self, ts, values):
+        with self.lock:
+            seq = self.seq
+            # ring 滿了: 即將被覆蓋的樣本先從所有視窗移除
+            if seq >= self.capacity:
+                for wins in self.windows.values():
+                    self._evict(wins, float("-inf"), upto=seq - self.capacity + 1)
+            slot = seq % self.capacity
+            self.times[slot] = ts
+            for ch, value in enumerate(values):
+                self.values[ch][slot] = NAN if value is None else float(value)
+            self.seq = seq + 1
+            for seconds, wins in self.windows.items():
+                self._add_to(wins, seq)
+                self._evict(wins, ts - seconds)
+
+    def window_stats(self, channel, seconds, now=None):
+        """
+        取得 channel 在最近 seconds 秒的統計。
+        seconds 需已在 windows 中 (O(1))；now 有值時另外移除早於 now - seconds 的樣本。
+        """
+        ch = self.index[channel]
+        with self.lock:
+            wins = self.windows.get(seconds)
+            if wins is None:
+                return self._scan(ch, seconds, now)
+            if now is not None:
+                self._evict(wins, now - seconds)
+            win = wins[ch]
+            if not win.count:
+                return EMPTY_STATS
+            cap = self.capacity
+            vals = self.values[ch]
+            return WindowStats(win.count, win.total / win.count,
+                               vals[win.mins[0] % cap], vals[win.maxs[0] % cap])
+
+    def _scan(self, ch, seconds, now):
+        """沒有預先建立視窗時的 O(n) 計算"""
+        if not self.seq:
+            return EMPTY_STATS
+        if now is None:
+            now = self.times[(self.seq - 1) % self.capacity]
+        cutoff = now - seconds
+        count, total, lo, hi = 0, 0.0, math.inf, -math.inf
+        for seq in range(self.seq - len(self), self.seq):
+            slot = seq % self.capacity
+            value = self.values[ch][slot]
+            if self.times[slot] < cutoff or value != value:
+                continue
+            count += 1
+            total += value
+            lo = min(lo, value)
+            hi = max(hi, value)
+        return WindowStats(count, total / count, lo, hi) if count else EMPTY_STATS
+
+    def latest(self):
+        """最新一筆樣本 (timestamp, {channel: value})，沒有樣本時回傳 None"""
+        with self.lock:
+            if not self.seq:
+                return None
+            slot = (self.seq - 1) % self.capacity
+            return self.times[slot], {name: self.values[ch][slot] for ch, name in enumerate(self.channels)}
+
+    def since(self, seq):
+        """
+        序號 >= seq 且仍在 ring 內的樣本，回傳 (下一次要傳入的 seq, [(timestamp, values tuple), ...])。
+        讀取失敗的值為 None。用來增量讀取新樣本 (不重複、不漏讀未被覆蓋的部分)。
+        """
+        with self.lock:
+            start = max(seq, self.seq - len(self))
+            samples = []
+            for i in range(start, self.seq):
+                slot = i % self.capacity
+                samples.append((self.times[slot],
+                                tuple(None if v[slot] != v[slot] else v[slot] for v in self.values)))
+            return self.seq, samples
+
+class _BatchedWriter:
+    """
+    長時間取樣用的寫檔基底: 檔案保持開啟，row 先累積在記憶體，
+    超過 flush_rows 筆或 flush_interval 秒才寫出；每 fsync_interval 秒 fsync 一次
+    (0 = 不 fsync)，限制當機時最多遺失的資料量。close() 會寫完所有資料。
+    只在單一執行緒 (取樣執行緒) 內使用。
+    """
+    def __init__(self, path, mode, flush_interval=5.0, flush_rows=30, fsync_interval=60.0, **open_kwargs):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.fsync_interval = fsync_interval
+        self.pending = []
+        self.rows_written = 0
+        self.file = open(path, mode, **open_kwargs)
+        now = time.monotonic()
+        self.last_flush = now
+        self.last_fsync = now
+
+    def _write_rows(self, rows):
+        raise NotImplementedError
+
+    def _queue(self, row):
+        self.pending.append(row)
+        if len(self.pending) >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self, sync=False):
+        if self.file is None:
+            return
+        if self.pending:
+            self._write_rows(self.pending)
+            self.rows_written += len(self.pending)
+            self.pending = []
+        self.file.flush()
+        now = time.monotonic()
+        self.last_flush = now
+        if sync or (self.fsync_interval and now - self.last_fsync >= self.fsync_interval):
+            os.fsync(self.file.fileno())
+            self.last_fsync = now
+
+    def close(self):
+        if self.file is None:
+            return
+        try:
+            self.flush(sync=bool(self.fsync_interval))
+        finally:
+            self.file.close()
+            self.file = None
+
+class TelemetryCsvWriter(_BatchedWriter):
+    """批次寫出的 CSV (見 _BatchedWriter)"""
+    def __init__(self, path, header, flush_interval=5.0, flush_rows=30, fsync_interval=60.0):
+        super().__init__(path, "w", flush_interval, flush_rows, fsync_interval, newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(header)
+        self.flush(sync=bool(fsync_interval))
+
+    def write_row(self, row):
+        self._queue(row)
+
+    def _write_rows(self, rows):
+        self.writer.writerows(rows)
+
+# ==========================================
+# 二進位 Telemetry 格式 (.ritl)
+# [固定檔頭 16 bytes][JSON 檔頭 (補齊到 8 bytes 倍數)][record 0][record 1]...
+#   固定檔頭: magic "RITL", version u16, channel 數 u16, record 大小 u32, 資料起點 u32
+#   record  : timestamp int64 (epoch 微秒) + 每個 channel 一個 float32 (NaN = 讀取失敗)
+# 全部 little-endian；寫到一半當機時最後不完整的 record 會被忽略
+# ==========================================
+BIN_MAGIC = b"RITL"
+BIN_VERSION = 1
+_BIN_PREFIX = struct.Struct("<4sHHII")
+
+def _record_struct(channel_count):
+    return struct.Struct("<q" + "f" * channel_count)
+
+class TelemetryBinWriter(_BatchedWriter):
+    """批次寫出的 .ritl 二進位檔 (見 _BatchedWriter)，meta 會存進 JSON 檔頭"""
+    def __init__(self, path, channels, meta=None, flush_interval=5.0, flush_rows=30, fsync_interval=60.0):
+        super().__init__(path, "wb", flush_interval, flush_rows, fsync_interval)
+        self.channels = tuple(channels)
+        self.record = _record_struct(len(self.channels))
+        header = json.dumps({"channels": list(self.channels), "meta": meta or {}}).encode("utf-8")
+        header += b" " * (-(len(header) + _BIN_PREFIX.size) % 8)
+        self.file.write(_BIN_PREFIX.pack(BIN_MAGIC, BIN_VERSION, len(self.channels), self.record.size,
+                                         _BIN_PREFIX.size + len(header)))
+        self.file.write(header)
+        self.flush(sync=bool(fsync_interval))
+
+    def write_row(self, ts, values):
+        """ts: epoch 秒 (float)；values 依 channels 順序，None 代表讀取失敗"""
+        self._queue(self.record.pack(int(round(ts * 1e6)),
+                                     *(NAN if v is None else float(v) for v in values)))
+
+    def _write_rows(self, rows):
+        self.file.write(b"".join(rows))
+
+class _TimestampView:
+    """讓 bisect 直接在 mmap 上二分搜尋 timestamp (不先讀出整欄)"""
+    def __init__(self, reader):
+        self.reader = reader
+
+    def __len__(self):
+        return len(self.reader)
+
+    def __getitem__(self, i):
+        return self.reader.timestamp_us(i)
+
+class TelemetryBinReader:
+    """
+    以 mmap 讀取 .ritl 檔。依時間切片用二分搜尋，
+    只解析需要的 record，不必從頭逐行 parse。
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        prefix = self.file.read(_BIN_PREFIX.size)
+        if len(prefix) < _BIN_PREFIX.size:
+            self.file.close()
+            raise ValueError(f"{path}: not a telemetry file (too short)")
+        magic, version, channel_count, record_size, data_offset = _BIN_PREFIX.unpack(prefix)
+        if magic != BIN_MAGIC or version != BIN_VERSION:
+            self.file.close()
+            raise ValueError(f"{path}: not a telemetry file (magic={magic!r}, version={version})")
+        header = json.loads(self.file.read(data_offset - _BIN_PREFIX.size).decode("utf-8"))
+        self.channels = tuple(header["channels"])
+        self.meta = header.get("meta", {})
+        self.index = {name: i for i, name in enumerate(self.channels)}
+        self.record = _record_struct(channel_count)
+        if self.record.size != record_size:
+            self.file.close()
+            raise ValueError(f"{path}: record size mismatch ({record_size} != {self.record.size})")
+        self.data_offset = data_offset
+        size = os.fstat(self.file.fileno()).st_size
+        self.count = (size - data_offset) // record_size
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.ts_struct = struct.Struct("<q")
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        self.file.close()
+
+    def timestamp_us(self, i):
+        return self.ts_struct.unpack_from(self.mm, self.data_offset + i * self.record.size)[0]
+
+    def time_range(self):
+        """(第一筆, 最後一筆) 的 epoch 秒，沒有資料時回傳 None"""
+        if not self.count:
+            return None
+        return self.timestamp_us(0) / 1e6, self.timestamp_us(self.count - 1) / 1e6
+
+    def slice_index(self, start=None, end=None):
+        """回傳 start <= ts < end (epoch 秒) 的 record 範圍 (i0, i1)"""
+        view = _TimestampView(self)
+        i0 = 0 if start is None else bisect.bisect_left(view, int(round(start * 1e6)))
+        i1 = self.count if end is None else bisect.bisect_left(view, int(round(end * 1e6)))
+        return i0, max(i0, i1)
+
+    def records(self, start=None, end=None):
+        """逐筆回傳 (epoch 秒, values tuple)"""
+        i0, i1 = self.slice_index(start, end)
+        if i0 >= i1:
+            return
+        size = self.record.size
+        chunk = self.mm[self.data_offset + i0 * size:self.data_offset + i1 * size]
+        for rec in self.record.iter_unpack(chunk):
+            yield rec[0] / 1e6, rec[1:]
+
+    def column(self, name, start=None, end=None):
+        """取出單一 channel 在時間範圍內的值 (array('f')，含 NaN)"""
+        ch = self.index[name] + 1
+        i0, i1 = self.slice_index(start, end)
+        if i0 >= i1:
+            return array('f')
+        size = self.record.size
+        chunk = self.mm[self.data_offset + i0 * size:self.data_offset + i1 * size]
+        return array('f', (rec[ch] for rec in self.record.iter_unpack(chunk)))
+
+    def stats(self, name, start=None, end=None):
+        """時間範圍內的 WindowStats (忽略 NaN)"""
+        values = [v for v in self.column(name, start, end) if v == v]
+        if not values:
+            return EMPTY_STATS
+        return WindowStats(len(values), sum(values) / len(values), min(values), max(values))
+
+def _format_value(value):
+    if value != value:
+        return ""
+    return int(value) if value.is_integer() else round(value, 3)
+
+def export_csv(bin_path, csv_path, sub_second=None):
+    """
+    .ritl 轉成原本的 CSV 格式 (Timestamp + 各 channel 欄位，讀取失敗留空白)。
+    sub_second=None 時依檔頭 meta 決定 Timestamp 是否帶毫秒。
+    回傳寫出的筆數。
+    """
+    with TelemetryBinReader(bin_path) as reader:
+        if sub_second is None:
+            sub_second = bool(reader.meta.get("sub_second"))
+        count = 0
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Timestamp"] + list(reader.channels))
+            for ts, values in reader.records():
+                stamp = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S.%f')
+                stamp = stamp[:-3] if sub_second else stamp[:19]
+                writer.writerow([stamp] + [_format_value(v) for v in values])
+                count += 1
+    return count
+
+if __name__ == "__main__":
+    # 手動轉檔: python telemetry.py <input.ritl> [output.csv]
+    if len(sys.argv) < 2:
+        print("Usage: python telemetry.py <input.ritl> [output.csv]")
+        sys.exit(1)
+    src = sys.argv[1]
+    dst = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(src)[0] + ".csv"
+    print(f"{export_csv(src, dst)} records -> {dst}")
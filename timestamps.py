@@ -0,0 +1,86 @@
+import re
+import time
+from datetime import datetime
+
+# ==========================================
+# Log 時間字串 -> epoch 秒
+# 每個來源只判斷一次日期格式，之後每列只做 regex + 整數運算，不呼叫 strptime
+# ==========================================
+
+DMY = "DMY"   # 10/01/2026 = 1 Jan (PTAT 目前的格式)
+MDY = "MDY"   # 01/10/2026 = 1 Jan (PTAT 舊格式)
+YMD = "YMD"   # 2026/01/10, 2026-01-10 (GPUMon / Fan Log)
+
+_DATE_RE = re.compile(r"\s*(\d{1,4})[/-](\d{1,2})[/-](\d{1,4})\s*$")
+# HH:MM:SS 後面可接毫秒，PTAT / GPUMon 用冒號分隔 (08:53:58:985)，Fan Log 用小數點
+_TIME_RE = re.compile(r"\s*(\d{1,2}):(\d{2}):(\d{2})(?:[:.](\d{1,6}))?\s*$")
+
+def detect_date_order(date_strs, default=DMY):
+    """
+    由數筆日期字串判斷欄位順序: 第一段是 4 位數為 YMD；
+    第一段出現 > 12 為 DMY，第二段出現 > 12 為 MDY；無法分辨時用 default。
+    """
+    for text in date_strs:
+        m = _DATE_RE.match(text)
+        if not m:
+            continue
+        if len(m.group(1)) == 4:
+            return YMD
+        if int(m.group(1)) > 12:
+            return DMY
+        if int(m.group(2)) > 12:
+            return MDY
+    return default
+
+class TimestampParser:
+    """
+    固定日期順序的 (date, time) 字串 -> epoch 秒 (本機時間)。
+    同一天的 00:00 epoch 只算一次 (cache)，時間部分直接加上秒數；
+    格式不符回傳 None，不丟例外。(日光節約切換當天的跨切換時段會差 1 小時，工廠機台不使用)
+    """
+    def __init__(self, date_order):
+        if date_order not in (DMY, MDY, YMD):
+            raise ValueError(f"Unknown date order: {date_order}")
+        self.date_order = date_order
+        self.midnights = {}
+
+    def _midnight(self, date_str):
+        m = _DATE_RE.match(date_str)
+        if not m:
+            return None
+        a, b, c = (int(g) for g in m.groups())
+        if self.date_order == YMD:
+            year, month, day = a, b, c
+        elif self.date_order == DMY:
+            day, month, year = a, b, c
+        else:
+            month, day, year = a, b, c
+        if not (1 <= month <= 12 and 1 <= day <= 31 and year >= 1970):
+            return None
+        return time.mktime((year, month, day, 0, 0, 0, 0, 0, -1))
+
+    def parse(self, date_str, time_str):
+        midnight = self.midnights.get(date_str)
+        if midnight is None:
+            if date_str in self.midnights:
+                return None
+            midnight = self.midnights[date_str] = self._midnight(date_str)
+            if midnight is None:
+                return None
+        m = _TIME_RE.match(time_str)
+        if not m:
+            return None
+        hh, mm, ss, frac = m.groups()
+        seconds = int(hh) * 3600 + int(mm) * 60 + int(ss)
+        if frac:
+            seconds += int(frac) / 10 ** len(frac)
+        return midnight + seconds
+
+    def parse_joined(self, text):
+        """'date time' 在同一個欄位 (以第一個空白分隔)"""
+        date_str, _, time_str = text.strip().partition(" ")
+        return self.parse(date_str, time_str)
+
+def to_epoch(value):
+    """datetime / epoch 秒 -> epoch 秒"""
+    return value.timestamp() if isinstance(value, datetime) else float(value)